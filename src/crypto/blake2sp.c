@@ -0,0 +1,496 @@
+/*
+ * BLAKE2sp hash.
+ *
+ * Input is split into 64-byte blocks that are distributed round-robin
+ * over 8 BLAKE2s leaves.  State of all leaves is kept word-major,
+ * so each step of compression works on same word of all 8 lanes.
+ */
+
+#include <Python.h>
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <string.h>
+
+#include "blake2sp.h"
+
+#define LANES 8
+#define BLOCK 64
+#define STRIPE (LANES * BLOCK)
+#define OUTBYTES 32
+
+/*
+ * Stripe is compressed only when every lane has data after it,
+ * so last block of each lane can get final flag.
+ */
+#define BUFMAX (STRIPE + STRIPE - BLOCK)
+
+/* release GIL for updates larger than this */
+#define GIL_MINSIZE 2048
+
+/* without buffer API, other objects are copied in pieces of this size */
+#define COPY_CHUNK (256 * 1024)
+
+/* limited API gets buffer protocol in 3.11 */
+#if !defined(Py_LIMITED_API) || Py_LIMITED_API + 0 >= 0x030B0000
+#define HAVE_BUFFER_API
+#endif
+
+struct Blake2spState {
+	uint32_t h[8][LANES];
+	uint64_t count;		/* bytes compressed per lane */
+	size_t buflen;
+	uint8_t buf[2 * STRIPE];
+};
+
+typedef struct {
+	PyObject_HEAD
+	PyThread_type_lock lock;
+	struct Blake2spState st;
+} Blake2spObject;
+
+static const uint32_t blake2s_iv[8] = {
+	0x6A09E667, 0xBB67AE85, 0x3C6EF372, 0xA54FF53A,
+	0x510E527F, 0x9B05688C, 0x1F83D9AB, 0x5BE0CD19,
+};
+
+static const uint8_t sigma[10][16] = {
+	{0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15},
+	{14, 10, 4, 8, 9, 15, 13, 6, 1, 12, 0, 2, 11, 7, 5, 3},
+	{11, 8, 12, 0, 5, 2, 15, 13, 10, 14, 3, 6, 7, 1, 9, 4},
+	{7, 9, 3, 1, 13, 12, 11, 14, 2, 6, 5, 10, 4, 0, 15, 8},
+	{9, 0, 5, 7, 2, 4, 10, 15, 14, 1, 11, 12, 6, 8, 3, 13},
+	{2, 12, 6, 10, 0, 11, 8, 3, 4, 13, 7, 5, 15, 14, 1, 9},
+	{12, 5, 1, 15, 14, 13, 4, 10, 0, 7, 6, 3, 9, 2, 8, 11},
+	{13, 11, 7, 14, 12, 1, 3, 9, 5, 0, 15, 4, 8, 6, 2, 10},
+	{6, 15, 14, 9, 11, 3, 0, 8, 12, 2, 13, 7, 1, 4, 10, 5},
+	{10, 2, 8, 4, 7, 6, 1, 5, 15, 11, 9, 14, 3, 12, 13, 0},
+};
+
+static inline uint32_t load_le32(const uint8_t *p)
+{
+	return (uint32_t)(p[0]) | (uint32_t)(p[1]) << 8 |
+	    (uint32_t)(p[2]) << 16 | (uint32_t)(p[3]) << 24;
+}
+
+static inline void store_le32(uint8_t *p, uint32_t x)
+{
+	p[0] = x & 0xFF;
+	p[1] = (x >> 8) & 0xFF;
+	p[2] = (x >> 16) & 0xFF;
+	p[3] = (x >> 24) & 0xFF;
+}
+
+/*
+ * With GCC and Clang, all lanes are processed as single vector,
+ * otherwise lanes are compressed one by one.
+ */
+#if defined(__GNUC__)
+typedef uint32_t word_t __attribute__((vector_size(4 * LANES)));
+#define WORD_LANES LANES
+#else
+typedef uint32_t word_t;
+#define WORD_LANES 1
+#endif
+
+#define ROR(x, n) (((x) >> (n)) | ((x) << (32 - (n))))
+
+#define G(r, a, b, c, d, x, y) \
+	do { \
+		v[a] += v[b] + mw[sigma[r][x]]; \
+		v[d] = ROR(v[d] ^ v[a], 16); \
+		v[c] += v[d]; \
+		v[b] = ROR(v[b] ^ v[c], 12); \
+		v[a] += v[b] + mw[sigma[r][y]]; \
+		v[d] = ROR(v[d] ^ v[a], 8); \
+		v[c] += v[d]; \
+		v[b] = ROR(v[b] ^ v[c], 7); \
+	} while (0)
+
+/* rounds are unrolled, so message indexes are constants */
+#define ROUND(r) \
+	do { \
+		G(r, 0, 4, 8, 12, 0, 1); \
+		G(r, 1, 5, 9, 13, 2, 3); \
+		G(r, 2, 6, 10, 14, 4, 5); \
+		G(r, 3, 7, 11, 15, 6, 7); \
+		G(r, 0, 5, 10, 15, 8, 9); \
+		G(r, 1, 6, 11, 12, 10, 11); \
+		G(r, 2, 7, 8, 13, 12, 13); \
+		G(r, 3, 4, 9, 14, 14, 15); \
+	} while (0)
+
+/* compress one block in each lane, counter and flags are per lane */
+static void compress(uint32_t h[8][LANES], const uint32_t m[16][LANES],
+		     const uint32_t t0[LANES], const uint32_t t1[LANES],
+		     const uint32_t f0[LANES], const uint32_t f1[LANES])
+{
+	for (int l = 0; l < LANES; l += WORD_LANES) {
+		word_t v[16], mw[16], hw[8], tmp;
+		word_t zero = {0};
+
+		for (int i = 0; i < 8; i++) {
+			memcpy(&hw[i], &h[i][l], sizeof(word_t));
+			v[i] = hw[i];
+			v[i + 8] = zero + blake2s_iv[i];
+		}
+		memcpy(&tmp, &t0[l], sizeof(word_t));
+		v[12] ^= tmp;
+		memcpy(&tmp, &t1[l], sizeof(word_t));
+		v[13] ^= tmp;
+		memcpy(&tmp, &f0[l], sizeof(word_t));
+		v[14] ^= tmp;
+		memcpy(&tmp, &f1[l], sizeof(word_t));
+		v[15] ^= tmp;
+		for (int i = 0; i < 16; i++)
+			memcpy(&mw[i], &m[i][l], sizeof(word_t));
+
+		ROUND(0);
+		ROUND(1);
+		ROUND(2);
+		ROUND(3);
+		ROUND(4);
+		ROUND(5);
+		ROUND(6);
+		ROUND(7);
+		ROUND(8);
+		ROUND(9);
+
+		for (int i = 0; i < 8; i++) {
+			hw[i] ^= v[i] ^ v[i + 8];
+			memcpy(&h[i][l], &hw[i], sizeof(word_t));
+		}
+	}
+}
+
+/* transpose 8 blocks into word-major message */
+static void load_stripe(uint32_t m[16][LANES], const uint8_t *p)
+{
+	for (int l = 0; l < LANES; l++) {
+		for (int i = 0; i < 16; i++)
+			m[i][l] = load_le32(p + l * BLOCK + i * 4);
+	}
+}
+
+static void compress_stripes(struct Blake2spState *st, const uint8_t *p, size_t nstripes)
+{
+	uint32_t m[16][LANES];
+	uint32_t t0[LANES], t1[LANES];
+	static const uint32_t zero[LANES];
+
+	for (size_t n = 0; n < nstripes; n++) {
+		st->count += BLOCK;
+		for (int l = 0; l < LANES; l++) {
+			t0[l] = (uint32_t)st->count;
+			t1[l] = (uint32_t)(st->count >> 32);
+		}
+		load_stripe(m, p + n * STRIPE);
+		compress(st->h, m, t0, t1, zero, zero);
+	}
+}
+
+/* fill h for BLAKE2s node with blake2sp tree parameters */
+static void init_node(uint32_t h[8][LANES], int lane, uint32_t offset, uint32_t depth)
+{
+	uint32_t param[8] = {
+		OUTBYTES | (LANES << 16) | (2 << 24),
+		0,
+		offset,
+		(depth << 16) | (OUTBYTES << 24),
+		0, 0, 0, 0,
+	};
+	for (int i = 0; i < 8; i++)
+		h[i][lane] = blake2s_iv[i] ^ param[i];
+}
+
+static void blake2sp_init(struct Blake2spState *st)
+{
+	memset(st, 0, sizeof(*st));
+	for (int l = 0; l < LANES; l++)
+		init_node(st->h, l, l, 0);
+}
+
+static void blake2sp_update(struct Blake2spState *st, const uint8_t *data, size_t len)
+{
+	/* complete buffered stripes first */
+	while (st->buflen > 0) {
+		if (st->buflen + len <= BUFMAX) {
+			memcpy(st->buf + st->buflen, data, len);
+			st->buflen += len;
+			return;
+		}
+		if (st->buflen < STRIPE) {
+			size_t need = STRIPE - st->buflen;
+			memcpy(st->buf + st->buflen, data, need);
+			st->buflen += need;
+			data += need;
+			len -= need;
+		}
+		compress_stripes(st, st->buf, 1);
+		st->buflen -= STRIPE;
+		memmove(st->buf, st->buf + STRIPE, st->buflen);
+	}
+
+	/* stripes directly from input */
+	if (len > BUFMAX) {
+		size_t nstripes = (len - BUFMAX + STRIPE - 1) / STRIPE;
+		compress_stripes(st, data, nstripes);
+		data += nstripes * STRIPE;
+		len -= nstripes * STRIPE;
+	}
+	memcpy(st->buf, data, len);
+	st->buflen = len;
+}
+
+static void blake2sp_final(struct Blake2spState *st, uint8_t *out)
+{
+	uint32_t m[16][LANES];
+	uint32_t t0[LANES], t1[LANES], f0[LANES], f1[LANES];
+	uint32_t saved[8][LANES];
+	uint8_t blocks[STRIPE];
+	uint8_t leaves[LANES * OUTBYTES];
+	size_t lens[LANES];
+	bool two[LANES];
+	uint64_t total;
+
+	/* lanes that have two buffered blocks, first one is not final */
+	for (int l = 0; l < LANES; l++) {
+		two[l] = st->buflen > (size_t)(STRIPE + l * BLOCK);
+		total = st->count + BLOCK;
+		t0[l] = (uint32_t)total;
+		t1[l] = (uint32_t)(total >> 32);
+		f0[l] = f1[l] = 0;
+	}
+	if (st->buflen > STRIPE) {
+		memcpy(saved, st->h, sizeof(saved));
+		load_stripe(m, st->buf);
+		compress(st->h, m, t0, t1, f0, f1);
+		for (int l = 0; l < LANES; l++) {
+			if (!two[l]) {
+				for (int i = 0; i < 8; i++)
+					st->h[i][l] = saved[i][l];
+			}
+		}
+	}
+
+	/* last block of each lane, zero-padded */
+	memset(blocks, 0, sizeof(blocks));
+	for (int l = 0; l < LANES; l++) {
+		size_t ofs = (two[l] ? STRIPE : 0) + l * BLOCK;
+		size_t len = st->buflen > ofs ? st->buflen - ofs : 0;
+		lens[l] = len > BLOCK ? BLOCK : len;
+		memcpy(blocks + l * BLOCK, st->buf + ofs, lens[l]);
+		total = st->count + (two[l] ? BLOCK : 0) + lens[l];
+		t0[l] = (uint32_t)total;
+		t1[l] = (uint32_t)(total >> 32);
+		f0[l] = 0xFFFFFFFF;
+		f1[l] = (l == LANES - 1) ? 0xFFFFFFFF : 0;
+	}
+	load_stripe(m, blocks);
+	compress(st->h, m, t0, t1, f0, f1);
+
+	for (int l = 0; l < LANES; l++) {
+		for (int i = 0; i < 8; i++)
+			store_le32(leaves + l * OUTBYTES + i * 4, st->h[i][l]);
+	}
+
+	/* root node over leaf digests, only lane 0 is used */
+	uint32_t root[8][LANES];
+	memset(root, 0, sizeof(root));
+	memset(m, 0, sizeof(m));
+	init_node(root, 0, 0, 1);
+	for (int n = 0; n < 4; n++) {
+		bool last = n == 3;
+		for (int i = 0; i < 16; i++)
+			m[i][0] = load_le32(leaves + n * BLOCK + i * 4);
+		t0[0] = (n + 1) * BLOCK;
+		t1[0] = 0;
+		f0[0] = f1[0] = last ? 0xFFFFFFFF : 0;
+		compress(root, m, t0, t1, f0, f1);
+	}
+	for (int i = 0; i < 8; i++)
+		store_le32(out + i * 4, root[i][0]);
+}
+
+/*
+ * Python type
+ */
+
+static PyObject *blake2sp_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+	if (!PyArg_ParseTuple(args, ":blake2sp"))
+		return NULL;
+	if (kwargs != NULL && PyDict_Size(kwargs) > 0) {
+		PyErr_SetString(PyExc_TypeError, "blake2sp() takes no keyword arguments");
+		return NULL;
+	}
+
+	allocfunc alloc = (allocfunc)PyType_GetSlot(type, Py_tp_alloc);
+	Blake2spObject *self = (Blake2spObject *)alloc(type, 0);
+	if (self == NULL)
+		return NULL;
+	self->lock = PyThread_allocate_lock();
+	if (self->lock == NULL) {
+		Py_DECREF(self);
+		PyErr_SetString(PyExc_MemoryError, "cannot allocate lock");
+		return NULL;
+	}
+	blake2sp_init(&self->st);
+	return (PyObject *)self;
+}
+
+static void blake2sp_dealloc(PyObject *obj)
+{
+	Blake2spObject *self = (Blake2spObject *)obj;
+	PyTypeObject *tp = Py_TYPE(obj);
+
+	if (self->lock != NULL)
+		PyThread_free_lock(self->lock);
+	freefunc tp_free = (freefunc)PyType_GetSlot(tp, Py_tp_free);
+	tp_free(obj);
+	Py_DECREF(tp);
+}
+
+static void lock_state(Blake2spObject *self)
+{
+	if (!PyThread_acquire_lock(self->lock, 0)) {
+		Py_BEGIN_ALLOW_THREADS
+		PyThread_acquire_lock(self->lock, 1);
+		Py_END_ALLOW_THREADS
+	}
+}
+
+/* data must stay valid and unchanged while GIL is released */
+static void hash_data(Blake2spObject *self, const uint8_t *data, size_t len)
+{
+	if (len >= GIL_MINSIZE) {
+		Py_BEGIN_ALLOW_THREADS
+		PyThread_acquire_lock(self->lock, 1);
+		blake2sp_update(&self->st, data, len);
+		PyThread_release_lock(self->lock);
+		Py_END_ALLOW_THREADS
+	} else {
+		lock_state(self);
+		blake2sp_update(&self->st, data, len);
+		PyThread_release_lock(self->lock);
+	}
+}
+
+#ifdef HAVE_BUFFER_API
+
+static int hash_object(Blake2spObject *self, PyObject *arg)
+{
+	Py_buffer view;
+
+	if (PyObject_GetBuffer(arg, &view, PyBUF_SIMPLE) < 0)
+		return -1;
+	hash_data(self, view.buf, (size_t)view.len);
+	PyBuffer_Release(&view);
+	return 0;
+}
+
+#else
+
+/*
+ * Bytearray cannot be resized while memoryview of it exists,
+ * so it is hashed in-place.  Other objects are copied in pieces,
+ * to avoid full copy of large buffers.
+ */
+static int hash_object(Blake2spObject *self, PyObject *arg)
+{
+	PyObject *view = PyMemoryView_FromObject(arg);
+	PyObject *flat;
+	Py_ssize_t total;
+
+	if (view == NULL)
+		return -1;
+	if (PyByteArray_Check(arg)) {
+		hash_data(self, (const uint8_t *)PyByteArray_AsString(arg), (size_t)PyByteArray_Size(arg));
+		Py_DECREF(view);
+		return 0;
+	}
+
+	flat = PyObject_CallMethod(view, "cast", "s", "B");
+	Py_DECREF(view);
+	if (flat == NULL)
+		return -1;
+	total = PyObject_Length(flat);
+	for (Py_ssize_t pos = 0; pos < total; pos += COPY_CHUNK) {
+		Py_ssize_t end = total - pos > COPY_CHUNK ? pos + COPY_CHUNK : total;
+		PyObject *part = PySequence_GetSlice(flat, pos, end);
+		PyObject *bytes = part ? PyBytes_FromObject(part) : NULL;
+
+		Py_XDECREF(part);
+		if (bytes == NULL) {
+			Py_DECREF(flat);
+			return -1;
+		}
+		hash_data(self, (const uint8_t *)PyBytes_AsString(bytes), (size_t)PyBytes_Size(bytes));
+		Py_DECREF(bytes);
+	}
+	Py_DECREF(flat);
+	return total < 0 ? -1 : 0;
+}
+
+#endif
+
+static PyObject *blake2sp_update_meth(PyObject *obj, PyObject *arg)
+{
+	Blake2spObject *self = (Blake2spObject *)obj;
+
+	if (PyBytes_Check(arg)) {
+		hash_data(self, (const uint8_t *)PyBytes_AsString(arg), (size_t)PyBytes_Size(arg));
+	} else if (hash_object(self, arg) < 0) {
+		return NULL;
+	}
+	Py_RETURN_NONE;
+}
+
+static PyObject *blake2sp_digest_meth(PyObject *obj, PyObject *unused)
+{
+	Blake2spObject *self = (Blake2spObject *)obj;
+	struct Blake2spState *tmp;
+	uint8_t out[OUTBYTES];
+
+	tmp = PyMem_Malloc(sizeof(*tmp));
+	if (tmp == NULL)
+		return PyErr_NoMemory();
+	lock_state(self);
+	memcpy(tmp, &self->st, sizeof(*tmp));
+	PyThread_release_lock(self->lock);
+
+	blake2sp_final(tmp, out);
+	PyMem_Free(tmp);
+	return PyBytes_FromStringAndSize((const char *)out, OUTBYTES);
+}
+
+static PyMethodDef blake2sp_methods[] = {
+	{"update", blake2sp_update_meth, METH_O, "update(data) -> None"},
+	{"digest", blake2sp_digest_meth, METH_NOARGS, "digest() -> bytes"},
+	{NULL},
+};
+
+static PyType_Slot blake2sp_slots[] = {
+	{Py_tp_new, blake2sp_new},
+	{Py_tp_dealloc, blake2sp_dealloc},
+	{Py_tp_methods, blake2sp_methods},
+	{Py_tp_doc, "blake2sp() -> BLAKE2sp hash context"},
+	{0, NULL},
+};
+
+static PyType_Spec blake2sp_spec = {
+	.name = "rarfile._crypto.blake2sp",
+	.basicsize = sizeof(Blake2spObject),
+	.flags = Py_TPFLAGS_DEFAULT,
+	.slots = blake2sp_slots,
+};
+
+int blake2sp_add_type(PyObject *module)
+{
+	PyObject *type = PyType_FromSpec(&blake2sp_spec);
+	if (type == NULL)
+		return -1;
+	int res = PyModule_AddObjectRef(module, "blake2sp", type);
+	Py_DECREF(type);
+	return res;
+}
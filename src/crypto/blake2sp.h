@@ -0,0 +1,6 @@
+#ifndef CRYPTO_BLAKE2SP_H
+#define CRYPTO_BLAKE2SP_H
+
+int blake2sp_add_type(PyObject *module);
+
+#endif
@@ -4,7 +4,11 @@
 
 #include <Python.h>
 
+#include "blake2sp.h"
+#include "pbkdf2.h"
 #include "rar3_s2k_core.h"
+#include "rar5_header.h"
+#include "rar5_unpack.h"
 
 static PyMethodDef crypto_methods[] = {
 	{
@@ -12,10 +16,31 @@ static PyMethodDef crypto_methods[] = {
 	 rar3_s2k_core,
 	 METH_O,
 	 "rar3_s2k_core(seed) -> (key, iv)"},
+	{
+	 "rar5_unpack",
+	 rar5_unpack,
+	 METH_VARARGS,
+	 "rar5_unpack(data, size, extra_dist[, fd]) -> bytes or None"},
+	{
+	 "rar5_parse_header",
+	 rar5_parse_header,
+	 METH_VARARGS,
+	 "rar5_parse_header(hdata) -> (crc, fields)"},
+	{
+	 "rar5_pbkdf2",
+	 rar5_pbkdf2,
+	 METH_VARARGS,
+	 "rar5_pbkdf2(pwd, salt, count) -> (key, hash_key, check)"},
 	{NULL},
 };
 
+static int crypto_exec(PyObject *module)
+{
+	return blake2sp_add_type(module);
+}
+
 static PyModuleDef_Slot crypto_slots[] = {
+	{Py_mod_exec, crypto_exec},
 #ifdef Py_GIL_DISABLED
 	{Py_mod_gil, Py_MOD_GIL_NOT_USED},
 #endif
@@ -0,0 +1,371 @@
+/*
+ * PBKDF2-HMAC-SHA256 for RAR5 keys.
+ *
+ * RAR5 takes password check value and hash key from same chain
+ * as the key, after 16 and 32 more iterations.  All three are
+ * collected in one pass, with HMAC pad states computed once.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <string.h>
+
+#if defined(__x86_64__) && (defined(__GNUC__) || defined(__clang__))
+#define USE_SHANI
+#include <cpuid.h>
+#include <immintrin.h>
+#endif
+
+#include "pbkdf2.h"
+
+#define KDF_EXTRA 32
+#define HASH_KEY_EXTRA 16
+
+struct SHA256 {
+	uint32_t h[8];
+	uint64_t nbytes;
+	size_t pos;
+	uint8_t buf[64];
+};
+
+static const uint32_t sha256_k[64] = {
+	0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+	0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+	0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+	0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+	0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+	0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+	0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+	0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+};
+
+static const uint32_t sha256_iv[8] = {
+	0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+};
+
+static inline uint32_t load_be32(const uint8_t *p)
+{
+	return (uint32_t)(p[0]) << 24 |
+	    (uint32_t)(p[1]) << 16 | (uint32_t)(p[2]) << 8 | (uint32_t)(p[3]);
+}
+
+static inline void store_be32(uint8_t *p, uint32_t x)
+{
+	p[0] = (x >> 24) & 0xFF;
+	p[1] = (x >> 16) & 0xFF;
+	p[2] = (x >> 8) & 0xFF;
+	p[3] = x & 0xFF;
+}
+
+static inline uint32_t ror32(uint32_t x, int n)
+{
+	return (x >> n) | (x << (32 - n));
+}
+
+#define S0(x) (ror32(x, 2) ^ ror32(x, 13) ^ ror32(x, 22))
+#define S1(x) (ror32(x, 6) ^ ror32(x, 11) ^ ror32(x, 25))
+#define s0(x) (ror32(x, 7) ^ ror32(x, 18) ^ ((x) >> 3))
+#define s1(x) (ror32(x, 17) ^ ror32(x, 19) ^ ((x) >> 10))
+#define CH(x, y, z) (((x) & (y)) ^ (~(x) & (z)))
+#define MAJ(x, y, z) (((x) & (y)) ^ ((x) & (z)) ^ ((y) & (z)))
+
+#define ROUND(a, b, c, d, e, f, g, h, i) \
+	do { \
+		if ((i) >= 16) \
+			w[(i) & 15] += s1(w[((i) - 2) & 15]) + w[((i) - 7) & 15] + s0(w[((i) - 15) & 15]); \
+		uint32_t t1 = h + S1(e) + CH(e, f, g) + sha256_k[i] + w[(i) & 15]; \
+		uint32_t t2 = S0(a) + MAJ(a, b, c); \
+		d += t1; \
+		h = t1 + t2; \
+	} while (0)
+
+#define ROUND8(i) \
+	ROUND(a, b, c, d, e, f, g, h, i); \
+	ROUND(h, a, b, c, d, e, f, g, i + 1); \
+	ROUND(g, h, a, b, c, d, e, f, i + 2); \
+	ROUND(f, g, h, a, b, c, d, e, i + 3); \
+	ROUND(e, f, g, h, a, b, c, d, i + 4); \
+	ROUND(d, e, f, g, h, a, b, c, i + 5); \
+	ROUND(c, d, e, f, g, h, a, b, i + 6); \
+	ROUND(b, c, d, e, f, g, h, a, i + 7)
+
+typedef void (*compress_fn)(uint32_t state[8], uint32_t w[16]);
+
+/* compress block given as 16 big-endian words, words are overwritten */
+static void sha256_compress(uint32_t state[8], uint32_t w[16])
+{
+	uint32_t a = state[0], b = state[1], c = state[2], d = state[3];
+	uint32_t e = state[4], f = state[5], g = state[6], h = state[7];
+
+	ROUND8(0);
+	ROUND8(8);
+	ROUND8(16);
+	ROUND8(24);
+	ROUND8(32);
+	ROUND8(40);
+	ROUND8(48);
+	ROUND8(56);
+
+	state[0] += a;
+	state[1] += b;
+	state[2] += c;
+	state[3] += d;
+	state[4] += e;
+	state[5] += f;
+	state[6] += g;
+	state[7] += h;
+}
+
+#ifdef USE_SHANI
+
+/* four rounds, message schedule of next blocks is interleaved */
+#define SHANI_ROUNDS(q, m0, m1, m2, m3) \
+	do { \
+		msg = _mm_add_epi32(m0, _mm_loadu_si128((const __m128i *)&sha256_k[(q) * 4])); \
+		st1 = _mm_sha256rnds2_epu32(st1, st0, msg); \
+		if ((q) >= 3 && (q) <= 14) { \
+			tmp = _mm_alignr_epi8(m0, m3, 4); \
+			m1 = _mm_add_epi32(m1, tmp); \
+			m1 = _mm_sha256msg2_epu32(m1, m0); \
+		} \
+		msg = _mm_shuffle_epi32(msg, 0x0E); \
+		st0 = _mm_sha256rnds2_epu32(st0, st1, msg); \
+		if ((q) >= 1 && (q) <= 12) \
+			m3 = _mm_sha256msg1_epu32(m3, m0); \
+	} while (0)
+
+__attribute__((target("sha,sse4.1")))
+static void sha256_compress_shani(uint32_t state[8], uint32_t w[16])
+{
+	__m128i st0, st1, msg, tmp, abef, cdgh;
+	__m128i m0, m1, m2, m3;
+
+	tmp = _mm_shuffle_epi32(_mm_loadu_si128((const __m128i *)&state[0]), 0xB1);
+	st1 = _mm_shuffle_epi32(_mm_loadu_si128((const __m128i *)&state[4]), 0x1B);
+	st0 = _mm_alignr_epi8(tmp, st1, 8);
+	st1 = _mm_blend_epi16(st1, tmp, 0xF0);
+	abef = st0;
+	cdgh = st1;
+
+	m0 = _mm_loadu_si128((const __m128i *)&w[0]);
+	m1 = _mm_loadu_si128((const __m128i *)&w[4]);
+	m2 = _mm_loadu_si128((const __m128i *)&w[8]);
+	m3 = _mm_loadu_si128((const __m128i *)&w[12]);
+
+	SHANI_ROUNDS(0, m0, m1, m2, m3);
+	SHANI_ROUNDS(1, m1, m2, m3, m0);
+	SHANI_ROUNDS(2, m2, m3, m0, m1);
+	SHANI_ROUNDS(3, m3, m0, m1, m2);
+	SHANI_ROUNDS(4, m0, m1, m2, m3);
+	SHANI_ROUNDS(5, m1, m2, m3, m0);
+	SHANI_ROUNDS(6, m2, m3, m0, m1);
+	SHANI_ROUNDS(7, m3, m0, m1, m2);
+	SHANI_ROUNDS(8, m0, m1, m2, m3);
+	SHANI_ROUNDS(9, m1, m2, m3, m0);
+	SHANI_ROUNDS(10, m2, m3, m0, m1);
+	SHANI_ROUNDS(11, m3, m0, m1, m2);
+	SHANI_ROUNDS(12, m0, m1, m2, m3);
+	SHANI_ROUNDS(13, m1, m2, m3, m0);
+	SHANI_ROUNDS(14, m2, m3, m0, m1);
+	SHANI_ROUNDS(15, m3, m0, m1, m2);
+
+	st0 = _mm_add_epi32(st0, abef);
+	st1 = _mm_add_epi32(st1, cdgh);
+	tmp = _mm_shuffle_epi32(st0, 0x1B);
+	st1 = _mm_shuffle_epi32(st1, 0xB1);
+	st0 = _mm_blend_epi16(tmp, st1, 0xF0);
+	st1 = _mm_alignr_epi8(st1, tmp, 8);
+	_mm_storeu_si128((__m128i *)&state[0], st0);
+	_mm_storeu_si128((__m128i *)&state[4], st1);
+}
+
+static bool have_shani(void)
+{
+	unsigned int a, b, c, d;
+
+	if (!__get_cpuid(1, &a, &b, &c, &d) || !(c & bit_SSE4_1))
+		return false;
+	if (!__get_cpuid_count(7, 0, &a, &b, &c, &d))
+		return false;
+	return (b & (1u << 29)) != 0;
+}
+
+#endif
+
+static compress_fn select_compress(void)
+{
+#ifdef USE_SHANI
+	if (have_shani())
+		return sha256_compress_shani;
+#endif
+	return sha256_compress;
+}
+
+static void sha256_block(uint32_t state[8], const uint8_t *p)
+{
+	uint32_t w[16];
+
+	for (int i = 0; i < 16; i++)
+		w[i] = load_be32(p + i * 4);
+	sha256_compress(state, w);
+}
+
+static void sha256_init(struct SHA256 *ctx)
+{
+	memcpy(ctx->h, sha256_iv, sizeof(ctx->h));
+	ctx->nbytes = 0;
+	ctx->pos = 0;
+}
+
+static void sha256_update(struct SHA256 *ctx, const uint8_t *data, size_t len)
+{
+	ctx->nbytes += len;
+	while (len > 0) {
+		size_t blk = 64 - ctx->pos;
+		if (blk > len)
+			blk = len;
+		memcpy(ctx->buf + ctx->pos, data, blk);
+		ctx->pos += blk;
+		data += blk;
+		len -= blk;
+		if (ctx->pos == 64) {
+			sha256_block(ctx->h, ctx->buf);
+			ctx->pos = 0;
+		}
+	}
+}
+
+static void sha256_final(struct SHA256 *ctx, uint8_t out[32])
+{
+	uint64_t bits = ctx->nbytes * 8;
+
+	ctx->buf[ctx->pos++] = 0x80;
+	if (ctx->pos > 56) {
+		memset(ctx->buf + ctx->pos, 0, 64 - ctx->pos);
+		sha256_block(ctx->h, ctx->buf);
+		ctx->pos = 0;
+	}
+	memset(ctx->buf + ctx->pos, 0, 56 - ctx->pos);
+	store_be32(ctx->buf + 56, (uint32_t)(bits >> 32));
+	store_be32(ctx->buf + 60, (uint32_t)bits);
+	sha256_block(ctx->h, ctx->buf);
+	for (int i = 0; i < 8; i++)
+		store_be32(out + i * 4, ctx->h[i]);
+}
+
+/* one HMAC round over previous 32-byte digest, as words */
+static inline void hmac_words(compress_fn compress, const uint32_t istate[8],
+			      const uint32_t ostate[8], uint32_t u[8])
+{
+	uint32_t st[8], w[16];
+
+	memcpy(st, istate, sizeof(st));
+	memcpy(w, u, 32);
+	w[8] = 0x80000000;
+	memset(w + 9, 0, 6 * 4);
+	w[15] = (64 + 32) * 8;
+	compress(st, w);
+
+	memcpy(w, st, 32);
+	w[8] = 0x80000000;
+	memset(w + 9, 0, 6 * 4);
+	w[15] = (64 + 32) * 8;
+	memcpy(u, ostate, 32);
+	compress(u, w);
+}
+
+static void store_words(uint8_t out[32], const uint32_t f[8])
+{
+	for (int i = 0; i < 8; i++)
+		store_be32(out + i * 4, f[i]);
+}
+
+/* fills key, hash key and raw check value, 32 bytes each */
+static void rar5_pbkdf2_core(const uint8_t *pwd, size_t pwd_len,
+			     const uint8_t *salt, size_t salt_len,
+			     uint32_t count, uint8_t out[3][32])
+{
+	compress_fn compress = select_compress();
+	struct SHA256 ctx;
+	uint8_t keybuf[64] = { 0 };
+	uint8_t pad[64];
+	uint8_t digest[32];
+	uint32_t istate[8], ostate[8], u[8], f[8];
+
+	if (pwd_len > 64) {
+		sha256_init(&ctx);
+		sha256_update(&ctx, pwd, pwd_len);
+		sha256_final(&ctx, keybuf);
+	} else {
+		memcpy(keybuf, pwd, pwd_len);
+	}
+
+	/* pad states */
+	for (int i = 0; i < 64; i++)
+		pad[i] = keybuf[i] ^ 0x36;
+	memcpy(istate, sha256_iv, sizeof(istate));
+	sha256_block(istate, pad);
+	for (int i = 0; i < 64; i++)
+		pad[i] = keybuf[i] ^ 0x5C;
+	memcpy(ostate, sha256_iv, sizeof(ostate));
+	sha256_block(ostate, pad);
+
+	/* first iteration: HMAC(salt + INT(1)) */
+	static const uint8_t block_index[4] = { 0, 0, 0, 1 };
+	memcpy(ctx.h, istate, sizeof(istate));
+	ctx.nbytes = 64;
+	ctx.pos = 0;
+	sha256_update(&ctx, salt, salt_len);
+	sha256_update(&ctx, block_index, 4);
+	sha256_final(&ctx, digest);
+
+	memcpy(ctx.h, ostate, sizeof(ostate));
+	ctx.nbytes = 64;
+	ctx.pos = 0;
+	sha256_update(&ctx, digest, 32);
+	sha256_final(&ctx, digest);
+
+	for (int i = 0; i < 8; i++)
+		u[i] = f[i] = load_be32(digest + i * 4);
+	if (count == 1)
+		store_words(out[0], f);
+
+	uint32_t total = count + KDF_EXTRA;
+	for (uint32_t n = 2; n <= total; n++) {
+		hmac_words(compress, istate, ostate, u);
+		for (int i = 0; i < 8; i++)
+			f[i] ^= u[i];
+		if (n == count)
+			store_words(out[0], f);
+		else if (n == count + HASH_KEY_EXTRA)
+			store_words(out[1], f);
+	}
+	store_words(out[2], f);
+}
+
+PyObject *rar5_pbkdf2(PyObject *self, PyObject *args)
+{
+	const char *pwd, *salt;
+	Py_ssize_t pwd_len, salt_len;
+	unsigned long count;
+	uint8_t out[3][32];
+
+	if (!PyArg_ParseTuple(args, "y#y#k", &pwd, &pwd_len, &salt, &salt_len, &count))
+		return NULL;
+	if (count < 1 || count > (1UL << 24)) {
+		PyErr_SetString(PyExc_ValueError, "invalid iteration count");
+		return NULL;
+	}
+
+	Py_BEGIN_ALLOW_THREADS
+	rar5_pbkdf2_core((const uint8_t *)pwd, (size_t)pwd_len,
+			 (const uint8_t *)salt, (size_t)salt_len, (uint32_t)count, out);
+	Py_END_ALLOW_THREADS
+
+	return Py_BuildValue("(y#y#y#)", (const char *)out[0], (Py_ssize_t)32,
+			     (const char *)out[1], (Py_ssize_t)32,
+			     (const char *)out[2], (Py_ssize_t)32);
+}
@@ -0,0 +1,6 @@
+#ifndef CRYPTO_PBKDF2_H
+#define CRYPTO_PBKDF2_H
+
+PyObject *rar5_pbkdf2(PyObject *, PyObject *);
+
+#endif
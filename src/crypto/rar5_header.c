@@ -0,0 +1,468 @@
+/*
+ * RAR5 block header decoding in C.
+ *
+ * Calculates header CRC and decodes file and service blocks
+ * into tuple of raw values, Python side converts them
+ * into RarInfo.  Anything unusual is left to Python parser,
+ * so error reporting stays in one place.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <stdbool.h>
+#include <stdint.h>
+
+#include "rar5_header.h"
+
+#define BLOCK_FILE 2
+#define BLOCK_SERVICE 3
+
+#define BLOCK_FLAG_EXTRA_DATA 0x01
+#define BLOCK_FLAG_DATA_AREA 0x02
+
+#define FILE_FLAG_HAS_MTIME 0x02
+#define FILE_FLAG_HAS_CRC32 0x04
+
+#define XFILE_ENCRYPTION 1
+#define XFILE_HASH 2
+#define XFILE_TIME 3
+#define XFILE_VERSION 4
+#define XFILE_REDIR 5
+#define XFILE_OWNER 6
+
+#define XTIME_UNIXTIME 0x01
+#define XTIME_HAS_MTIME 0x02
+#define XTIME_HAS_CTIME 0x04
+#define XTIME_HAS_ATIME 0x08
+#define XTIME_UNIXTIME_NS 0x10
+
+#define XENC_CHECKVAL 0x01
+
+#define XHASH_BLAKE2SP 0
+
+#define XOWNER_UNAME 0x01
+#define XOWNER_GNAME 0x02
+#define XOWNER_UID 0x04
+#define XOWNER_GID 0x08
+
+struct Reader {
+	const uint8_t *buf;
+	Py_ssize_t pos;
+	Py_ssize_t end;
+	bool err;
+};
+
+static const uint32_t crc_nibble[16] = {
+	0x00000000, 0x1DB71064, 0x3B6E20C8, 0x26D930AC,
+	0x76DC4190, 0x6B6B51F4, 0x4DB26158, 0x5005713C,
+	0xEDB88320, 0xF00F9344, 0xD6D6A3E8, 0xCB61B38C,
+	0x9B64C2B0, 0x86D3D2D4, 0xA00AE278, 0xBDBDF21C,
+};
+
+static uint32_t crc32_calc(const uint8_t *p, Py_ssize_t len)
+{
+	uint32_t crc = 0xFFFFFFFF;
+
+	while (len-- > 0) {
+		crc ^= *p++;
+		crc = (crc >> 4) ^ crc_nibble[crc & 15];
+		crc = (crc >> 4) ^ crc_nibble[crc & 15];
+	}
+	return crc ^ 0xFFFFFFFF;
+}
+
+/* same limits as load_vint(), values over 64 bits are errors */
+static uint64_t get_vint(struct Reader *r)
+{
+	uint64_t res = 0;
+	unsigned int shift = 0;
+	Py_ssize_t limit = r->pos + 11;
+
+	if (limit > r->end)
+		limit = r->end;
+	while (r->pos < limit) {
+		uint64_t b = r->buf[r->pos++];
+		uint64_t v = b & 0x7F;
+
+		if (v) {
+			if (shift >= 64 || (shift > 57 && (v >> (64 - shift)) != 0)) {
+				r->err = true;
+				return 0;
+			}
+			res |= v << shift;
+		}
+		if (b < 0x80)
+			return res;
+		shift += 7;
+	}
+	r->err = true;
+	return 0;
+}
+
+static uint64_t get_le(struct Reader *r, int nbytes)
+{
+	uint64_t res = 0;
+	int i;
+
+	if (r->end - r->pos < nbytes) {
+		r->err = true;
+		return 0;
+	}
+	for (i = 0; i < nbytes; i++)
+		res |= (uint64_t)r->buf[r->pos + i] << (8 * i);
+	r->pos += nbytes;
+	return res;
+}
+
+static const uint8_t *get_bytes(struct Reader *r, uint64_t len)
+{
+	const uint8_t *res;
+
+	if ((uint64_t)(r->end - r->pos) < len) {
+		r->err = true;
+		return NULL;
+	}
+	res = r->buf + r->pos;
+	r->pos += (Py_ssize_t)len;
+	return res;
+}
+
+/* bytes object for fixed-size or vint-prefixed field */
+static PyObject *new_bytes(struct Reader *r, Py_ssize_t len)
+{
+	const uint8_t *p;
+
+	if (len < 0)
+		len = (Py_ssize_t)get_vint(r);
+	if (r->err)
+		return NULL;
+	p = get_bytes(r, (uint64_t)len);
+	if (!p)
+		return NULL;
+	return PyBytes_FromStringAndSize((const char *)p, len);
+}
+
+static PyObject *new_uint(uint64_t val)
+{
+	return PyLong_FromUnsignedLongLong(val);
+}
+
+static PyObject *new_opt_uint(bool present, uint64_t val)
+{
+	if (!present)
+		Py_RETURN_NONE;
+	return PyLong_FromUnsignedLongLong(val);
+}
+
+/*
+ * Build record tuple, object args are stolen.
+ * Returns NULL without exception if reader failed.
+ */
+static PyObject *pack_record(struct Reader *r, Py_ssize_t n, PyObject **items)
+{
+	PyObject *res = NULL;
+	Py_ssize_t i;
+
+	for (i = 0; i < n; i++) {
+		if (!items[i])
+			goto out;
+	}
+	if (r->err)
+		goto out;
+	res = PyTuple_New(n);
+	if (!res)
+		goto out;
+	for (i = 0; i < n; i++) {
+		PyTuple_SetItem(res, i, items[i]);
+		items[i] = NULL;
+	}
+out:
+	for (i = 0; i < n; i++)
+		Py_XDECREF(items[i]);
+	return res;
+}
+
+static PyObject *parse_xtime(struct Reader *r, uint64_t xtype)
+{
+	static const uint64_t bits[3] = { XTIME_HAS_MTIME, XTIME_HAS_CTIME, XTIME_HAS_ATIME };
+	uint64_t tflags = get_vint(r);
+	uint64_t times[3] = { 0 }, nsecs[3] = { 0 };
+	int tsize = (tflags & XTIME_UNIXTIME) ? 4 : 8;
+	bool has_ns = (tflags & XTIME_UNIXTIME_NS) != 0;
+	PyObject *items[8];
+	int i;
+
+	for (i = 0; i < 3; i++) {
+		if (tflags & bits[i])
+			times[i] = get_le(r, tsize);
+	}
+	for (i = 0; i < 3; i++) {
+		if (has_ns && (tflags & bits[i]))
+			nsecs[i] = get_le(r, 4);
+	}
+	items[0] = new_uint(xtype);
+	items[1] = new_uint(tflags);
+	for (i = 0; i < 3; i++) {
+		items[2 + i] = new_opt_uint((tflags & bits[i]) != 0, times[i]);
+		items[5 + i] = new_opt_uint(has_ns && (tflags & bits[i]), nsecs[i]);
+	}
+	return pack_record(r, 8, items);
+}
+
+static PyObject *parse_xencryption(struct Reader *r, uint64_t xtype)
+{
+	PyObject *items[7];
+	uint64_t algo = get_vint(r);
+	uint64_t flags = get_vint(r);
+	uint64_t kdf_count = get_le(r, 1);
+
+	items[0] = new_uint(xtype);
+	items[1] = new_uint(algo);
+	items[2] = new_uint(flags);
+	items[3] = new_uint(kdf_count);
+	items[4] = new_bytes(r, 16);
+	items[5] = new_bytes(r, 16);
+	if (flags & XENC_CHECKVAL) {
+		items[6] = new_bytes(r, 12);
+	} else {
+		Py_INCREF(Py_None);
+		items[6] = Py_None;
+	}
+	return pack_record(r, 7, items);
+}
+
+static PyObject *parse_xhash(struct Reader *r, uint64_t xtype)
+{
+	PyObject *items[3];
+	uint64_t hash_type = get_vint(r);
+
+	items[0] = new_uint(xtype);
+	items[1] = new_uint(hash_type);
+	if (hash_type == XHASH_BLAKE2SP) {
+		items[2] = new_bytes(r, 32);
+	} else {
+		Py_INCREF(Py_None);
+		items[2] = Py_None;
+	}
+	return pack_record(r, 3, items);
+}
+
+static PyObject *parse_xversion(struct Reader *r, uint64_t xtype)
+{
+	PyObject *items[3];
+	uint64_t flags = get_vint(r);
+	uint64_t version = get_vint(r);
+
+	items[0] = new_uint(xtype);
+	items[1] = new_uint(flags);
+	items[2] = new_uint(version);
+	return pack_record(r, 3, items);
+}
+
+static PyObject *parse_xredir(struct Reader *r, uint64_t xtype)
+{
+	PyObject *items[4];
+	uint64_t redir_type = get_vint(r);
+	uint64_t flags = get_vint(r);
+
+	items[0] = new_uint(xtype);
+	items[1] = new_uint(redir_type);
+	items[2] = new_uint(flags);
+	items[3] = new_bytes(r, -1);
+	return pack_record(r, 4, items);
+}
+
+static PyObject *parse_xowner(struct Reader *r, uint64_t xtype)
+{
+	PyObject *items[5];
+	uint64_t flags = get_vint(r);
+	uint64_t uid = 0, gid = 0;
+
+	items[0] = new_uint(xtype);
+	if (flags & XOWNER_UNAME) {
+		items[1] = new_bytes(r, -1);
+	} else {
+		Py_INCREF(Py_None);
+		items[1] = Py_None;
+	}
+	if (flags & XOWNER_GNAME) {
+		items[2] = new_bytes(r, -1);
+	} else {
+		Py_INCREF(Py_None);
+		items[2] = Py_None;
+	}
+	if (flags & XOWNER_UID)
+		uid = get_vint(r);
+	if (flags & XOWNER_GID)
+		gid = get_vint(r);
+	items[3] = new_opt_uint((flags & XOWNER_UID) != 0, uid);
+	items[4] = new_opt_uint((flags & XOWNER_GID) != 0, gid);
+	return pack_record(r, 5, items);
+}
+
+/* walk extra area, unknown record types are skipped */
+static PyObject *parse_extra(struct Reader *r)
+{
+	PyObject *list, *rec;
+
+	list = PyList_New(0);
+	if (!list)
+		return NULL;
+
+	/* allow 1 byte of garbage */
+	while (r->pos < r->end - 1) {
+		struct Reader x;
+		uint64_t xsize, xtype;
+
+		xsize = get_vint(r);
+		x.pos = r->pos;
+		if (r->err || !get_bytes(r, xsize))
+			goto failed;
+		x.buf = r->buf;
+		x.end = r->pos;
+		x.err = false;
+
+		xtype = get_vint(&x);
+		if (x.err)
+			goto failed;
+		switch (xtype) {
+		case XFILE_ENCRYPTION:
+			rec = parse_xencryption(&x, xtype);
+			break;
+		case XFILE_HASH:
+			rec = parse_xhash(&x, xtype);
+			break;
+		case XFILE_TIME:
+			rec = parse_xtime(&x, xtype);
+			break;
+		case XFILE_VERSION:
+			rec = parse_xversion(&x, xtype);
+			break;
+		case XFILE_REDIR:
+			rec = parse_xredir(&x, xtype);
+			break;
+		case XFILE_OWNER:
+			rec = parse_xowner(&x, xtype);
+			break;
+		default:
+			continue;
+		}
+		if (!rec) {
+			r->err = x.err;
+			goto failed;
+		}
+		if (PyList_Append(list, rec) < 0) {
+			Py_DECREF(rec);
+			goto failed;
+		}
+		Py_DECREF(rec);
+	}
+	return list;
+
+failed:
+	Py_DECREF(list);
+	return NULL;
+}
+
+static PyObject *parse_file(struct Reader *r, uint64_t header_crc, uint64_t header_size, uint64_t block_type)
+{
+	PyObject *items[15];
+	uint64_t block_flags, extra_size = 0, add_size = 0;
+	uint64_t file_flags, file_size, mode, mtime = 0, crc = 0, compr, host_os;
+	const uint8_t *name;
+	uint64_t name_len, i;
+
+	block_flags = get_vint(r);
+	if (block_flags & BLOCK_FLAG_EXTRA_DATA)
+		extra_size = get_vint(r);
+	if (block_flags & BLOCK_FLAG_DATA_AREA)
+		add_size = get_vint(r);
+
+	file_flags = get_vint(r);
+	file_size = get_vint(r);
+	mode = get_vint(r);
+	if (file_flags & FILE_FLAG_HAS_MTIME)
+		mtime = get_le(r, 4);
+	if (file_flags & FILE_FLAG_HAS_CRC32)
+		crc = get_le(r, 4);
+	compr = get_vint(r);
+	host_os = get_vint(r);
+	name_len = get_vint(r);
+	name = get_bytes(r, name_len);
+	if (r->err)
+		return NULL;
+
+	/* truncate at NUL */
+	for (i = 0; i < name_len; i++) {
+		if (name[i] == 0) {
+			name_len = i;
+			break;
+		}
+	}
+
+	items[0] = new_uint(block_type);
+	items[1] = new_uint(header_crc);
+	items[2] = new_uint(header_size);
+	items[3] = new_uint(block_flags);
+	items[4] = new_uint(extra_size);
+	items[5] = new_uint(add_size);
+	items[6] = new_uint(file_flags);
+	items[7] = new_uint(file_size);
+	items[8] = new_uint(mode);
+	items[9] = new_opt_uint((file_flags & FILE_FLAG_HAS_MTIME) != 0, mtime);
+	items[10] = new_opt_uint((file_flags & FILE_FLAG_HAS_CRC32) != 0, crc);
+	items[11] = new_uint(compr);
+	items[12] = new_uint(host_os);
+	items[13] = PyBytes_FromStringAndSize((const char *)name, (Py_ssize_t)name_len);
+	if (extra_size)
+		items[14] = parse_extra(r);
+	else
+		items[14] = PyList_New(0);
+	return pack_record(r, 15, items);
+}
+
+/*
+ * rar5_parse_header(hdata) -> (calc_crc, fields)
+ *
+ * Fields is None if block is not file or service block
+ * or it could not be decoded.
+ */
+PyObject *rar5_parse_header(PyObject *self, PyObject *args)
+{
+	const char *data;
+	Py_ssize_t len;
+	struct Reader r;
+	uint64_t header_crc, hdrlen, header_size, block_type;
+	uint32_t calc_crc;
+	PyObject *fields = NULL;
+
+	if (!PyArg_ParseTuple(args, "y#", &data, &len))
+		return NULL;
+	if (len < 5) {
+		PyErr_SetString(PyExc_ValueError, "header too short");
+		return NULL;
+	}
+
+	calc_crc = crc32_calc((const uint8_t *)data + 4, len - 4);
+
+	r.buf = (const uint8_t *)data;
+	r.pos = 0;
+	r.end = len;
+	r.err = false;
+
+	header_crc = get_le(&r, 4);
+	hdrlen = get_vint(&r);
+	header_size = hdrlen + (uint64_t)r.pos;
+	block_type = get_vint(&r);
+	if (!r.err && (block_type == BLOCK_FILE || block_type == BLOCK_SERVICE)) {
+		fields = parse_file(&r, header_crc, header_size, block_type);
+		if (!fields && PyErr_Occurred())
+			return NULL;
+	}
+	if (!fields) {
+		Py_INCREF(Py_None);
+		fields = Py_None;
+	}
+	return Py_BuildValue("(kN)", (unsigned long)calc_crc, fields);
+}
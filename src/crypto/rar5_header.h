@@ -0,0 +1,6 @@
+#ifndef CRYPTO_RAR5_HEADER_H
+#define CRYPTO_RAR5_HEADER_H
+
+PyObject *rar5_parse_header(PyObject *, PyObject *);
+
+#endif
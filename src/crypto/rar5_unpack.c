@@ -0,0 +1,738 @@
+/*
+ * RAR5 decompression in C.
+ *
+ * Whole member is decoded in one go, output buffer works
+ * as LZ window, so only non-solid streams are supported.
+ * Output goes either to bytes object or, on POSIX, to file
+ * that is mapped to memory, so large output does not need
+ * to be kept in process heap.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <unistd.h>
+#define USE_FILE_OUTPUT
+#endif
+
+#include "rar5_unpack.h"
+
+#define NC 306
+#define DC_BASE 64
+#define DC_EXT 80
+#define LDC 16
+#define RC 44
+#define BC 20
+#define HUFF_TABLE_SIZE (NC + DC_EXT + LDC + RC)
+
+#define MAX_QUICK_BITS 10
+#define MAX_FILTER_BLOCK_SIZE 0x400000
+#define INPUT_PADDING 64
+
+enum {
+	FILTER_DELTA = 0,
+	FILTER_E8 = 1,
+	FILTER_E8E9 = 2,
+	FILTER_ARM = 3,
+};
+
+struct DecodeTable {
+	unsigned int max_num;
+	unsigned int quick_bits;
+	uint32_t decode_len[16];
+	uint32_t decode_pos[16];
+	uint16_t decode_num[NC];
+	uint8_t quick_len[1 << MAX_QUICK_BITS];
+	uint16_t quick_num[1 << MAX_QUICK_BITS];
+};
+
+struct BitInput {
+	uint8_t *buf;
+	size_t size;
+	size_t addr;
+	unsigned int bit;
+};
+
+struct Filter {
+	size_t start;
+	size_t length;
+	unsigned int type;
+	unsigned int channels;
+};
+
+struct Unpacker {
+	struct BitInput in;
+
+	uint8_t *out;
+	size_t out_size;
+	size_t pos;
+
+	size_t old_dist[4];
+	size_t last_length;
+	unsigned int dist_count;
+
+	/* current block */
+	size_t block_start;
+	size_t block_size;
+	unsigned int block_bits;
+	bool last_block;
+	bool table_present;
+	bool tables_read;
+
+	struct Filter *filters;
+	size_t nfilters;
+	size_t filters_cap;
+
+	struct DecodeTable ld;
+	struct DecodeTable dd;
+	struct DecodeTable ldd;
+	struct DecodeTable rd;
+	struct DecodeTable bd;
+};
+
+/*
+ * Bit input, MSB first.
+ */
+
+static inline uint32_t getbits(const struct BitInput *in)
+{
+	const uint8_t *p = in->buf + in->addr;
+	uint32_t v = ((uint32_t)p[0] << 16) | ((uint32_t)p[1] << 8) | (uint32_t)p[2];
+	return (v >> (8 - in->bit)) & 0xffff;
+}
+
+static inline uint32_t getbits32(const struct BitInput *in)
+{
+	const uint8_t *p = in->buf + in->addr;
+	uint32_t v = ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) |
+	    ((uint32_t)p[2] << 8) | (uint32_t)p[3];
+	v <<= in->bit;
+	v |= (uint32_t)p[4] >> (8 - in->bit);
+	return v;
+}
+
+static inline uint64_t getbits64(const struct BitInput *in)
+{
+	const uint8_t *p = in->buf + in->addr;
+	uint64_t v = 0;
+	for (int i = 0; i < 8; i++)
+		v = (v << 8) | p[i];
+	v <<= in->bit;
+	v |= (uint64_t)p[8] >> (8 - in->bit);
+	return v;
+}
+
+static inline void addbits(struct BitInput *in, unsigned int bits)
+{
+	bits += in->bit;
+	in->addr += bits >> 3;
+	in->bit = bits & 7;
+}
+
+static inline bool input_overrun(const struct BitInput *in)
+{
+	return in->addr > in->size;
+}
+
+/*
+ * Huffman tables.
+ */
+
+static void make_decode_table(struct DecodeTable *dec, const uint8_t *lengths, unsigned int size)
+{
+	uint32_t length_count[16] = { 0 };
+	uint32_t copy_pos[16];
+	uint32_t upper_limit = 0;
+
+	dec->max_num = size;
+	dec->quick_bits = (size == NC) ? MAX_QUICK_BITS : 7;
+
+	for (unsigned int i = 0; i < size; i++)
+		length_count[lengths[i] & 15]++;
+	length_count[0] = 0;
+
+	memset(dec->decode_num, 0, sizeof(dec->decode_num));
+	dec->decode_pos[0] = 0;
+	dec->decode_len[0] = 0;
+
+	for (unsigned int i = 1; i < 16; i++) {
+		upper_limit += length_count[i];
+		dec->decode_len[i] = upper_limit << (16 - i);
+		upper_limit *= 2;
+		dec->decode_pos[i] = dec->decode_pos[i - 1] + length_count[i - 1];
+	}
+
+	memcpy(copy_pos, dec->decode_pos, sizeof(copy_pos));
+	for (unsigned int i = 0; i < size; i++) {
+		unsigned int blen = lengths[i] & 15;
+		if (blen != 0) {
+			uint32_t last = copy_pos[blen];
+			if (last < NC)
+				dec->decode_num[last] = (uint16_t)i;
+			copy_pos[blen]++;
+		}
+	}
+
+	unsigned int cur_len = 1;
+	unsigned int quick_size = 1u << dec->quick_bits;
+	for (unsigned int code = 0; code < quick_size; code++) {
+		uint32_t bitfield = code << (16 - dec->quick_bits);
+		while (cur_len < 16 && bitfield >= dec->decode_len[cur_len])
+			cur_len++;
+		dec->quick_len[code] = (uint8_t)cur_len;
+		uint32_t dist = (bitfield - dec->decode_len[cur_len - 1]) >> (16 - cur_len);
+		uint32_t pos;
+		if (cur_len < 16 && (pos = dec->decode_pos[cur_len] + dist) < size)
+			dec->quick_num[code] = dec->decode_num[pos];
+		else
+			dec->quick_num[code] = 0;
+	}
+}
+
+static inline unsigned int decode_number(struct BitInput *in, const struct DecodeTable *dec)
+{
+	uint32_t bitfield = getbits(in) & 0xfffe;
+
+	if (bitfield < dec->decode_len[dec->quick_bits]) {
+		uint32_t code = bitfield >> (16 - dec->quick_bits);
+		addbits(in, dec->quick_len[code]);
+		return dec->quick_num[code];
+	}
+
+	unsigned int bits = 15;
+	for (unsigned int i = dec->quick_bits + 1; i < 15; i++) {
+		if (bitfield < dec->decode_len[i]) {
+			bits = i;
+			break;
+		}
+	}
+	addbits(in, bits);
+
+	uint32_t dist = (bitfield - dec->decode_len[bits - 1]) >> (16 - bits);
+	uint32_t pos = dec->decode_pos[bits] + dist;
+	if (pos >= dec->max_num)
+		pos = 0;
+	return dec->decode_num[pos];
+}
+
+/*
+ * Block structure.
+ */
+
+static bool read_block_header(struct Unpacker *u)
+{
+	struct BitInput *in = &u->in;
+
+	/* headers are byte-aligned */
+	if (in->bit) {
+		in->addr++;
+		in->bit = 0;
+	}
+	if (in->addr >= in->size)
+		return false;
+
+	uint8_t flags = in->buf[in->addr++];
+	unsigned int nbytes = ((flags >> 3) & 3) + 1;
+	if (nbytes == 4 || in->addr + 1 + nbytes > in->size)
+		return false;
+
+	uint8_t saved_sum = in->buf[in->addr++];
+	uint32_t bsize = 0;
+	for (unsigned int i = 0; i < nbytes; i++)
+		bsize += (uint32_t)in->buf[in->addr++] << (i * 8);
+
+	uint8_t sum = 0x5a ^ flags ^ bsize ^ (bsize >> 8) ^ (bsize >> 16);
+	if (sum != saved_sum)
+		return false;
+	if (in->addr + bsize > in->size)
+		return false;
+
+	u->block_start = in->addr;
+	u->block_size = bsize;
+	u->block_bits = (flags & 7) + 1;
+	u->last_block = (flags & 0x40) != 0;
+	u->table_present = (flags & 0x80) != 0;
+	return true;
+}
+
+static inline bool block_done(const struct Unpacker *u)
+{
+	const struct BitInput *in = &u->in;
+	size_t end = u->block_start + u->block_size;
+
+	return in->addr + 1 > end || (in->addr + 1 == end && in->bit >= u->block_bits);
+}
+
+static bool read_tables(struct Unpacker *u)
+{
+	struct BitInput *in = &u->in;
+	uint8_t bit_length[BC];
+	uint8_t table[HUFF_TABLE_SIZE];
+	unsigned int dc = (u->dist_count == DC_EXT) ? DC_EXT : DC_BASE;
+	unsigned int table_size = NC + dc + LDC + RC;
+
+	if (!u->table_present)
+		return true;
+
+	for (unsigned int i = 0; i < BC; i++) {
+		unsigned int length = getbits(in) >> 12;
+		addbits(in, 4);
+		if (length == 15) {
+			unsigned int zero_count = getbits(in) >> 12;
+			addbits(in, 4);
+			if (zero_count == 0) {
+				bit_length[i] = 15;
+			} else {
+				zero_count += 2;
+				while (zero_count-- > 0 && i < BC)
+					bit_length[i++] = 0;
+				i--;
+			}
+		} else {
+			bit_length[i] = (uint8_t)length;
+		}
+	}
+	make_decode_table(&u->bd, bit_length, BC);
+
+	for (unsigned int i = 0; i < table_size;) {
+		if (input_overrun(in))
+			return false;
+		unsigned int num = decode_number(in, &u->bd);
+		if (num < 16) {
+			table[i++] = (uint8_t)num;
+		} else if (num < 18) {
+			unsigned int n;
+			if (num == 16) {
+				n = (getbits(in) >> 13) + 3;
+				addbits(in, 3);
+			} else {
+				n = (getbits(in) >> 9) + 11;
+				addbits(in, 7);
+			}
+			if (i == 0)
+				return false;
+			while (n-- > 0 && i < table_size) {
+				table[i] = table[i - 1];
+				i++;
+			}
+		} else {
+			unsigned int n;
+			if (num == 18) {
+				n = (getbits(in) >> 13) + 3;
+				addbits(in, 3);
+			} else {
+				n = (getbits(in) >> 9) + 11;
+				addbits(in, 7);
+			}
+			while (n-- > 0 && i < table_size)
+				table[i++] = 0;
+		}
+	}
+	if (input_overrun(in))
+		return false;
+
+	make_decode_table(&u->ld, table, NC);
+	make_decode_table(&u->dd, table + NC, dc);
+	make_decode_table(&u->ldd, table + NC + dc, LDC);
+	make_decode_table(&u->rd, table + NC + dc + LDC, RC);
+	u->tables_read = true;
+	return true;
+}
+
+/*
+ * Filters.
+ */
+
+static uint32_t read_filter_data(struct BitInput *in)
+{
+	unsigned int nbytes = (getbits(in) >> 14) + 1;
+	uint32_t data = 0;
+
+	addbits(in, 2);
+	for (unsigned int i = 0; i < nbytes; i++) {
+		data += (getbits(in) >> 8) << (i * 8);
+		addbits(in, 8);
+	}
+	return data;
+}
+
+static bool read_filter(struct Unpacker *u)
+{
+	struct BitInput *in = &u->in;
+	struct Filter flt;
+
+	flt.start = u->pos + read_filter_data(in);
+	flt.length = read_filter_data(in);
+	if (flt.length > MAX_FILTER_BLOCK_SIZE)
+		flt.length = 0;
+	flt.type = getbits(in) >> 13;
+	addbits(in, 3);
+	flt.channels = 0;
+	if (flt.type == FILTER_DELTA) {
+		flt.channels = (getbits(in) >> 11) + 1;
+		addbits(in, 5);
+	}
+
+	if (u->nfilters == u->filters_cap) {
+		size_t cap = u->filters_cap ? u->filters_cap * 2 : 16;
+		struct Filter *tmp = realloc(u->filters, cap * sizeof(*tmp));
+		if (tmp == NULL)
+			return false;
+		u->filters = tmp;
+		u->filters_cap = cap;
+	}
+	u->filters[u->nfilters++] = flt;
+	return true;
+}
+
+static inline uint32_t load_le32(const uint8_t *p)
+{
+	return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+static inline void store_le32(uint8_t *p, uint32_t x)
+{
+	p[0] = x & 0xFF;
+	p[1] = (x >> 8) & 0xFF;
+	p[2] = (x >> 16) & 0xFF;
+	p[3] = (x >> 24) & 0xFF;
+}
+
+static void filter_e8(uint8_t *data, uint32_t size, uint32_t file_offset, bool e9)
+{
+	const uint32_t file_size = 0x1000000;
+	uint8_t cmp2 = e9 ? 0xe9 : 0xe8;
+
+	for (uint32_t pos = 0; pos + 4 < size;) {
+		uint8_t c = data[pos++];
+		if (c == 0xe8 || c == cmp2) {
+			uint32_t offset = (pos + file_offset) % file_size;
+			uint32_t addr = load_le32(data + pos);
+			if (addr & 0x80000000) {
+				if (((addr + offset) & 0x80000000) == 0)
+					store_le32(data + pos, addr + file_size);
+			} else if ((addr - file_size) & 0x80000000) {
+				store_le32(data + pos, addr - offset);
+			}
+			pos += 4;
+		}
+	}
+}
+
+static void filter_arm(uint8_t *data, uint32_t size, uint32_t file_offset)
+{
+	for (uint32_t pos = 0; pos + 3 < size; pos += 4) {
+		uint8_t *d = data + pos;
+		if (d[3] == 0xeb) {
+			uint32_t offset = d[0] | ((uint32_t)d[1] << 8) | ((uint32_t)d[2] << 16);
+			offset -= (file_offset + pos) / 4;
+			d[0] = offset & 0xFF;
+			d[1] = (offset >> 8) & 0xFF;
+			d[2] = (offset >> 16) & 0xFF;
+		}
+	}
+}
+
+static bool filter_delta(uint8_t *data, uint32_t size, unsigned int channels)
+{
+	uint8_t *src = malloc(size ? size : 1);
+	uint32_t src_pos = 0;
+
+	if (src == NULL)
+		return false;
+	memcpy(src, data, size);
+	for (unsigned int ch = 0; ch < channels; ch++) {
+		uint8_t prev = 0;
+		for (uint32_t dst_pos = ch; dst_pos < size; dst_pos += channels) {
+			prev -= src[src_pos++];
+			data[dst_pos] = prev;
+		}
+	}
+	free(src);
+	return true;
+}
+
+/*
+ * Filters work on final output, window keeps raw data.  As whole
+ * stream is already decoded, they can be applied in-place.
+ */
+static bool apply_filters(struct Unpacker *u)
+{
+	size_t done_end = 0;
+
+	for (size_t i = 0; i < u->nfilters; i++) {
+		const struct Filter *f = &u->filters[i];
+		if (f->length == 0 || f->start < done_end || f->start > u->out_size)
+			continue;
+		if (f->length > u->out_size - f->start)
+			continue;
+
+		uint8_t *data = u->out + f->start;
+		uint32_t size = (uint32_t)f->length;
+		uint32_t file_offset = (uint32_t)f->start;
+		switch (f->type) {
+		case FILTER_DELTA:
+			if (!filter_delta(data, size, f->channels))
+				return false;
+			break;
+		case FILTER_E8:
+		case FILTER_E8E9:
+			filter_e8(data, size, file_offset, f->type == FILTER_E8E9);
+			break;
+		case FILTER_ARM:
+			filter_arm(data, size, file_offset);
+			break;
+		default:
+			return false;
+		}
+		done_end = f->start + f->length;
+	}
+	return true;
+}
+
+/*
+ * LZ decoding.
+ */
+
+static inline size_t slot_to_length(struct BitInput *in, unsigned int slot)
+{
+	size_t length = 2;
+	unsigned int lbits;
+
+	if (slot < 8) {
+		lbits = 0;
+		length += slot;
+	} else {
+		lbits = slot / 4 - 1;
+		length += (size_t)(4 | (slot & 3)) << lbits;
+	}
+	if (lbits > 0) {
+		length += getbits(in) >> (16 - lbits);
+		addbits(in, lbits);
+	}
+	return length;
+}
+
+static inline bool copy_string(struct Unpacker *u, size_t length, size_t distance)
+{
+	if (distance == 0 || distance > u->pos)
+		return false;
+	if (length > u->out_size - u->pos)
+		length = u->out_size - u->pos;
+
+	uint8_t *dst = u->out + u->pos;
+	const uint8_t *src = dst - distance;
+	if (distance >= length) {
+		memcpy(dst, src, length);
+	} else {
+		for (size_t i = 0; i < length; i++)
+			dst[i] = src[i];
+	}
+	u->pos += length;
+	return true;
+}
+
+static inline void insert_old_dist(struct Unpacker *u, size_t distance)
+{
+	u->old_dist[3] = u->old_dist[2];
+	u->old_dist[2] = u->old_dist[1];
+	u->old_dist[1] = u->old_dist[0];
+	u->old_dist[0] = distance;
+}
+
+static bool unpack5(struct Unpacker *u)
+{
+	struct BitInput *in = &u->in;
+
+	if (!read_block_header(u) || !read_tables(u) || !u->tables_read)
+		return false;
+
+	while (u->pos < u->out_size) {
+		if (input_overrun(in))
+			return false;
+
+		/* empty blocks may contain only tables */
+		while (block_done(u)) {
+			if (u->last_block)
+				return false;
+			if (!read_block_header(u) || !read_tables(u))
+				return false;
+		}
+
+		unsigned int main_slot = decode_number(in, &u->ld);
+		if (main_slot < 256) {
+			u->out[u->pos++] = (uint8_t)main_slot;
+			continue;
+		}
+		if (main_slot >= 262) {
+			size_t length = slot_to_length(in, main_slot - 262);
+			size_t distance = 1;
+			unsigned int dbits;
+			unsigned int dist_slot = decode_number(in, &u->dd);
+
+			if (dist_slot < 4) {
+				dbits = 0;
+				distance += dist_slot;
+			} else {
+				dbits = dist_slot / 2 - 1;
+				distance += (size_t)(2 | (dist_slot & 1)) << dbits;
+			}
+			if (dbits > 0) {
+				if (dbits >= 4) {
+					if (dbits > 36) {
+						distance += (size_t)(getbits64(in) >> (68 - dbits)) << 4;
+						addbits(in, dbits - 4);
+					} else if (dbits > 4) {
+						distance += (size_t)(getbits32(in) >> (36 - dbits)) << 4;
+						addbits(in, dbits - 4);
+					}
+					distance += decode_number(in, &u->ldd);
+				} else {
+					distance += getbits32(in) >> (32 - dbits);
+					addbits(in, dbits);
+				}
+			}
+			if (distance > 0x100) {
+				length++;
+				if (distance > 0x2000) {
+					length++;
+					if (distance > 0x40000)
+						length++;
+				}
+			}
+			insert_old_dist(u, distance);
+			u->last_length = length;
+			if (!copy_string(u, length, distance))
+				return false;
+			continue;
+		}
+		if (main_slot == 256) {
+			if (!read_filter(u))
+				return false;
+			continue;
+		}
+		if (main_slot == 257) {
+			if (u->last_length != 0) {
+				if (!copy_string(u, u->last_length, u->old_dist[0]))
+					return false;
+			}
+			continue;
+		}
+
+		/* 258..261 - reuse old distance */
+		unsigned int dist_num = main_slot - 258;
+		size_t distance = u->old_dist[dist_num];
+		for (unsigned int i = dist_num; i > 0; i--)
+			u->old_dist[i] = u->old_dist[i - 1];
+		u->old_dist[0] = distance;
+
+		unsigned int length_slot = decode_number(in, &u->rd);
+		size_t length = slot_to_length(in, length_slot);
+		u->last_length = length;
+		if (!copy_string(u, length, distance))
+			return false;
+	}
+
+	return apply_filters(u);
+}
+
+/* decode into given buffer, sets Python error on failure */
+static bool unpack_buffer(const char *data, size_t data_len, uint8_t *out, size_t out_size, int extra_dist)
+{
+	bool ok;
+	struct Unpacker *u = calloc(1, sizeof(*u));
+	uint8_t *inbuf = calloc(data_len + INPUT_PADDING, 1);
+
+	if (u == NULL || inbuf == NULL) {
+		free(u);
+		free(inbuf);
+		PyErr_NoMemory();
+		return false;
+	}
+	memcpy(inbuf, data, data_len);
+
+	u->in.buf = inbuf;
+	u->in.size = data_len;
+	u->out = out;
+	u->out_size = out_size;
+	u->dist_count = extra_dist ? DC_EXT : DC_BASE;
+	for (int i = 0; i < 4; i++)
+		u->old_dist[i] = (size_t)-1;
+
+	Py_BEGIN_ALLOW_THREADS
+	ok = (out_size == 0) || unpack5(u);
+	Py_END_ALLOW_THREADS
+
+	free(u->filters);
+	free(u);
+	free(inbuf);
+	if (!ok)
+		PyErr_SetString(PyExc_ValueError, "corrupt compressed data");
+	return ok;
+}
+
+#ifdef USE_FILE_OUTPUT
+
+/* decode into file, which is resized to output size and mapped */
+static PyObject *unpack_to_file(const char *data, size_t data_len, size_t out_size, int extra_dist, int fd)
+{
+	uint8_t *out = NULL;
+	bool ok;
+
+	if (ftruncate(fd, (off_t)out_size) != 0)
+		return PyErr_SetFromErrno(PyExc_OSError);
+	if (out_size > 0) {
+		out = mmap(NULL, out_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+		if (out == MAP_FAILED)
+			return PyErr_SetFromErrno(PyExc_OSError);
+	}
+	ok = unpack_buffer(data, data_len, out, out_size, extra_dist);
+	if (out != NULL)
+		munmap(out, out_size);
+	if (!ok)
+		return NULL;
+	Py_RETURN_NONE;
+}
+
+#endif
+
+PyObject *rar5_unpack(PyObject *self, PyObject *args)
+{
+	const char *data;
+	Py_ssize_t data_len;
+	Py_ssize_t out_size;
+	int extra_dist;
+	int fd = -1;
+
+	if (!PyArg_ParseTuple(args, "y#np|i", &data, &data_len, &out_size, &extra_dist, &fd))
+		return NULL;
+	if (out_size < 0) {
+		PyErr_SetString(PyExc_ValueError, "invalid size");
+		return NULL;
+	}
+
+	if (fd >= 0) {
+#ifdef USE_FILE_OUTPUT
+		return unpack_to_file(data, (size_t)data_len, (size_t)out_size, extra_dist, fd);
+#else
+		PyErr_SetString(PyExc_NotImplementedError, "output to file not supported");
+		return NULL;
+#endif
+	}
+
+	PyObject *result = PyBytes_FromStringAndSize(NULL, out_size);
+	if (result == NULL)
+		return NULL;
+	if (!unpack_buffer(data, (size_t)data_len, (uint8_t *)PyBytes_AsString(result), (size_t)out_size, extra_dist)) {
+		Py_DECREF(result);
+		return NULL;
+	}
+	return result;
+}
@@ -0,0 +1,6 @@
+#ifndef CRYPTO_RAR5_UNPACK_H
+#define CRYPTO_RAR5_UNPACK_H
+
+PyObject *rar5_unpack(PyObject *, PyObject *);
+
+#endif
@@ -39,6 +39,7 @@ For decompression to work, either ``unrar`` or ``unar`` tool must be in PATH.
 from .archive import *
 from .backend import *
 from .bits import *
+from .catalog import *
 from .cli import *
 from .config import *
 from .crypto import *
@@ -46,9 +47,11 @@ from .crypto import have_crypto as _have_crypto
 from .errors import *
 from .format import *
 from .info import *
+from .path import *
 from .stream import *
 from .utils import *
 
-__all__ = ("get_rar_version", "is_rarfile", "is_rarfile_sfx", "RarInfo", "RarFile", "RarExtFile")
+__all__ = ("get_rar_version", "is_rarfile", "is_rarfile_sfx", "purge_kdf_cache", "RarInfo", "RarFile",
+           "RarExtFile", "RarCatalog", "Path")
 
 __version__ = "5.0.dev1"
@@ -2,25 +2,31 @@
 """
 
 import io
+import mmap
 import os
 import shutil
 import sys
+import tempfile
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from . import config
-from .backend import empty_read
+from .backend import check_returncode, custom_popen, empty_read, tool_setup
 from .bits import (
     DOS_MODE_READONLY, RAR5_ID, RAR5_XREDIR_ISDIR,
     RAR5_XREDIR_WINDOWS_JUNCTION, RAR_FILE_DIRECTORY, RAR_ID,
-    RAR_OS_MSDOS, RAR_OS_UNIX, RAR_OS_WIN32, RAR_V3, RAR_V5,
+    RAR_M0, RAR_OS_MSDOS, RAR_OS_UNIX, RAR_OS_WIN32, RAR_V3, RAR_V5,
 )
+from .cache import load_index, save_index
 from .errors import (
     BadRarFile, BadSymLinkError, NotRarFile,
     PasswordRequired, UnsupportedWarning,
 )
 from .format import RAR3Parser, RAR5Parser
-from .utils import XFile, is_filelike, sanitize_filename, to_nsecs
+from .stream import DirectReader
+from .tree import TreeIndex
+from .utils import XFile, is_filelike, membuf_tempfile, sanitize_filename
 
 # export only interesting items
 __all__ = (
@@ -30,30 +36,74 @@ __all__ = (
     "RarFile")
 
 
-def _find_sfx_header(xfile):
+def _sig_version(buf):
+    """Return archive version if buffer starts with signature.
+    """
+    if buf.startswith(RAR_ID):
+        return RAR_V3
+    if buf.startswith(RAR5_ID):
+        return RAR_V5
+    return 0
+
+
+def _scan_sig(buf, end):
+    """Search signature in buffer, return (ver, pos) or None.
+    """
     sig = RAR_ID[:-1]
-    buf = io.BytesIO()
-    steps = (64, config.SFX_MAX_SIZE)
+    pos = buf.find(sig, 0, end)
+    while pos >= 0:
+        ver = _sig_version(buf[pos:pos + len(RAR5_ID)])
+        if ver:
+            return ver, pos
+        pos = buf.find(sig, pos + 1, end)
+    return None
+
 
+def _mmap_find_sig(fd):
+    """Search signature in memory-mapped start of file.
+    """
+    try:
+        size = min(os.fstat(fd.fileno()).st_size, config.SFX_MAX_SIZE)
+        mm = mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    with mm:
+        return _scan_sig(mm, size) or (0, 0)
+
+
+def _chunked_find_sig(fd, buf):
+    """Search signature in chunks, with overlap between them.
+    """
+    keep = len(RAR5_ID) - 1
+    limit = config.SFX_MAX_SIZE
+    base = 0
+    while True:
+        res = _scan_sig(buf, len(buf))
+        if res:
+            return res[0], base + res[1]
+        want = min(config.BSIZE, limit - base - len(buf))
+        data = fd.read(want) if want > 0 else b""
+        if not data:
+            return 0, 0
+        tail = buf[-keep:]
+        base += len(buf) - len(tail)
+        buf = tail + data
+
+
+def _find_sfx_header(xfile):
     with XFile(xfile) as fd:
-        for step in steps:
-            data = fd.read(step)
-            if not data:
-                break
-            buf.write(data)
-            curdata = buf.getvalue()
-            findpos = 0
-            while True:
-                pos = curdata.find(sig, findpos)
-                if pos < 0:
-                    break
-                if curdata[pos:pos + len(RAR_ID)] == RAR_ID:
-                    return RAR_V3, pos
-                if curdata[pos:pos + len(RAR5_ID)] == RAR5_ID:
-                    return RAR_V5, pos
-                findpos = pos + len(sig)
-        fd.restore_pos()
-    return 0, 0
+        try:
+            head = fd.read(len(RAR5_ID))
+            ver = _sig_version(head)
+            if ver or not config.SFX_SCAN_MODE:
+                return ver, 0
+            if config.SFX_SCAN_MODE == 2 and not is_filelike(xfile):
+                res = _mmap_find_sig(fd)
+                if res:
+                    return res
+            return _chunked_find_sig(fd, head)
+        finally:
+            fd.restore_pos()
 
 
 ##
@@ -67,11 +117,7 @@ def get_rar_version(xfile):
     with XFile(xfile) as fd:
         buf = fd.read(len(RAR5_ID))
         fd.restore_pos()
-    if buf.startswith(RAR_ID):
-        return RAR_V3
-    elif buf.startswith(RAR5_ID):
-        return RAR_V5
-    return 0
+    return _sig_version(buf)
 
 
 def is_rarfile(xfile):
@@ -87,7 +133,8 @@ def is_rarfile(xfile):
 def is_rarfile_sfx(xfile):
     """Check whether file is rar archive with support for SFX.
 
-    It will read 2M from file.
+    It will search signature in first ``config.SFX_MAX_SIZE`` bytes of file,
+    as set by ``config.SFX_SCAN_MODE``.
     """
     return _find_sfx_header(xfile)[0] > 0
 
@@ -115,16 +162,19 @@ class RarFile:
             of multi-volume archive.
 
             .. versionadded:: 4.0
+        lazy
+            If True, headers are parsed on demand.  Iteration
+            parses only as far as needed, other methods parse
+            the whole archive.
+
+            .. versionadded:: 5.0
     """
 
     #: File name, if available.  Unicode string or None.
     filename = None
 
-    #: Archive comment.  Unicode string or None.
-    comment = None
-
     def __init__(self, file, mode="r", charset=None, info_callback=None,
-                 crc_check=True, errors="stop", part_only=False):
+                 crc_check=True, errors="stop", part_only=False, lazy=False):
         if is_filelike(file):
             self.filename = getattr(file, "name", None)
         else:
@@ -137,8 +187,10 @@ class RarFile:
         self._info_callback = info_callback
         self._crc_check = crc_check
         self._part_only = part_only
+        self._lazy = lazy
         self._password = None
         self._file_parser = None
+        self._tree = None
 
         if errors == "stop":
             self._strict = False
@@ -162,7 +214,12 @@ class RarFile:
 
     def __iter__(self):
         """Iterate over members."""
-        return iter(self.infolist())
+        return self.iter_infos()
+
+    @property
+    def comment(self):
+        """Archive comment.  Unicode string or None."""
+        return self._file_parser.get_comment()
 
     def setpassword(self, pwd):
         """Sets the password to use when extracting.
@@ -170,6 +227,7 @@ class RarFile:
         self._password = pwd
         if self._file_parser:
             if self._file_parser.has_header_encryption():
+                self._file_parser.close()
                 self._file_parser = None
         if not self._file_parser:
             self._parse()
@@ -198,6 +256,26 @@ class RarFile:
         """
         return self._file_parser.infolist()
 
+    def catalog(self):
+        """Return :class:`RarCatalog` with entries stored in columns.
+
+        In lazy mode, if iteration has not started, headers are scanned
+        without keeping :class:`RarInfo` objects, they are parsed again
+        on request.  Otherwise catalog is built from parsed entries.
+
+        .. versionadded:: 5.0
+        """
+        return self._file_parser.catalog()
+
+    def iter_infos(self):
+        """Yield RarInfo objects for files/directories in archive.
+
+        In lazy mode, headers are parsed as iteration proceeds.
+
+        .. versionadded:: 5.0
+        """
+        return self._file_parser.iter_infos()
+
     def volumelist(self):
         """Returns filenames of archive volumes.
 
@@ -208,9 +286,53 @@ class RarFile:
 
     def getinfo(self, name):
         """Return RarInfo for file.
+
+        If there are several entries with same name, last one is returned,
+        so in lazy mode this parses whole archive.
         """
         return self._file_parser.getinfo(name)
 
+    def listdir(self, path=""):
+        """Return names of entries in archive directory.
+
+        Includes directories that do not have own entry in archive,
+        only files under them.  Directory tree is built on first use.
+
+        .. versionadded:: 5.0
+        """
+        return list(self._get_tree().lookup_dir(path).children)
+
+    def iterdir(self, path=""):
+        """Iterate over member names in archive directory.
+
+        Same as :meth:`listdir`, but gives full names as in
+        :meth:`namelist`, where directories have "/" suffix.
+
+        .. versionadded:: 5.0
+        """
+        node = self._get_tree().lookup_dir(path)
+        return (child.member for child in node.children.values())
+
+    def walk(self, top=""):
+        """Walk archive directory tree like :func:`os.walk`.
+
+        Yields (dirpath, dirnames, filenames) tuples, top-down.
+
+        .. versionadded:: 5.0
+        """
+        return self._get_tree().walk(top)
+
+    def glob(self, pattern):
+        """Return member names that match pattern.
+
+        Each path component is matched with :func:`fnmatch.fnmatchcase`,
+        ``**`` matches any number of directories.  Literal components
+        are looked up directly, so cost depends on matching part of tree.
+
+        .. versionadded:: 5.0
+        """
+        return [node.member for node in self._get_tree().glob(pattern)]
+
     def getinfo_orig(self, name):
         """Return RarInfo for file source.
 
@@ -221,7 +343,7 @@ class RarFile:
         """
         return self._file_parser.getinfo_orig(name)
 
-    def open(self, name, mode="r", pwd=None):
+    def open(self, name, mode="r", pwd=None, *, mmap=None):  # pylint: disable=redefined-outer-name
         """Returns file-like object (:class:`RarExtFile`) from where the data can be read.
 
         The object implements :class:`io.RawIOBase` interface, so it can
@@ -243,6 +365,14 @@ class RarFile:
                 must be "r"
             pwd
                 password to use for extracting.
+            mmap
+                If True, stored files in on-disk archives are read
+                from memory-mapped volumes and :meth:`~RarExtFile.read`
+                returns :class:`memoryview` slices of the mapping when
+                requested data is inside single volume.
+                Default is ``config.USE_MMAP``.
+
+                .. versionadded:: 5.0
         """
 
         if mode != "r":
@@ -261,7 +391,7 @@ class RarFile:
         else:
             pwd = None
 
-        return self._file_parser.open(inf, pwd)
+        return self._file_parser.open(inf, pwd, mmap)
 
     def read(self, name, pwd=None):
         """Return uncompressed data for archive entry.
@@ -279,9 +409,27 @@ class RarFile:
         with self.open(name, "r", pwd) as f:
             return f.read()
 
+    def view(self, name):
+        """Return read-only :class:`memoryview` of file data without copying.
+
+        Works only for uncompressed, unencrypted files that are fully inside
+        one volume of on-disk archive, otherwise raises
+        :class:`io.UnsupportedOperation`.  The data is not CRC-checked.
+
+        Parameters:
+
+            name
+                file name or RarInfo instance.
+        """
+        inf = self.getinfo(name)
+        if inf.is_dir():
+            raise io.UnsupportedOperation("Directory does not have any data: " + inf.filename)
+        return self._file_parser.view(inf)
+
     def close(self):
         """Release open resources."""
-        pass
+        if self._file_parser:
+            self._file_parser.close()
 
     def printdir(self, file=None):
         """Print archive file list to stdout or given file.
@@ -306,7 +454,7 @@ class RarFile:
         inf = self.getinfo(member)
         return self._extract_one(inf, path, pwd, True)
 
-    def extractall(self, path=None, members=None, pwd=None):
+    def extractall(self, path=None, members=None, pwd=None, workers=None):
         """Extract all files into current directory.
 
         Parameters:
@@ -317,23 +465,69 @@ class RarFile:
                 optional filename or :class:`RarInfo` instance list to extract
             pwd
                 optional password to use
+            workers
+                optional number of threads to extract files with.
+                Solid archives are always extracted sequentially.
+
+                .. versionadded:: 5.0
         """
         if members is None:
             members = self.namelist()
-
-        done = set()
-        dirs = []
-        for m in members:
-            inf = self.getinfo(m)
-            dst = self._extract_one(inf, path, pwd, not inf.is_dir())
-            if inf.is_dir():
-                if dst not in done:
-                    dirs.append((dst, inf))
-                    done.add(dst)
-        if dirs:
-            dirs.sort(reverse=True)
-            for dst, inf in dirs:
-                self._set_attrs(inf, dst)
+        infos = [self.getinfo(m) for m in members]
+
+        staged = {}
+        stage_dir = None
+        if self._use_batch_extract():
+            batch = [inf for inf in infos if self._can_batch_extract(inf)]
+            if batch:
+                stage_dir, staged = self._extract_batch(batch, path, pwd)
+
+        # same member or name may be listed several times, but staged
+        # file can be moved only once - last entry wins, as sequential
+        # extraction would leave it
+        last_staged = {}
+        for pos, inf in enumerate(infos):
+            if inf in staged:
+                last_staged[staged[inf]] = pos
+
+        pool = None
+        if workers is not None and workers > 1 and not self.is_solid():
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        pending = {}
+        try:
+            done = set()
+            dirs = []
+            for pos, inf in enumerate(infos):
+                if inf in staged:
+                    if last_staged[staged[inf]] != pos:
+                        continue
+                    dst = self._move_staged(inf, staged[inf], path)
+                elif pool and inf.is_file():
+                    # same name twice must keep archive order
+                    if inf.filename in pending:
+                        self._wait_pending(pending)
+                    pending[inf.filename] = pool.submit(self._extract_one, inf, path, pwd, True)
+                    continue
+                else:
+                    # symlink may redirect paths of later files
+                    if inf.is_symlink():
+                        self._wait_pending(pending)
+                    dst = self._extract_one(inf, path, pwd, not inf.is_dir())
+                if inf.is_dir():
+                    if dst not in done:
+                        dirs.append((dst, inf))
+                        done.add(dst)
+            self._wait_pending(pending)
+            if dirs:
+                dirs.sort(reverse=True)
+                for dst, inf in dirs:
+                    self._set_attrs(inf, dst)
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            if stage_dir:
+                shutil.rmtree(stage_dir, ignore_errors=True)
 
     def testrar(self, pwd=None):
         """Read all files and test CRC.
@@ -357,24 +551,70 @@ class RarFile:
     def _parse(self):
         """Run parser for file type
         """
+        self._tree = None
+        use_cache = self._use_index_cache()
+        if use_cache:
+            cached = load_index(self._rarfile, self._index_params())
+            if cached:
+                ver, sfx_ofs, state = cached
+                self._file_parser = self._create_parser(ver, sfx_ofs)
+                self._file_parser.set_index_state(state)
+                return
+
         ver, sfx_ofs = _find_sfx_header(self._rarfile)
+        self._file_parser = self._create_parser(ver, sfx_ofs)
+        if self._lazy:
+            self._file_parser.parse_lazy()
+            return
+        self._file_parser.parse()
+
+        if use_cache and not self._file_parser.strerror():
+            if not self._file_parser.has_header_encryption():
+                save_index(self._rarfile, self._index_params(), ver, sfx_ofs,
+                           self._file_parser.get_index_state())
+
+    def _get_tree(self):
+        if self._tree is None:
+            self._tree = TreeIndex(self.infolist())
+        return self._tree
+
+    def _create_parser(self, ver, sfx_ofs):
         if ver == RAR_V3:
-            p3 = RAR3Parser(self._rarfile, self._password, self._crc_check,
-                            self._charset, self._strict, self._info_callback,
-                            sfx_ofs, self._part_only)
-            self._file_parser = p3  # noqa
-        elif ver == RAR_V5:
-            p5 = RAR5Parser(self._rarfile, self._password, self._crc_check,
-                            self._charset, self._strict, self._info_callback,
-                            sfx_ofs, self._part_only)
-            self._file_parser = p5  # noqa
-        else:
-            raise NotRarFile("Not a RAR file")
+            return RAR3Parser(self._rarfile, self._password, self._crc_check,
+                              self._charset, self._strict, self._info_callback,
+                              sfx_ofs, self._part_only)
+        if ver == RAR_V5:
+            return RAR5Parser(self._rarfile, self._password, self._crc_check,
+                              self._charset, self._strict, self._info_callback,
+                              sfx_ofs, self._part_only)
+        raise NotRarFile("Not a RAR file")
+
+    def _use_index_cache(self):
+        """Index cache is used only for plain files without password.
+        """
+        if not config.INDEX_CACHE_DIR or is_filelike(self._rarfile):
+            return False
+        return self._password is None and self._info_callback is None
 
-        self._file_parser.parse()
-        self.comment = self._file_parser.comment
+    def _index_params(self):
+        """Parameters that affect parse result.
+        """
+        return (self._charset, self._crc_check, self._strict, self._part_only)
 
     def _extract_one(self, info, path, pwd, set_attrs):
+        dstfn, path = self._get_dest(info, path)
+
+        if info.is_file():
+            return self._make_file(info, dstfn, pwd, set_attrs)
+        if info.is_dir():
+            return self._make_dir(info, dstfn, pwd, set_attrs)
+        if info.is_symlink():
+            return self._make_symlink(info, dstfn, pwd, set_attrs, path)
+        return None
+
+    def _get_dest(self, info, path):
+        """Return (dstfn, path) with parent directory created.
+        """
         fname = sanitize_filename(
             info.filename, os.path.sep, config.WIN32
         )
@@ -399,14 +639,85 @@ class RarFile:
         dirname = os.path.dirname(dstfn)
         if dirname and dirname != ".":
             os.makedirs(dirname, exist_ok=True)
+        return dstfn, path
 
-        if info.is_file():
-            return self._make_file(info, dstfn, pwd, set_attrs)
-        if info.is_dir():
-            return self._make_dir(info, dstfn, pwd, set_attrs)
-        if info.is_symlink():
-            return self._make_symlink(info, dstfn, pwd, set_attrs, path)
-        return None
+    def _wait_pending(self, pending):
+        """Wait for running extract jobs, raise first error.
+        """
+        for fut in pending.values():
+            fut.result()
+        pending.clear()
+
+    def _use_batch_extract(self):
+        if config.BATCH_EXTRACT == 0 or config.FORCE_TOOL or self._part_only:
+            return False
+        if config.BATCH_EXTRACT == 1 and not self.is_solid():
+            return False
+        return True
+
+    def _can_batch_extract(self, info):
+        """Compressed or encrypted regular files go to tool.
+        """
+        if not info.is_file() or info.file_redir:
+            return False
+        return info.compress_type != RAR_M0 or info.needs_password()
+
+    def _extract_batch(self, infos, path, pwd):
+        """Extract files into staging dir with single tool run per batch.
+
+        Returns (stage_dir, staged) where staged maps RarInfo
+        to extracted file.  Files that tool did not produce are
+        missing from the map and will be extracted one-by-one.
+        """
+        pwd = pwd or self._password
+        if pwd is None:
+            if self._file_parser.has_header_encryption() or any(inf.needs_password() for inf in infos):
+                raise PasswordRequired("Archive requires password")
+
+        path = os.getcwd() if path is None else os.fspath(path)
+        os.makedirs(path, exist_ok=True)
+        stage_dir = tempfile.mkdtemp(prefix=".rarfile-", dir=path)
+        real_stage = os.path.realpath(stage_dir)
+
+        tmpname = None
+        try:
+            rarfn = self._rarfile
+            if is_filelike(rarfn):
+                rarfn = tmpname = membuf_tempfile(rarfn)
+
+            setup = tool_setup()
+            step = max(1, config.BATCH_EXTRACT_COUNT)
+            for pos in range(0, len(infos), step):
+                files = [inf.filename.replace("/", os.path.sep) for inf in infos[pos:pos + step]]
+                cmd = setup.extract_cmdline(pwd, rarfn, stage_dir, files)
+                p = custom_popen(cmd)
+                out, _ = p.communicate()
+                check_returncode(p.returncode, out.decode("utf8", "replace").strip(), setup.get_errmap())
+        except BaseException:
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            raise
+        finally:
+            if tmpname:
+                os.unlink(tmpname)
+
+        staged = {}
+        for inf in infos:
+            fname = sanitize_filename(inf.filename, os.path.sep, config.WIN32)
+            src = os.path.join(stage_dir, fname)
+            if os.path.islink(src) or not os.path.isfile(src):
+                continue
+            if not os.path.realpath(src).startswith(real_stage + os.sep):
+                continue
+            staged[inf] = src
+        return stage_dir, staged
+
+    def _move_staged(self, info, src, path):
+        """Move file from staging dir to final place.
+        """
+        dstfn, _ = self._get_dest(info, path)
+        os.replace(src, dstfn)
+        self._set_attrs(info, dstfn)
+        return dstfn
 
     def _create_helper(self, name, flags, info):
         return os.open(name, flags)
@@ -416,11 +727,17 @@ class RarFile:
             return self._create_helper(name, flags, info)
         with self.open(info, "r", pwd) as src:
             with open(dstfn, "wb", opener=helper) as dst:
-                shutil.copyfileobj(src, dst)
+                if not self._kernel_copy(src, dst):
+                    shutil.copyfileobj(src, dst)
         if set_attrs:
             self._set_attrs(info, dstfn)
         return dstfn
 
+    def _kernel_copy(self, src, dst):
+        if not config.USE_KERNEL_COPY or not isinstance(src, DirectReader):
+            return False
+        return src._copy_to_fd(dst.fileno())
+
     def _make_dir(self, info, dstfn, pwd, set_attrs):
         os.makedirs(dstfn, exist_ok=True)
         if set_attrs:
@@ -467,7 +784,9 @@ class RarFile:
                 new_mode = st.st_mode & ~0o222
                 os.chmod(dstfn, new_mode)
 
-        if info.mtime:
-            mtime_ns = to_nsecs(info.mtime)
-            atime_ns = to_nsecs(info.atime) if info.atime else mtime_ns
+        mtime_ns = info.mtime_ns
+        if mtime_ns is not None:
+            atime_ns = info.atime_ns
+            if atime_ns is None:
+                atime_ns = mtime_ns
             os.utime(dstfn, ns=(atime_ns, mtime_ns))
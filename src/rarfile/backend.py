@@ -1,4 +1,5 @@
 import errno
+import os
 import re
 from subprocess import DEVNULL, PIPE, STDOUT, Popen
 
@@ -26,13 +27,13 @@ def empty_read(src, size, blklen):
         size -= len(res)
 
 
-def custom_popen(cmd):
+def custom_popen(cmd, pass_fds=()):
     """Disconnect cmd from parent fds, read only from stdout.
     """
     creationflags = 0x08000000 if config.WIN32 else 0  # CREATE_NO_WINDOW
     try:
         p = Popen(cmd, bufsize=0, stdout=PIPE, stderr=STDOUT, stdin=DEVNULL,
-                  creationflags=creationflags)
+                  creationflags=creationflags, pass_fds=pass_fds)
     except OSError as ex:
         if ex.errno == errno.ENOENT:
             raise RarCannotExec("Unrar not installed?") from None
@@ -108,6 +109,30 @@ class ToolSetup:
             self.add_file_arg(cmdline, filefn)
         return cmdline
 
+    def extract_cmdline(self, pwd, rarfn, dstdir, files):
+        """Command line to extract files into directory.
+        """
+        cmdline = self.get_cmdline("extract_cmd", pwd, nodash=True)
+        dest = self.setup["extract_dest"]
+        if dest is None:
+            pass
+        elif isinstance(dest, str):
+            cmdline.append(dest + dstdir)
+        else:
+            cmdline.extend(dest)
+            cmdline.append(dstdir)
+        archive_flag = self.setup.get("archive_flag")
+        if archive_flag:
+            cmdline.extend((archive_flag, rarfn, "--"))
+        else:
+            cmdline.extend(("--", rarfn))
+        for fn in files:
+            self.add_file_arg(cmdline, fn)
+        if dest is None:
+            # unrar takes destination as last arg
+            cmdline.append(os.path.join(dstdir, ""))
+        return cmdline
+
     def get_errmap(self):
         return self.setup["errmap"]
 
@@ -148,6 +173,8 @@ class ToolSetup:
 
 UNRAR_CONFIG = {
     "open_cmd": ("UNRAR_TOOL", "p", "-inul"),
+    "extract_cmd": ("UNRAR_TOOL", "x", "-inul", "-y"),
+    "extract_dest": None,
     "check_cmd": ("UNRAR_TOOL", "-inul", "-?"),
     "password": "-p",
     "no_password": ("-p-",),
@@ -163,6 +190,8 @@ UNRAR_CONFIG = {
 # - Does not support RAR5 Blake2sp hash [reading works]
 UNAR_CONFIG = {
     "open_cmd": ("UNAR_TOOL", "-q", "-o", "-"),
+    "extract_cmd": ("UNAR_TOOL", "-q", "-f", "-D"),
+    "extract_dest": ("-o",),
     "check_cmd": ("UNAR_TOOL", "-version"),
     "password": ("-p",),
     "no_password": ("-p", ""),
@@ -176,6 +205,9 @@ UNAR_CONFIG = {
 BSDTAR_CONFIG = {
     "executables": ("BSDTAR_TOOL", "TAR_TOOL"),
     "open_cmd": ("-x", "--to-stdout", "-f"),
+    "extract_cmd": ("-x",),
+    "extract_dest": ("-C",),
+    "archive_flag": "-f",
     "check_cmd": ("--version",),
     "check_output": "bsdtar|libarchive",
     "password": None,
@@ -186,6 +218,8 @@ BSDTAR_CONFIG = {
 SEVENZIP_CONFIG = {
     "executables": ("SEVENZIP_TOOL", "SEVENZIP2_TOOL"),
     "open_cmd": ("e", "-so", "-bb0"),
+    "extract_cmd": ("x", "-y", "-bb0"),
+    "extract_dest": "-o",
     "check_cmd": ("i",),
     "check_output": "Rar3",  # rar plugin appears in "Codec" not "Format"
     "password": "-p",
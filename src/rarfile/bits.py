@@ -114,6 +114,7 @@ RAR5_FILE_FLAG_HAS_MTIME = 0x02
 RAR5_FILE_FLAG_HAS_CRC32 = 0x04
 RAR5_FILE_FLAG_UNKNOWN_SIZE = 0x08
 
+RAR5_COMPR_VERSION = 0x3F
 RAR5_COMPR_SOLID = 0x40
 
 RAR5_ENC_FLAG_HAS_CHECKVAL = 0x01
@@ -0,0 +1,82 @@
+"""Persistent cache for parsed archive headers.
+
+Cache files are pickles, so :data:`~rarfile.config.INDEX_CACHE_DIR`
+must point to directory that is writable only by trusted users.
+"""
+
+import os
+import pickle
+from hashlib import sha256
+from tempfile import mkstemp
+
+from . import config
+
+__all__ = ()
+
+#: bump when layout of cached data changes
+CACHE_FORMAT = 3
+
+
+def _cache_path(rarfile, params):
+    """Return cache file name for archive.
+    """
+    key = repr((CACHE_FORMAT, os.path.abspath(rarfile), params))
+    fn = sha256(key.encode("utf8", "surrogateescape")).hexdigest() + ".idx"
+    return os.path.join(config.INDEX_CACHE_DIR, fn)
+
+
+def _volume_stats(vol_list):
+    """Return identifying stats for all volumes.
+    """
+    res = []
+    for vol in vol_list:
+        st = os.stat(vol)
+        res.append((os.path.abspath(vol), st.st_size, st.st_mtime_ns, st.st_ino))
+    return res
+
+
+def load_index(rarfile, params):
+    """Return (version, sfx_offset, state) from cache or None.
+
+    Cached entry is used only if all volumes still have
+    same size, mtime and inode number.
+    """
+    try:
+        with open(_cache_path(rarfile, params), "rb") as f:
+            ent = pickle.load(f)
+        vols = [v[0] for v in ent["volumes"]]
+        if _volume_stats(vols) != ent["volumes"]:
+            return None
+        return ent["version"], ent["sfx_offset"], ent["state"]
+    except Exception:
+        # missing, stale or corrupt entry - parse again
+        return None
+
+
+def save_index(rarfile, params, version, sfx_offset, state):
+    """Store parsed state in cache.
+
+    Errors are ignored, cache is only optimization.
+    """
+    tmpname = None
+    try:
+        ent = {
+            "volumes": _volume_stats(state["vol_list"]),
+            "version": version,
+            "sfx_offset": sfx_offset,
+            "state": state,
+        }
+        os.makedirs(config.INDEX_CACHE_DIR, exist_ok=True)
+        tmpfd, tmpname = mkstemp(suffix=".tmp", dir=config.INDEX_CACHE_DIR)
+        with os.fdopen(tmpfd, "wb") as f:
+            pickle.dump(ent, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, _cache_path(rarfile, params))
+        tmpname = None
+    except Exception:
+        pass
+    finally:
+        if tmpname:
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
@@ -0,0 +1,217 @@
+"""Column-oriented catalog of archive entries.
+"""
+
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+
+from .errors import NoRarEntry
+from .utils import to_nsecs
+
+__all__ = ("RarCatalog",)
+
+# mtime_ns value for entries without modification time
+_NO_TIME = -(1 << 63)
+
+# values for kind column
+_KIND_FILE = 0
+_KIND_DIR = 1
+_KIND_SYMLINK = 2
+
+
+def _time_ns(val):
+    """Filter bound as nanoseconds.
+    """
+    if isinstance(val, datetime):
+        return to_nsecs(val)
+    return val
+
+
+class RarCatalog:
+    """Archive entries stored in columns.
+
+    Each entry is row, identified by its index.  Columns are
+    :class:`array.array` objects, filenames are stored in
+    single UTF-8 blob.  :class:`RarInfo` objects are created
+    only when requested with :meth:`getinfo` or :meth:`infos`.
+    Column layout is for memory use, :meth:`select` still
+    checks rows one by one.
+
+    Columns:
+
+        header_offset
+            Offset of entry header in volume file.
+        volume
+            Volume nr where entry starts.
+        file_size
+            Uncompressed size.
+        compress_size
+            Compressed size, summed over all volumes.
+        crc
+            CRC-32 of uncompressed data, 0 if missing.
+        flags
+            Same as :attr:`RarInfo.flags`.
+        mtime_ns
+            Modification time as nanoseconds since epoch.
+
+    .. versionadded:: 5.0
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._kept = {}
+        self._last = None
+        self._names = bytearray()
+        self._name_offsets = array("Q", [0])
+        self._kind = array("B")
+        self.header_offset = array("Q")
+        self.volume = array("I")
+        self.file_size = array("Q")
+        self.compress_size = array("Q")
+        self.crc = array("I")
+        self.flags = array("I")
+        self.mtime_ns = array("q")
+
+    def __len__(self):
+        return len(self.header_offset)
+
+    def filename(self, row):
+        """Return filename for row.
+        """
+        start, end = self._name_offsets[row], self._name_offsets[row + 1]
+        return self._names[start:end].decode("utf8", "surrogatepass")
+
+    def namelist(self):
+        """Return list of all filenames.
+        """
+        return [self.filename(row) for row in range(len(self))]
+
+    def index(self, name):
+        """Return row for filename.
+
+        If name is repeated, last row is returned,
+        same as :meth:`RarFile.getinfo` does.
+        """
+        key = name.rstrip("/").encode("utf8", "surrogatepass")
+        if not key:
+            raise NoRarEntry("No such file: %s" % name)
+        names, offsets = self._names, self._name_offsets
+        pos = names.rfind(key)
+        while pos >= 0:
+            row = bisect_right(offsets, pos) - 1
+            if offsets[row] == pos:
+                # directory names have "/" suffix
+                end = pos + len(key)
+                if offsets[row + 1] == end or (offsets[row + 1] == end + 1 and names[end] == 0x2F):
+                    return row
+            pos = names.rfind(key, 0, pos + len(key) - 1)
+        raise NoRarEntry("No such file: %s" % name)
+
+    def getinfo(self, row):
+        """Return :class:`RarInfo` for row or filename.
+        """
+        if isinstance(row, str):
+            row = self.index(row)
+        inf = self._kept.get(row)
+        if inf is None:
+            inf = self._loader(row)
+        return inf
+
+    def infos(self, rows=None):
+        """Yield :class:`RarInfo` objects for rows.
+        """
+        if rows is None:
+            rows = range(len(self))
+        for row in rows:
+            yield self.getinfo(row)
+
+    def is_dir(self, row):
+        """Returns True if entry is a directory.
+        """
+        return self._kind[row] == _KIND_DIR
+
+    def is_symlink(self, row):
+        """Returns True if entry is a symlink.
+        """
+        return self._kind[row] == _KIND_SYMLINK
+
+    def select(self, rows=None, *, prefix=None, min_size=None, max_size=None,
+               mtime_from=None, mtime_to=None):
+        """Return array of rows that match all given filters.
+
+        Parameters:
+
+            rows
+                Rows to filter, default is all.  Allows chaining.
+            prefix
+                Filename prefix.
+            min_size, max_size
+                Inclusive bounds for uncompressed size.
+            mtime_from, mtime_to
+                Bounds for modification time, as :class:`~datetime.datetime`
+                or nanoseconds.  Lower bound is inclusive, upper is not.
+                Entries without modification time are never matched.
+        """
+        if rows is None:
+            rows = range(len(self))
+        if prefix:
+            key = prefix.encode("utf8", "surrogatepass")
+            names, offsets = self._names, self._name_offsets
+            rows = [r for r in rows if names.startswith(key, offsets[r], offsets[r + 1])]
+        if min_size is not None:
+            col = self.file_size
+            rows = [r for r in rows if col[r] >= min_size]
+        if max_size is not None:
+            col = self.file_size
+            rows = [r for r in rows if col[r] <= max_size]
+        if mtime_from is not None or mtime_to is not None:
+            col = self.mtime_ns
+            rows = [r for r in rows if col[r] != _NO_TIME]
+            if mtime_from is not None:
+                lo = _time_ns(mtime_from)
+                rows = [r for r in rows if col[r] >= lo]
+            if mtime_to is not None:
+                hi = _time_ns(mtime_to)
+                rows = [r for r in rows if col[r] < hi]
+        return array("Q", rows)
+
+    def _append(self, inf, keep=False):
+        """Add entry, optionally keep RarInfo object.
+        """
+        if keep:
+            self._kept[len(self)] = inf
+        self._last = inf
+        self._names += inf.filename.encode("utf8", "surrogatepass")
+        self._name_offsets.append(len(self._names))
+        if inf.is_dir():
+            self._kind.append(_KIND_DIR)
+        elif inf.is_symlink():
+            self._kind.append(_KIND_SYMLINK)
+        else:
+            self._kind.append(_KIND_FILE)
+        self.header_offset.append(inf.header_offset)
+        self.volume.append(inf.volume or 0)
+        self.file_size.append(inf.file_size or 0)
+        self.compress_size.append(inf.compress_size or 0)
+        self.crc.append(inf.CRC or 0)
+        self.flags.append(inf.flags)
+        mtime_ns = inf.mtime_ns
+        self.mtime_ns.append(_NO_TIME if mtime_ns is None else mtime_ns)
+
+    def _last_kept(self):
+        """Return kept object for last row.
+        """
+        return self._kept.get(len(self) - 1)
+
+    def _keep_last(self):
+        """Keep object for last row, it gets data from later header.
+        """
+        if self._last is not None:
+            self._kept[len(self) - 1] = self._last
+        return self._last
+
+    def _update_last(self, inf):
+        """Refresh merged fields of last row.
+        """
+        self.compress_size[-1] = inf.compress_size
+        self.crc[-1] = inf.CRC or 0
@@ -36,9 +36,42 @@ HACK_SIZE_LIMIT = 20 * 1024 * 1024
 #: set specific directory for mkstemp() used by hack dir usage
 HACK_TMP_DIR = None
 
+#: on Linux, give tmp archive to tool as memfd, instead of writing it to HACK_TMP_DIR
+USE_MEMFD = 1
+
 #: Use external tool for non-compressed(stored) files
 FORCE_TOOL = False
 
+#: max size of decompressed data kept for seeking in compressed files, 0 disables
+SPILL_SIZE_LIMIT = 0
+
+#: which part of data to keep for seeking: "head" - start of file, "tail" - last read data
+SPILL_POLICY = "tail"
+
+#: use mmap() for reading non-compressed files from on-disk archives
+USE_MMAP = 0
+
+#: check hash of extracted data in background thread,
+#: with up to this many buffers queued.  0 - hash in reading thread
+HASH_QUEUE_SIZE = 0
+
+#: extract non-compressed files with kernel-side copy where available
+USE_KERNEL_COPY = 1
+
+#: decompress RAR5 files in-process if native extension is available,
+#: FORCE_TOOL also disables it
+USE_NATIVE_UNPACK = 1
+
+#: limit the filesize for in-process decompression
+NATIVE_UNPACK_LIMIT = 64 * 1024 * 1024
+
+#: files unpacked in-process that are larger than this are kept
+#: in temp file in HACK_TMP_DIR instead of memory
+NATIVE_UNPACK_MEM_LIMIT = 4 * 1024 * 1024
+
+#: max number of volume files kept open per archive
+MAX_OPEN_VOLUMES = 16
+
 #: Separator for path name components.  Always "/".
 PATH_SEP = "/"
 
@@ -48,24 +81,71 @@ WIN32 = sys.platform == "win32"
 #: Default block size for copy operations
 BSIZE = 512 * 1024 if WIN32 else 64 * 1024
 
+#: read-ahead window when scanning archive headers
+HEADER_READAHEAD = 64 * 1024
+
 #: Max size to scan for RAR signature
 SFX_MAX_SIZE = 2 * 1024 * 1024
 
+#: how to search for RAR signature in SFX archives:
+#: 0 - no search, 1 - read in chunks, 2 - use mmap() on archive files
+SFX_SCAN_MODE = 2
+
+#: extract compressed files with single tool run per batch:
+#: 0 - never, 1 - only in solid archives, 2 - always
+BATCH_EXTRACT = 1
+
+#: max number of files given to extract tool at once
+BATCH_EXTRACT_COUNT = 1000
+
+#: directory for cached archive indexes, None disables caching
+INDEX_CACHE_DIR = None
+
+#: number of keys derived from passwords that are kept in process-wide cache,
+#: shared by all RarFile instances.  0 - disable cache
+KDF_CACHE_SIZE = 32
+
+#: seconds a cached key is kept, 0 - until dropped by size limit
+#: or :func:`rarfile.purge_kdf_cache`
+KDF_CACHE_TTL = 0
+
+#: number of threads that scan headers of multi-volume archive,
+#: volume names are found up front.  0 - scan volumes one by one
+VOLUME_SCAN_WORKERS = 0
+
 __all__ = (
+    "BATCH_EXTRACT",
+    "BATCH_EXTRACT_COUNT",
     "BSDTAR_TOOL",
     "BSIZE",
     "DEFAULT_CHARSET",
     "FORCE_TOOL",
     "HACK_SIZE_LIMIT",
     "HACK_TMP_DIR",
+    "HASH_QUEUE_SIZE",
+    "HEADER_READAHEAD",
+    "INDEX_CACHE_DIR",
+    "KDF_CACHE_SIZE",
+    "KDF_CACHE_TTL",
+    "MAX_OPEN_VOLUMES",
+    "NATIVE_UNPACK_LIMIT",
+    "NATIVE_UNPACK_MEM_LIMIT",
     "PATH_SEP",
     "SEVENZIP2_TOOL",
     "SEVENZIP_TOOL",
     "SFX_MAX_SIZE",
+    "SFX_SCAN_MODE",
+    "SPILL_POLICY",
+    "SPILL_SIZE_LIMIT",
     "TAR_TOOL",
     "TRY_ENCODINGS",
     "UNAR_TOOL",
     "UNRAR_TOOL",
     "USE_EXTRACT_HACK",
+    "USE_KERNEL_COPY",
+    "USE_MEMFD",
+    "USE_MMAP",
+    "USE_NATIVE_UNPACK",
+    "VOLUME_SCAN_WORKERS",
     "WIN32",
 )
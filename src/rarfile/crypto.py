@@ -1,14 +1,21 @@
 """Low-level crypto helpers.
 """
 
+import hmac
+import queue
+import threading
+import time
 from binascii import crc32, hexlify
-from hashlib import blake2s, pbkdf2_hmac, sha1
+from collections import OrderedDict
+from hashlib import blake2s, pbkdf2_hmac, sha1, sha256
 from struct import Struct
 
-from .bits import RAR_MAX_PASSWORD
+from . import config
+from .bits import RAR5_PW_CHECK_SIZE, RAR_MAX_PASSWORD
 from .errors import BadRarFile
 
-__all__ = ("rar3_s2k", "rar5_s2k", "BadRarFile", "NoHashContext", "CRC32Context", "Blake2SP", "HeaderDecrypt")
+__all__ = ("rar3_s2k", "rar5_s2k", "rar5_kdf", "derive_key", "purge_kdf_cache", "BadRarFile", "NoHashContext", "CRC32Context", "Blake2SP",
+           "HashThread", "TweakedHash", "HeaderDecrypt")
 
 
 BLK_BE = Struct(">16L")
@@ -128,27 +135,22 @@ class CRC32Context:
         return "%08x" % self.digest()
 
 
-class Blake2SP:
-    """Blake2sp hash context.
+class Blake2SPLanes:
+    """Blake2sp state in pure Python, used when C helper module is missing.
     """
-    __slots__ = ("_thread", "_buf", "_cur", "_digest")
-    digest_size = 32
+    __slots__ = ("_thread", "_buf", "_cur")
     block_size = 64
     parallelism = 8
 
-    def __init__(self, data=None):
+    def __init__(self):
         self._buf = b""
         self._cur = 0
-        self._digest = None
         self._thread = []
 
         for i in range(self.parallelism):
             ctx = self._blake2s(i, 0, i == (self.parallelism - 1))
             self._thread.append(ctx)
 
-        if data:
-            self.update(data)
-
     def _blake2s(self, ofs, depth, is_last):
         return blake2s(node_offset=ofs, node_depth=depth, last_node=is_last,
                        depth=2, inner_size=32, fanout=self.parallelism)
@@ -174,17 +176,52 @@ class Blake2SP:
             view = view[bs:]
         self._buf = view.tobytes()
 
+    def digest(self):
+        """Return final digest value, may be called once.
+        """
+        if self._buf:
+            self._add_block(self._buf)
+            self._buf = b""
+        ctx = self._blake2s(0, 1, True)
+        for t in self._thread:
+            ctx.update(t.digest())
+        return ctx.digest()
+
+
+# load C version
+try:
+    from ._crypto import blake2sp
+except ImportError:
+    blake2sp = Blake2SPLanes
+
+
+class Blake2SP:
+    """Blake2sp hash context.
+
+    Wraps C implementation, which processes all 8 leaves together
+    and releases GIL for larger inputs.
+    """
+    __slots__ = ("_ctx", "_digest")
+    digest_size = 32
+    block_size = 64
+    parallelism = 8
+
+    def __init__(self, data=None):
+        self._ctx = blake2sp()
+        self._digest = None
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        """Hash data.
+        """
+        self._ctx.update(data)
+
     def digest(self):
         """Return final digest value.
         """
         if self._digest is None:
-            if self._buf:
-                self._add_block(self._buf)
-                self._buf = b""
-            ctx = self._blake2s(0, 1, True)
-            for t in self._thread:
-                ctx.update(t.digest())
-            self._digest = ctx.digest()
+            self._digest = self._ctx.digest()
         return self._digest
 
     def hexdigest(self):
@@ -192,6 +229,104 @@ class Blake2SP:
         return hexlify(self.digest()).decode("ascii")
 
 
+class TweakedHash:
+    """Hash context for RAR5 files with tweaked checksums.
+
+    Final CRC32 or BLAKE2sp value is converted with HMAC-SHA256,
+    using hash key derived from password.
+    """
+    __slots__ = ("_ctx", "_hash_key")
+
+    def __init__(self, md_class, hash_key):
+        self._ctx = md_class()
+        self._hash_key = hash_key
+
+    def update(self, data):
+        """Process data."""
+        self._ctx.update(data)
+
+    def digest(self):
+        """Final hash, converted to MAC."""
+        value = self._ctx.digest()
+        if isinstance(value, int):
+            mac = hmac.digest(self._hash_key, value.to_bytes(4, "little"), sha256)
+            value = 0
+            for i, v in enumerate(mac):
+                value ^= v << ((i & 3) * 8)
+            return value
+        return hmac.digest(self._hash_key, value, sha256)
+
+    def hexdigest(self):
+        """Hexadecimal digest."""
+        value = self.digest()
+        if isinstance(value, int):
+            return "%08x" % value
+        return hexlify(value).decode("ascii")
+
+
+class HashThread:
+    """Runs another hash context in background thread.
+
+    Data is passed to worker via bounded queue, :meth:`digest`
+    waits until all queued data is processed.
+    """
+    __slots__ = ("_ctx", "_queue", "_thread", "_error")
+
+    def __init__(self, ctx, maxsize):
+        self._ctx = ctx
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._error = None
+
+    def _run(self):
+        ctx = self._ctx
+        get = self._queue.get
+        while True:
+            data = get()
+            if data is None:
+                break
+            if self._error is None:
+                try:
+                    ctx.update(data)
+                except Exception as ex:
+                    self._error = ex
+
+    def update(self, data):
+        """Queue data for hashing."""
+        # caller may reuse buffer
+        if data.__class__ is not bytes:
+            data = bytes(data)
+        if not data:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rarfile-hash", daemon=True)
+            self._thread.start()
+        self._queue.put(data)
+
+    def close(self):
+        """Stop worker thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _finish(self):
+        """Wait for worker, re-raise its error."""
+        self.close()
+        if self._error is not None:
+            raise self._error
+
+    def digest(self):
+        """Wait for worker, return final hash."""
+        self._finish()
+        return self._ctx.digest()
+
+    def hexdigest(self):
+        """Hexadecimal digest."""
+        self._finish()
+        return self._ctx.hexdigest()
+
+
 def generate():
     import textwrap
     words = [chr(ord('a') + i) for i in range(16)]
@@ -295,14 +430,130 @@ def rar3_s2k(pwd, salt, _core=rar3_s2k_core):
     return _core(wstr + salt)
 
 
-def rar5_s2k(pwd, salt, kdf_count):
-    """String-to-key hash for RAR5.
+def _rar5_password(pwd):
+    """Password as UTF-8, limited to RAR_MAX_PASSWORD chars.
     """
     if not isinstance(pwd, str):
         pwd = pwd.decode("utf8")
     wstr = pwd.encode("utf-16le")[:RAR_MAX_PASSWORD * 2]
-    ustr = wstr.decode("utf-16le").encode("utf8")
-    return pbkdf2_hmac("sha256", ustr, salt, kdf_count)
+    return wstr.decode("utf-16le").encode("utf8")
+
+
+def rar5_s2k(pwd, salt, kdf_count):
+    """String-to-key hash for RAR5.
+    """
+    return pbkdf2_hmac("sha256", _rar5_password(pwd), salt, kdf_count)
+
+
+def rar5_pbkdf2_py(pwd, salt, kdf_count):
+    """PBKDF2-HMAC-SHA256 values after kdf_count, +16 and +32 iterations.
+
+    hashlib does not expose chain state, so last block is recovered
+    from runs with kdf_count and kdf_count-1, and the remaining
+    32 iterations are done here.
+    """
+    key = pbkdf2_hmac("sha256", pwd, salt, kdf_count)
+    prev = pbkdf2_hmac("sha256", pwd, salt, kdf_count - 1) if kdf_count > 1 else bytes(len(key))
+    block = bytes(a ^ b for a, b in zip(key, prev))
+    mac = hmac.new(pwd, digestmod=sha256)
+    acc = int.from_bytes(key, "big")
+    res = [key]
+    for i in range(32):
+        ctx = mac.copy()
+        ctx.update(block)
+        block = ctx.digest()
+        acc ^= int.from_bytes(block, "big")
+        if i % 16 == 15:
+            res.append(acc.to_bytes(len(key), "big"))
+    return tuple(res)
+
+
+# load C version
+try:
+    from ._crypto import rar5_pbkdf2
+except ImportError:
+    rar5_pbkdf2 = rar5_pbkdf2_py
+
+
+def rar5_kdf(pwd, salt, kdf_count, _core=rar5_pbkdf2):
+    """Returns (key, hash_key, pwd_check) for RAR5.
+
+    All are taken from same PBKDF2 chain, C version
+    calculates them in one pass.
+    """
+    key, hash_key, check = _core(_rar5_password(pwd), salt, kdf_count)
+    pwd_check = bytearray(RAR5_PW_CHECK_SIZE)
+    for i, v in enumerate(check):
+        pwd_check[i % RAR5_PW_CHECK_SIZE] ^= v
+    return key, hash_key, bytes(pwd_check)
+
+
+class KDFCache:
+    """Thread-safe LRU cache for derived keys.
+
+    Size and entry lifetime come from :data:`config.KDF_CACHE_SIZE`
+    and :data:`config.KDF_CACHE_TTL` at insert time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """Return cached value or None."""
+        with self._lock:
+            ent = self._data.get(key)
+            if ent is None:
+                return None
+            expires, value = ent
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, size, ttl):
+        """Store value, drop least recently used ones."""
+        expires = time.monotonic() + ttl if ttl > 0 else 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > size:
+                self._data.popitem(last=False)
+
+    def purge(self):
+        """Drop all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_kdf_cache = KDFCache()
+
+
+def derive_key(s2k, pwd, salt, *args):
+    """Run string-to-key function, result is cached process-wide.
+
+    Cache key uses SHA256 of password, not password itself.
+    """
+    size = config.KDF_CACHE_SIZE
+    if size <= 0:
+        return s2k(pwd, salt, *args)
+    pwd_hash = sha256(pwd.encode("utf8") if isinstance(pwd, str) else pwd).digest()
+    key = (s2k, pwd_hash, salt, args)
+    value = _kdf_cache.get(key)
+    if value is None:
+        value = s2k(pwd, salt, *args)
+        _kdf_cache.put(key, value, size, config.KDF_CACHE_TTL)
+    return value
+
+
+def purge_kdf_cache():
+    """Forget all keys derived from passwords.
+    """
+    _kdf_cache.purge()
 
 
 if __name__ == "__main__":
@@ -2,10 +2,13 @@
 """
 
 import io
+import mmap
 import os
 import re
+import shutil
 import struct
 from binascii import crc32
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from hashlib import sha256
 from pathlib import Path
@@ -19,15 +22,16 @@ from .bits import (
     RAR5_BLOCK_FILE, RAR5_BLOCK_FLAG_DATA_AREA, RAR5_BLOCK_FLAG_EXTRA_DATA,
     RAR5_BLOCK_FLAG_SKIP_IF_UNKNOWN, RAR5_BLOCK_FLAG_SPLIT_AFTER,
     RAR5_BLOCK_FLAG_SPLIT_BEFORE, RAR5_BLOCK_MAIN, RAR5_BLOCK_SERVICE,
-    RAR5_COMPR_SOLID, RAR5_ENC_FLAG_HAS_CHECKVAL, RAR5_ENDARC_FLAG_NEXT_VOL,
-    RAR5_FILE_FLAG_HAS_CRC32, RAR5_FILE_FLAG_HAS_MTIME, RAR5_FILE_FLAG_ISDIR,
-    RAR5_ID, RAR5_MAIN_FLAG_HAS_VOLNR, RAR5_MAIN_FLAG_ISVOL,
-    RAR5_MAIN_FLAG_RECOVERY, RAR5_MAIN_FLAG_SOLID, RAR5_OS_WINDOWS,
-    RAR5_PW_CHECK_SIZE, RAR5_PW_SUM_SIZE, RAR5_XENC_CHECKVAL,
-    RAR5_XENC_CIPHER_AES256, RAR5_XENC_TWEAKED, RAR5_XFILE_ENCRYPTION,
-    RAR5_XFILE_HASH, RAR5_XFILE_OWNER, RAR5_XFILE_REDIR, RAR5_XFILE_SERVICE,
-    RAR5_XFILE_TIME, RAR5_XFILE_VERSION, RAR5_XHASH_BLAKE2SP,
-    RAR5_XOWNER_GID, RAR5_XOWNER_GNAME, RAR5_XOWNER_UID, RAR5_XOWNER_UNAME,
+    RAR5_COMPR_SOLID, RAR5_COMPR_VERSION, RAR5_ENC_FLAG_HAS_CHECKVAL,
+    RAR5_ENDARC_FLAG_NEXT_VOL, RAR5_FILE_FLAG_HAS_CRC32,
+    RAR5_FILE_FLAG_HAS_MTIME, RAR5_FILE_FLAG_ISDIR, RAR5_ID,
+    RAR5_MAIN_FLAG_HAS_VOLNR, RAR5_MAIN_FLAG_ISVOL, RAR5_MAIN_FLAG_RECOVERY,
+    RAR5_MAIN_FLAG_SOLID, RAR5_OS_WINDOWS, RAR5_PW_CHECK_SIZE,
+    RAR5_PW_SUM_SIZE, RAR5_XENC_CHECKVAL, RAR5_XENC_CIPHER_AES256,
+    RAR5_XENC_TWEAKED, RAR5_XFILE_ENCRYPTION, RAR5_XFILE_HASH,
+    RAR5_XFILE_OWNER, RAR5_XFILE_REDIR, RAR5_XFILE_SERVICE, RAR5_XFILE_TIME,
+    RAR5_XFILE_VERSION, RAR5_XHASH_BLAKE2SP, RAR5_XOWNER_GID,
+    RAR5_XOWNER_GNAME, RAR5_XOWNER_UID, RAR5_XOWNER_UNAME,
     RAR5_XREDIR_FILE_COPY, RAR5_XREDIR_HARD_LINK, RAR5_XREDIR_UNIX_SYMLINK,
     RAR5_XREDIR_WINDOWS_JUNCTION, RAR5_XREDIR_WINDOWS_SYMLINK,
     RAR5_XTIME_HAS_ATIME, RAR5_XTIME_HAS_CTIME, RAR5_XTIME_HAS_MTIME,
@@ -45,9 +49,12 @@ from .bits import (
     RAR_MAX_KDF_SHIFT, RAR_OLD_SUB_MAC, RAR_OLD_SUB_UNIX, RAR_OS_MSDOS,
     RAR_OS_UNIX, RAR_OS_WIN32, RAR_SKIP_IF_UNKNOWN,
 )
-from .crypto import Blake2SP, CRC32Context, HeaderDecrypt, NoHashContext
+from .catalog import RarCatalog
+from .crypto import (
+    Blake2SP, CRC32Context, HeaderDecrypt, NoHashContext, derive_key,
+)
 from .crypto import have_crypto as _have_crypto
-from .crypto import rar3_s2k, rar5_s2k
+from .crypto import rar3_s2k, rar5_kdf
 from .errors import (
     BadRarFile, BadRarName, NeedFirstVolume, NoCrypto,
     NoRarEntry, NotRarFile, RarWrongPassword,
@@ -56,15 +63,25 @@ from .info import (
     Rar3Info, Rar5EncryptionInfo, Rar5EndArcInfo,
     Rar5FileInfo, Rar5MainInfo, Rar5ServiceInfo, RarInfo,
 )
-from .stream import DirectReader, PipeReader
+from .stream import (
+    DecryptReader, DirectReader, InProcessReader,
+    MmapReader, PipeReader, _copy_range, rar5_unpack,
+)
 from .utils import (
-    UnicodeFilename, XFile, is_filelike, membuf_tempfile,
-    parse_dos_time, to_datetime, to_nsdatetime,
+    HeaderReader, LockedFile, PreadFile, UnicodeFilename,
+    VolumeFiles, XFile, is_filelike, membuf_tempfile, memfd_path,
+    memfd_tempfile, parse_dos_time, to_datetime, to_nsdatetime,
 )
 
 # export only interesting items
 __all__ = ("RAR3Parser", "RAR5Parser")
 
+# load C version
+try:
+    from ._crypto import rar5_parse_header
+except ImportError:
+    rar5_parse_header = None
+
 
 #
 # File format parsing
@@ -75,10 +92,10 @@ class CommonParser:
     _main = None
     _hdrenc_main = None
     _needs_password = False
-    _fd = None
     _expect_sig = None
     _parse_error = None
     _password = None
+    _scan = None
     comment = None
 
     def __init__(self, rarfile, password, crc_check, charset, strict,
@@ -91,13 +108,14 @@ class CommonParser:
         self._info_callback = info_cb
         self._info_list = []
         self._info_map = {}
-        self._vol_list = []
         self._sfx_offset = sfx_offset
         self._part_only = part_only
+        self._volumes = VolumeFiles()
 
     def is_solid(self):
         """Returns True if archive uses solid compression.
         """
+        self._scan_all()
         if self._main:
             if self._main.flags & RAR_MAIN_SOLID:
                 return True
@@ -106,6 +124,7 @@ class CommonParser:
     def has_header_encryption(self):
         """Returns True if headers are encrypted
         """
+        self._scan_all()
         if self._hdrenc_main:
             return True
         if self._main:
@@ -117,23 +136,123 @@ class CommonParser:
         """Set cached password."""
         self._password = pwd
 
+    def close(self):
+        """Close cached volume files and unfinished scan."""
+        if self._scan:
+            self._scan.close()
+            self._scan = None
+        self._volumes.close()
+
     def volumelist(self):
         """Volume files"""
-        return self._vol_list
+        self._scan_all()
+        return self._volumes.names
 
     def needs_password(self):
         """Is password required"""
+        self._scan_all()
         return self._needs_password
 
     def strerror(self):
         """Last error"""
+        self._scan_all()
         return self._parse_error
 
+    def get_comment(self):
+        """Archive comment"""
+        self._scan_all()
+        return self.comment
+
     def infolist(self):
         """List of RarInfo records.
         """
+        self._scan_all()
         return self._info_list
 
+    def catalog(self):
+        """Return entries as RarCatalog.
+
+        If headers have not been parsed yet (lazy mode), they are
+        scanned into catalog without keeping RarInfo objects.
+        Encrypted headers cannot be re-read, so those are kept.
+        """
+        encrypted = (self._main and self._main.flags & RAR_MAIN_PASSWORD) or self._hdrenc_main
+        if self._scan is None or self._info_list or encrypted:
+            self._scan_all()
+            cat = RarCatalog(self._info_list.__getitem__)
+            for inf in self._info_list:
+                cat._append(inf)
+            return cat
+
+        # separate parser, where catalog takes place of info list
+        parser = self.__class__(self._rarfile, self._password, self._crc_check,
+                                self._charset, self._strict, self._info_callback,
+                                self._sfx_offset, self._part_only)
+        cat = parser._info_list = RarCatalog(parser._load_catalog_row)
+        parser.parse()
+        return cat
+
+    def _load_catalog_row(self, row):
+        """Parse file header again for catalog row.
+        """
+        cat = self._info_list
+        volume = cat.volume[row]
+        volfile = self._volumes.names[volume]
+        with HeaderReader(volfile) as fd:
+            fd.seek(cat.header_offset[row], 0)
+            h = self._parse_header(fd)
+        if h is None:
+            raise BadRarFile("Cannot read header: %s" % cat.filename(row))
+        h.volume = volume
+        h.volume_file = volfile
+        return h
+
+    def _add_entry(self, item):
+        """Store first part of file entry.
+        """
+        if isinstance(self._info_list, RarCatalog):
+            # multi-volume entries are merged into object
+            self._info_list._append(item, keep=bool(item.flags & RAR_FILE_SPLIT_AFTER))
+        else:
+            self._info_map[item.filename.rstrip("/")] = item
+            self._info_list.append(item)
+
+    def _last_entry(self, keep=False):
+        """Return entry where next parts are merged, or None.
+
+        In catalog mode, only kept rows are returned,
+        unless keep is set.
+        """
+        if isinstance(self._info_list, RarCatalog):
+            if keep:
+                return self._info_list._keep_last()
+            return self._info_list._last_kept()
+        if self._info_list:
+            return self._info_list[-1]
+        return None
+
+    def _merged_entry(self, old):
+        """Entry got data from continuation part.
+        """
+        if isinstance(self._info_list, RarCatalog):
+            self._info_list._update_last(old)
+
+    def iter_infos(self):
+        """Yield RarInfo records, parse more headers as needed.
+        """
+        pos = 0
+        while True:
+            if pos < len(self._info_list) and self._is_complete(pos):
+                yield self._info_list[pos]
+                pos += 1
+            elif not self._scan_next() and pos >= len(self._info_list):
+                return
+
+    def _is_complete(self, pos):
+        """Last entry may get more parts or comment from following headers.
+        """
+        return self._scan is None or pos + 1 < len(self._info_list)
+
     def getinfo(self, member):
         """Return RarInfo for filename
         """
@@ -147,6 +266,10 @@ class CommonParser:
         if fname.endswith("/"):
             fname = fname.rstrip("/")
 
+        # later entry with same name replaces earlier one,
+        # so in lazy mode whole archive must be parsed
+        self._scan_all()
+
         try:
             return self._info_map[fname]
         except KeyError:
@@ -161,116 +284,253 @@ class CommonParser:
                 inf = self.getinfo(redir_name)
         return inf
 
+    def get_index_state(self):
+        """Return parsed state for index cache.
+        """
+        self._scan_all()
+        return {
+            "info_list": self._info_list,
+            "vol_list": self._volumes.names,
+            "main": self._main,
+            "needs_password": self._needs_password,
+            "comment": self.comment,
+        }
+
+    def set_index_state(self, state):
+        """Restore parsed state from index cache.
+        """
+        # cache key is absolute path, so stored names may be relative
+        # to some other directory - rebase them on current name
+        vol_map = {}
+        vol_dir = os.path.dirname(self._rarfile)
+        for i, vol in enumerate(state["vol_list"]):
+            vol_map[vol] = self._rarfile if i == 0 else os.path.join(vol_dir, os.path.basename(vol))
+        for item in state["info_list"]:
+            item.volume_file = vol_map.get(item.volume_file, item.volume_file)
+
+        self._info_list = state["info_list"]
+        self._volumes.names = [vol_map[vol] for vol in state["vol_list"]]
+        self._main = state["main"]
+        self._needs_password = state["needs_password"]
+        self.comment = state["comment"]
+        self._info_map = {}
+        for item in self._info_list:
+            self._info_map[item.filename.rstrip("/")] = item
+
     def parse(self):
         """Process file."""
-        self._fd = None
+        self.parse_lazy()
+        self._scan_all()
+
+    def parse_lazy(self):
+        """Process only first header, rest are parsed on demand."""
+        self._scan = self._parse_real()
+        self._scan_next()
+
+    def _scan_next(self):
+        """Parse next header, returns False when done."""
+        if self._scan is None:
+            return False
         try:
-            self._parse_real()
-        finally:
-            if self._fd:
-                self._fd.close()
-                self._fd = None
+            next(self._scan)
+        except StopIteration:
+            self._scan = None
+            return False
+        except BaseException:
+            self._scan = None
+            raise
+        return True
+
+    def _scan_all(self):
+        while self._scan_next():
+            pass
 
     def _parse_real(self):
         """Actually read file.
         """
-        fd = XFile(self._rarfile)
-        self._fd = fd
-        fd.seek(self._sfx_offset, 0)
-        sig = fd.read(len(self._expect_sig))
-        if sig != self._expect_sig:
-            raise NotRarFile("Not a Rar archive")
-
-        volume = 0  # first vol (.rar) is 0
-        more_vols = False
-        endarc = False
-        volfile = self._rarfile
-        self._vol_list = [self._rarfile]
-        raise_need_first_vol = False
-        while True:
-            if endarc:
-                h = None    # don"t read past ENDARC
-            else:
-                h = self._parse_header(fd)
-            if not h:
-                if raise_need_first_vol:
-                    # did not find ENDARC with VOLNR
-                    raise NeedFirstVolume("Need to start from first volume", None)
-                if more_vols and not self._part_only:
-                    volume += 1
-                    fd.close()
-                    try:
-                        volfile = self._next_volname(volfile)
-                        fd = XFile(volfile)
-                    except IOError:
-                        self._set_error("Cannot open next volume: %s", volfile)
-                        break
-                    self._fd = fd
-                    sig = fd.read(len(self._expect_sig))
-                    if sig != self._expect_sig:
-                        self._set_error("Invalid volume sig: %s", volfile)
-                        break
-                    more_vols = False
-                    endarc = False
-                    self._vol_list.append(volfile)
-                    self._main = None
-                    self._hdrenc_main = None
-                    continue
-                break
-            h.volume = volume
-            h.volume_file = volfile
-
-            if h.type == RAR_BLOCK_MAIN and not self._main:
-                self._main = h
-                if volume == 0 and (h.flags & RAR_MAIN_NEWNUMBERING) and not self._part_only:
-                    # RAR 2.x does not set FIRSTVOLUME,
-                    # so check it only if NEWNUMBERING is used
-                    if (h.flags & RAR_MAIN_FIRSTVOLUME) == 0:
-                        if getattr(h, "main_volume_number", None) is not None:
-                            # rar5 may have more info
-                            raise NeedFirstVolume(
-                                "Need to start from first volume (current: %r)"
-                                % (h.main_volume_number,),
-                                h.main_volume_number
-                            )
-                        # delay raise until we have volnr from ENDARC
-                        raise_need_first_vol = True
-                if h.flags & RAR_MAIN_PASSWORD:
+        fd = HeaderReader(self._rarfile)
+        try:
+            fd.seek(self._sfx_offset, 0)
+            sig = fd.read(len(self._expect_sig))
+            if sig != self._expect_sig:
+                raise NotRarFile("Not a Rar archive")
+
+            volume = 0  # first vol (.rar) is 0
+            more_vols = False
+            endarc = False
+            volfile = self._rarfile
+            self._volumes.names = [self._rarfile]
+            raise_need_first_vol = False
+            volscan = None
+            prefetched = None
+            while True:
+                if endarc:
+                    h = None    # don"t read past ENDARC
+                elif prefetched is not None:
+                    h = next(prefetched, None)
+                else:
+                    h = self._parse_header(fd)
+                if not h:
+                    if raise_need_first_vol:
+                        # did not find ENDARC with VOLNR
+                        raise NeedFirstVolume("Need to start from first volume", None)
+                    if more_vols and not self._part_only:
+                        volume += 1
+                        fd.close()
+                        if volume == 1:
+                            volscan = self._start_volume_scan(volfile)
+                        try:
+                            if volscan:
+                                volfile, prefetched = self._get_prefetched(volscan, volume, volfile)
+                            else:
+                                volfile = self._next_volname(volfile)
+                            fd = HeaderReader(volfile)
+                        except IOError:
+                            self._set_error("Cannot open next volume: %s", volfile)
+                            break
+                        if prefetched is None:
+                            sig = fd.read(len(self._expect_sig))
+                            if sig != self._expect_sig:
+                                self._set_error("Invalid volume sig: %s", volfile)
+                                break
+                        more_vols = False
+                        endarc = False
+                        self._volumes.names.append(volfile)
+                        self._main = None
+                        self._hdrenc_main = None
+                        continue
+                    break
+                h.volume = volume
+                h.volume_file = volfile
+
+                if h.type == RAR_BLOCK_MAIN and not self._main:
+                    self._main = h
+                    if volume == 0 and (h.flags & RAR_MAIN_NEWNUMBERING) and not self._part_only:
+                        # RAR 2.x does not set FIRSTVOLUME,
+                        # so check it only if NEWNUMBERING is used
+                        if (h.flags & RAR_MAIN_FIRSTVOLUME) == 0:
+                            if getattr(h, "main_volume_number", None) is not None:
+                                # rar5 may have more info
+                                raise NeedFirstVolume(
+                                    "Need to start from first volume (current: %r)"
+                                    % (h.main_volume_number,),
+                                    h.main_volume_number
+                                )
+                            # delay raise until we have volnr from ENDARC
+                            raise_need_first_vol = True
+                    if h.flags & RAR_MAIN_PASSWORD:
+                        self._needs_password = True
+                        if not self._password:
+                            break
+                elif h.type == RAR_BLOCK_ENDARC:
+                    # use flag, but also allow RAR 2.x logic below to trigger
+                    if h.flags & RAR_ENDARC_NEXT_VOLUME:
+                        more_vols = True
+                    endarc = True
+                    if raise_need_first_vol and (h.flags & RAR_ENDARC_VOLNR) > 0:
+                        raise NeedFirstVolume(
+                            "Need to start from first volume (current: %r)"
+                            % (h.endarc_volnr,),
+                            h.endarc_volnr
+                        )
+                elif h.type == RAR_BLOCK_FILE:
+                    # RAR 2.x does not write RAR_BLOCK_ENDARC
+                    if h.flags & RAR_FILE_SPLIT_AFTER:
+                        more_vols = True
+                    # RAR 2.x does not set RAR_MAIN_FIRSTVOLUME
+                    if volume == 0 and h.flags & RAR_FILE_SPLIT_BEFORE:
+                        if not self._part_only:
+                            raise_need_first_vol = True
+
+                if h.needs_password():
                     self._needs_password = True
-                    if not self._password:
-                        break
-            elif h.type == RAR_BLOCK_ENDARC:
-                # use flag, but also allow RAR 2.x logic below to trigger
-                if h.flags & RAR_ENDARC_NEXT_VOLUME:
-                    more_vols = True
-                endarc = True
-                if raise_need_first_vol and (h.flags & RAR_ENDARC_VOLNR) > 0:
-                    raise NeedFirstVolume(
-                        "Need to start from first volume (current: %r)"
-                        % (h.endarc_volnr,),
-                        h.endarc_volnr
-                    )
-            elif h.type == RAR_BLOCK_FILE:
-                # RAR 2.x does not write RAR_BLOCK_ENDARC
-                if h.flags & RAR_FILE_SPLIT_AFTER:
-                    more_vols = True
-                # RAR 2.x does not set RAR_MAIN_FIRSTVOLUME
-                if volume == 0 and h.flags & RAR_FILE_SPLIT_BEFORE:
-                    if not self._part_only:
-                        raise_need_first_vol = True
-
-            if h.needs_password():
-                self._needs_password = True
 
-            # store it
-            self.process_entry(fd, h)
+                # store it
+                if prefetched is not None:
+                    fd.seek(h.data_offset, 0)
+                self.process_entry(fd, h)
+
+                if self._info_callback:
+                    self._info_callback(h)
+
+                # go to next header
+                if h.add_size > 0:
+                    fd.seek(h.data_offset + h.add_size, 0)
+
+                yield h
+        finally:
+            fd.close()
+            if volscan:
+                volscan[0].shutdown(wait=False, cancel_futures=True)
+
+    def _start_volume_scan(self, volfile):
+        """Start scanning headers of following volumes in thread pool.
+
+        Volume names are generated up front, until first missing file.
+        Returns (pool, names, futures) or None if not enabled.
+        """
+        if config.VOLUME_SCAN_WORKERS <= 0 or is_filelike(volfile):
+            return None
+        if not self._main or self._main.flags & RAR_MAIN_PASSWORD or self._hdrenc_main:
+            return None
+        names = []
+        while True:
+            volfile = self._next_volname(volfile)
+            if not os.path.isfile(volfile):
+                break
+            names.append(volfile)
+        pool = ThreadPoolExecutor(max_workers=config.VOLUME_SCAN_WORKERS)
+        return pool, names, [pool.submit(self._scan_volume, fn) for fn in names]
 
-            if self._info_callback:
-                self._info_callback(h)
+    def _get_prefetched(self, volscan, volume, volfile):
+        """Return name and headers iterator for volume.
 
-            # go to next header
-            if h.add_size > 0:
-                fd.seek(h.data_offset + h.add_size, 0)
+        If volume was not scanned, iterator is None and
+        volume is read directly.
+        """
+        ___pool, names, futures = volscan
+        if volume > len(names):
+            return self._next_volname(volfile), None
+        res = futures[volume - 1].result()
+        if res is None:
+            return names[volume - 1], None
+        return names[volume - 1], self._iter_prefetched(*res)
+
+    def _iter_prefetched(self, headers, error):
+        yield from headers
+        if error:
+            self._set_error(error)
+
+    def _scan_volume(self, volfile):
+        """Read headers of single volume, runs in worker thread.
+
+        Uses separate parser object for main header state.
+        Returns (headers, error) or None if volume cannot be read.
+        """
+        parser = self.__class__(volfile, self._password, self._crc_check,
+                                self._charset, False, None, 0, True)
+        headers = []
+        try:
+            fd = HeaderReader(volfile)
+        except IOError:
+            return None
+        with fd:
+            if fd.read(len(self._expect_sig)) != self._expect_sig:
+                return None
+            while True:
+                h = parser._parse_header(fd)
+                if not h:
+                    break
+                headers.append(h)
+                if h.type == RAR_BLOCK_MAIN and not parser._main:
+                    parser._main = h
+                    if h.flags & RAR_MAIN_PASSWORD:
+                        break
+                elif h.type == RAR_BLOCK_ENDARC:
+                    break
+                if h.add_size > 0:
+                    fd.seek(h.data_offset + h.add_size, 0)
+        return headers, parser._parse_error
 
     def process_entry(self, fd, item):
         """Examine item, add into lookup cache."""
@@ -285,6 +545,29 @@ class CommonParser:
     def _open_hack(self, inf, pwd):
         raise NotImplementedError("_open_hack")
 
+    def _use_native_unpack(self, inf):
+        return False
+
+    def _use_native_decrypt(self, inf):
+        """Stored encrypted file can be decrypted in-process."""
+        if not _have_crypto or config.FORCE_TOOL:
+            return False
+        if (inf.flags & RAR_FILE_PASSWORD) == 0 or inf.file_redir:
+            return False
+        return inf.compress_type == RAR_M0
+
+    def _open_decrypt(self, inf, pwd):
+        raise NotImplementedError("_open_decrypt")
+
+    def _open_volume(self, volfile):
+        """Open volume for reading with private file position.
+        """
+        if is_filelike(volfile):
+            return LockedFile(volfile, self._volumes.lock)
+        if hasattr(os, "pread"):
+            return PreadFile(self._volumes, volfile)
+        return XFile(volfile, 0)
+
     def _parse_header(self, fd):
         """Read single header
         """
@@ -293,7 +576,12 @@ class CommonParser:
             if (self._main and self._main.flags & RAR_MAIN_PASSWORD) or self._hdrenc_main:
                 if not self._password:
                     return None
-                fd = self._decrypt_header(fd)
+                # header is parsed again from salt/IV
+                header_offset = fd.tell()
+                h = self._parse_block_header(self._decrypt_header(fd))
+                if h:
+                    h.header_offset = header_offset
+                return h
 
             # now read actual header
             return self._parse_block_header(fd)
@@ -317,7 +605,7 @@ class CommonParser:
         if self._strict:
             raise BadRarFile(msg)
 
-    def open(self, inf, pwd):
+    def open(self, inf, pwd, use_mmap=None):
         """Return stream object for file data."""
 
         if inf.file_redir:
@@ -352,7 +640,11 @@ class CommonParser:
 
         # now extract
         if inf.compress_type == RAR_M0 and (inf.flags & RAR_FILE_PASSWORD) == 0 and inf.file_redir is None:
-            return self._open_clear(inf)
+            return self._open_clear(inf, use_mmap)
+        elif self._use_native_decrypt(inf):
+            return self._open_decrypt(inf, pwd)
+        elif self._use_native_unpack(inf):
+            return InProcessReader(self, inf)
         elif use_hack:
             return self._open_hack(inf, pwd)
         elif is_filelike(self._rarfile):
@@ -360,45 +652,104 @@ class CommonParser:
         else:
             return self._open_unrar(self._rarfile, inf, pwd)
 
-    def _open_clear(self, inf):
+    def _open_clear(self, inf, use_mmap=None):
         if config.FORCE_TOOL:
             return self._open_unrar(self._rarfile, inf)
+        if use_mmap is None:
+            use_mmap = config.USE_MMAP
+        if use_mmap and not is_filelike(inf.volume_file):
+            return MmapReader(self, inf)
         return DirectReader(self, inf)
 
+    def view(self, inf):
+        """Return read-only memoryview for file data."""
+        if is_filelike(inf.volume_file):
+            raise io.UnsupportedOperation("Archive is not on disk")
+        if inf.compress_type != RAR_M0 or inf.file_redir:
+            raise io.UnsupportedOperation("File is not stored: " + inf.filename)
+        if inf.flags & RAR_FILE_PASSWORD:
+            raise io.UnsupportedOperation("File is encrypted: " + inf.filename)
+        if inf.flags & (RAR_FILE_SPLIT_BEFORE | RAR_FILE_SPLIT_AFTER):
+            raise io.UnsupportedOperation("File is split over volumes: " + inf.filename)
+
+        with open(inf.volume_file, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(mm)[inf.data_offset: inf.data_offset + inf.file_size]
+        if len(data) != inf.file_size:
+            raise BadRarFile("Truncated archive: " + inf.filename)
+        return data
+
     def _open_hack_core(self, inf, pwd, prefix, suffix):
 
-        size = inf.compress_size + inf.header_size
-        rf = XFile(inf.volume_file, 0)
-        rf.seek(inf.header_offset)
+        memf = memfd_tempfile()
+        if memf is not None:
+            try:
+                memf.write(prefix)
+                self._copy_hack_data(inf, memf)
+                memf.write(suffix)
+            except BaseException:
+                memf.close()
+                raise
+            return self._open_unrar(memfd_path(memf), inf, pwd, memf)
 
         tmpfd, tmpname = mkstemp(suffix=".rar", dir=config.HACK_TMP_DIR)
         tmpf = os.fdopen(tmpfd, "wb")
 
         try:
             tmpf.write(prefix)
-            while size > 0:
-                if size > config.BSIZE:
-                    buf = rf.read(config.BSIZE)
-                else:
-                    buf = rf.read(size)
-                if not buf:
-                    raise BadRarFile("read failed: " + inf.filename)
-                tmpf.write(buf)
-                size -= len(buf)
+            self._copy_hack_data(inf, tmpf)
             tmpf.write(suffix)
             tmpf.close()
-            rf.close()
         except BaseException:
-            rf.close()
             tmpf.close()
             os.unlink(tmpname)
             raise
 
         return self._open_unrar(tmpname, inf, pwd, tmpname)
 
+    def _copy_hack_data(self, inf, dstf):
+        """Copy file headers and compressed data into tmp archive.
+
+        Unbuffered destination gets kernel-side copy from volume.
+        """
+        size = inf.compress_size + inf.header_size
+        ofs = inf.header_offset
+        if isinstance(dstf, io.RawIOBase) and not is_filelike(inf.volume_file) \
+                and hasattr(os, "copy_file_range"):
+            with open(inf.volume_file, "rb") as rf:
+                while size > 0:
+                    got = _copy_range(rf.fileno(), dstf.fileno(), ofs, size)
+                    if not got:
+                        raise BadRarFile("read failed: " + inf.filename)
+                    ofs += got
+                    size -= got
+            return
+
+        with XFile(inf.volume_file, 0) as rf:
+            rf.seek(ofs)
+            while size > 0:
+                if size > config.BSIZE:
+                    buf = rf.read(config.BSIZE)
+                else:
+                    buf = rf.read(size)
+                if not buf:
+                    raise BadRarFile("read failed: " + inf.filename)
+                dstf.write(buf)
+                size -= len(buf)
+
     def _open_unrar_membuf(self, memfile, inf, pwd):
         """Write in-memory archive to temp file, needed for solid archives.
         """
+        memf = memfd_tempfile()
+        if memf is not None:
+            try:
+                memfile.seek(0, 0)
+                shutil.copyfileobj(memfile, memf, config.BSIZE)
+            except BaseException:
+                memf.close()
+                raise
+            return self._open_unrar(memfd_path(memf), inf, pwd, memf, force_file=True)
+
         tmpname = membuf_tempfile(memfile)
         return self._open_unrar(tmpname, inf, pwd, tmpname, force_file=True)
 
@@ -435,7 +786,7 @@ class RAR3Parser(CommonParser):
         if self._last_aes_key[0] == salt:
             key, iv = self._last_aes_key[1:]
         else:
-            key, iv = rar3_s2k(self._password, salt)
+            key, iv = derive_key(rar3_s2k, self._password, salt)
             self._last_aes_key = (salt, key, iv)
         return HeaderDecrypt(fd, key, iv)
 
@@ -544,8 +895,7 @@ class RAR3Parser(CommonParser):
         h.file_size = fld[1]
         h.host_os = fld[2]
         h.CRC = fld[3]
-        h.date_time = parse_dos_time(fld[4])
-        h.mtime = to_datetime(h.date_time)
+        h._date_time = fld[4]
         h.extract_version = fld[5]
         h.compress_type = fld[6]
         h._name_size = name_size = fld[7]
@@ -597,8 +947,6 @@ class RAR3Parser(CommonParser):
         # optional extended time stamps
         if h.flags & RAR_FILE_EXTTIME:
             pos = _parse_ext_time(h, hdata, pos)
-        else:
-            h.mtime = h.atime = h.ctime = h.arctime = None
 
         return pos
 
@@ -679,14 +1027,15 @@ class RAR3Parser(CommonParser):
             if item.flags & RAR_FILE_VERSION:
                 pass    # skip old versions
             elif (item.flags & RAR_FILE_SPLIT_BEFORE) == 0:
-                self._info_map[item.filename.rstrip("/")] = item
-                self._info_list.append(item)
-            elif len(self._info_list) > 0:
+                self._add_entry(item)
+            else:
                 # final crc is in last block
-                old = self._info_list[-1]
-                old.CRC = item.CRC
-                old._md_expect = item._md_expect
-                old.compress_size += item.compress_size
+                old = self._last_entry()
+                if old is not None:
+                    old.CRC = item.CRC
+                    old._md_expect = item._md_expect
+                    old.compress_size += item.compress_size
+                    self._merged_entry(old)
 
         # parse new-style comment
         if item.type == RAR_BLOCK_SUB and item.filename == "CMT":
@@ -695,8 +1044,8 @@ class RAR3Parser(CommonParser):
             elif item.flags & RAR_FILE_SOLID:
                 # file comment
                 cmt = self._read_comment_v3(item, self._password)
-                if len(self._info_list) > 0:
-                    old = self._info_list[-1]
+                old = self._last_entry(keep=True)
+                if old is not None:
                     old.comment = cmt
             else:
                 # archive comment
@@ -716,6 +1065,14 @@ class RAR3Parser(CommonParser):
         prefix = RAR_ID + S_BLK_HDR.pack(0x90CF, 0x73, 0, 13) + b"\0" * (2 + 4)
         return self._open_hack_core(inf, pwd, prefix, b"")
 
+    def _use_native_decrypt(self, inf):
+        # older RAR 2.0 cipher is left to unrar
+        return super()._use_native_decrypt(inf) and inf.extract_version >= 29
+
+    def _open_decrypt(self, inf, pwd):
+        key, iv = derive_key(rar3_s2k, pwd, inf.salt or b"")
+        return DecryptReader(self, inf, key, iv)
+
 
 #
 # RAR5 format
@@ -742,7 +1099,7 @@ class RAR5Parser(CommonParser):
         if kdf_count > RAR_MAX_KDF_SHIFT:
             raise BadRarFile("Too large kdf_count")
         pwd = self._get_utf8_password()
-        key = rar5_s2k(pwd, salt, 1 << kdf_count)
+        key = derive_key(rar5_kdf, pwd, salt, 1 << kdf_count)[0]
         self._last_aes256_key = (kdf_count, salt, key)
         return key
 
@@ -783,7 +1140,10 @@ class RAR5Parser(CommonParser):
             return None
         data_offset = fd.tell()
 
-        calc_crc = crc32(memoryview(hdata)[4:])
+        if rar5_parse_header is not None:
+            calc_crc, fields = rar5_parse_header(hdata)
+        else:
+            calc_crc, fields = crc32(memoryview(hdata)[4:]), None
         if header_crc != calc_crc:
             # header parsing failed.
             self._set_error("Header CRC error: exp=%x got=%x (xlen = %d)",
@@ -792,7 +1152,12 @@ class RAR5Parser(CommonParser):
 
         block_type, pos = load_vint(hdata, pos)
 
-        if block_type == RAR5_BLOCK_MAIN:
+        if fields:
+            if block_type == RAR5_BLOCK_FILE:
+                h = self._set_file_fields(Rar5FileInfo(), fields)
+            else:
+                h = self._set_file_fields(Rar5ServiceInfo(), fields)
+        elif block_type == RAR5_BLOCK_MAIN:
             h, pos = self._parse_block_common(Rar5MainInfo(), hdata)
             h = self._parse_main_block(h, hdata, pos)
         elif block_type == RAR5_BLOCK_FILE:
@@ -825,14 +1190,16 @@ class RAR5Parser(CommonParser):
             h.block_extra_size, pos = load_vint(hdata, pos)
         if h.block_flags & RAR5_BLOCK_FLAG_DATA_AREA:
             h.add_size, pos = load_vint(hdata, pos)
+        self._set_block_flags(h)
+        return h, pos
 
+    def _set_block_flags(self, h):
         h.compress_size = h.add_size
 
         if h.block_flags & RAR5_BLOCK_FLAG_SKIP_IF_UNKNOWN:
             h.flags |= RAR_SKIP_IF_UNKNOWN
         if h.block_flags & RAR5_BLOCK_FLAG_DATA_AREA:
             h.flags |= RAR_LONG_BLOCK
-        return h, pos
 
     def _parse_main_block(self, h, hdata, pos):
         h.main_flags, pos = load_vint(hdata, pos)
@@ -858,13 +1225,11 @@ class RAR5Parser(CommonParser):
         h.file_size, pos = load_vint(hdata, pos)
         h.mode, pos = load_vint(hdata, pos)
 
+        mtime = crc = None
         if h.file_flags & RAR5_FILE_FLAG_HAS_MTIME:
-            h.mtime, pos = load_unixtime(hdata, pos)
-            h.date_time = h.mtime.timetuple()[:6]
+            mtime, pos = load_le32(hdata, pos)
         if h.file_flags & RAR5_FILE_FLAG_HAS_CRC32:
-            h.CRC, pos = load_le32(hdata, pos)
-            h._md_class = CRC32Context
-            h._md_expect = h.CRC
+            crc, pos = load_le32(hdata, pos)
 
         h.file_compress_flags, pos = load_vint(hdata, pos)
         h.file_host_os, pos = load_vint(hdata, pos)
@@ -873,6 +1238,40 @@ class RAR5Parser(CommonParser):
         nul = name.find(b"\0")
         if nul >= 0:
             name = name[:nul]
+
+        extra = []
+        if h.block_extra_size:
+            # allow 1 byte of garbage
+            while pos < len(hdata) - 1:
+                xsize, pos = load_vint(hdata, pos)
+                xdata, pos = load_bytes(hdata, xsize, pos)
+                rec = self._parse_file_extra(xdata)
+                if rec:
+                    extra.append(rec)
+
+        return self._finish_file_block(h, mtime, crc, name, extra)
+
+    def _set_file_fields(self, h, fields):
+        """Fill file block from values decoded by rar5_parse_header().
+        """
+        (h.block_type, h.header_crc, h.header_size, h.block_flags,
+         extra_size, add_size, h.file_flags, h.file_size, h.mode,
+         mtime, crc, h.file_compress_flags, h.file_host_os, name, extra) = fields
+        if h.block_flags & RAR5_BLOCK_FLAG_EXTRA_DATA:
+            h.block_extra_size = extra_size
+        if h.block_flags & RAR5_BLOCK_FLAG_DATA_AREA:
+            h.add_size = add_size
+        self._set_block_flags(h)
+        return self._finish_file_block(h, mtime, crc, name, extra)
+
+    def _finish_file_block(self, h, mtime, crc, name, extra):
+        if mtime is not None:
+            h._mtime = mtime * 1000000000
+        if crc is not None:
+            h.CRC = crc
+            h._md_class = CRC32Context
+            h._md_expect = h.CRC
+
         h.orig_filename = name
         h.filename = h.orig_filename.decode("utf8", "replace").rstrip("/")
 
@@ -883,12 +1282,8 @@ class RAR5Parser(CommonParser):
             h.host_os = RAR_OS_UNIX
         h.compress_type = RAR_M0 + ((h.file_compress_flags >> 7) & 7)
 
-        if h.block_extra_size:
-            # allow 1 byte of garbage
-            while pos < len(hdata) - 1:
-                xsize, pos = load_vint(hdata, pos)
-                xdata, pos = load_bytes(hdata, xsize, pos)
-                self._process_file_extra(h, xdata)
+        for rec in extra:
+            self._process_file_extra(h, rec)
 
         if h.block_flags & RAR5_BLOCK_FLAG_SPLIT_BEFORE:
             h.flags |= RAR_FILE_SPLIT_BEFORE
@@ -909,27 +1304,27 @@ class RAR5Parser(CommonParser):
             h.flags |= RAR_ENDARC_NEXT_VOLUME
         return h
 
-    def _check_password(self, check_value, kdf_count_shift, salt):
+    def _get_check_value(self, check_value):
+        """Return password check value if its checksum is valid.
+        """
         if len(check_value) != RAR5_PW_CHECK_SIZE + RAR5_PW_SUM_SIZE:
-            return
-        if kdf_count_shift > RAR_MAX_KDF_SHIFT:
-            raise BadRarFile("Too large kdf_count")
-
+            return None
         hdr_check = check_value[:RAR5_PW_CHECK_SIZE]
         hdr_sum = check_value[RAR5_PW_CHECK_SIZE:]
         sum_hash = sha256(hdr_check).digest()
         if sum_hash[:RAR5_PW_SUM_SIZE] != hdr_sum:
+            return None
+        return hdr_check
+
+    def _check_password(self, check_value, kdf_count_shift, salt):
+        hdr_check = self._get_check_value(check_value)
+        if hdr_check is None:
             return
+        if kdf_count_shift > RAR_MAX_KDF_SHIFT:
+            raise BadRarFile("Too large kdf_count")
 
-        kdf_count = (1 << kdf_count_shift) + 32
         pwd = self._get_utf8_password()
-        pwd_hash = rar5_s2k(pwd, salt, kdf_count)
-
-        pwd_check = bytearray(RAR5_PW_CHECK_SIZE)
-        len_mask = RAR5_PW_CHECK_SIZE - 1
-        for i, v in enumerate(pwd_hash):
-            pwd_check[i & len_mask] ^= v
-
+        pwd_check = derive_key(rar5_kdf, pwd, salt, 1 << kdf_count_shift)[2]
         if pwd_check != hdr_check:
             raise RarWrongPassword()
 
@@ -948,54 +1343,81 @@ class RAR5Parser(CommonParser):
             self._check_password(h.encryption_check_value, h.encryption_kdf_count, h.encryption_salt)
         return h
 
-    def _process_file_extra(self, h, xdata):
+    def _parse_file_extra(self, xdata):
+        """Decode extra record into tuple, None for unknown types.
+        """
         xtype, pos = load_vint(xdata, 0)
         if xtype == RAR5_XFILE_TIME:
-            self._parse_file_xtime(h, xdata, pos)
+            return self._parse_file_xtime(xtype, xdata, pos)
         elif xtype == RAR5_XFILE_ENCRYPTION:
-            self._parse_file_encryption(h, xdata, pos)
+            return self._parse_file_encryption(xtype, xdata, pos)
         elif xtype == RAR5_XFILE_HASH:
-            self._parse_file_hash(h, xdata, pos)
+            return self._parse_file_hash(xtype, xdata, pos)
         elif xtype == RAR5_XFILE_VERSION:
-            self._parse_file_version(h, xdata, pos)
+            return self._parse_file_version(xtype, xdata, pos)
         elif xtype == RAR5_XFILE_REDIR:
-            self._parse_file_redir(h, xdata, pos)
+            return self._parse_file_redir(xtype, xdata, pos)
         elif xtype == RAR5_XFILE_OWNER:
-            self._parse_file_owner(h, xdata, pos)
+            return self._parse_file_owner(xtype, xdata, pos)
         elif xtype == RAR5_XFILE_SERVICE:
-            pass
+            return None
         else:
-            pass
+            return None
+
+    def _process_file_extra(self, h, rec):
+        xtype = rec[0]
+        if xtype == RAR5_XFILE_TIME:
+            self._set_file_xtime(h, rec)
+        elif xtype == RAR5_XFILE_ENCRYPTION:
+            self._set_file_encryption(h, rec)
+        elif xtype == RAR5_XFILE_HASH:
+            self._set_file_hash(h, rec)
+        elif xtype == RAR5_XFILE_VERSION:
+            h.file_version = rec[1:]
+        elif xtype == RAR5_XFILE_REDIR:
+            redir_type, redir_flags, redir_name = rec[1:]
+            h.file_redir = (redir_type, redir_flags, redir_name.decode("utf8", "replace"))
+        elif xtype == RAR5_XFILE_OWNER:
+            h.file_owner = rec[1:]
 
     # extra block for file time record
-    def _parse_file_xtime(self, h, xdata, pos):
+    def _parse_file_xtime(self, xtype, xdata, pos):
         tflags, pos = load_vint(xdata, pos)
 
-        ldr = load_windowstime
+        ldr = load_le64
         if tflags & RAR5_XTIME_UNIXTIME:
-            ldr = load_unixtime
+            ldr = load_le32
+
+        times = [None, None, None]
+        nsecs = [None, None, None]
+        tbits = (RAR5_XTIME_HAS_MTIME, RAR5_XTIME_HAS_CTIME, RAR5_XTIME_HAS_ATIME)
+        for i, bit in enumerate(tbits):
+            if tflags & bit:
+                times[i], pos = ldr(xdata, pos)
+        if tflags & RAR5_XTIME_UNIXTIME_NS:
+            for i, bit in enumerate(tbits):
+                if tflags & bit:
+                    nsecs[i], pos = load_le32(xdata, pos)
+        return (xtype, tflags, *times, *nsecs)
 
-        if tflags & RAR5_XTIME_HAS_MTIME:
-            h.mtime, pos = ldr(xdata, pos)
-            h.date_time = h.mtime.timetuple()[:6]
-        if tflags & RAR5_XTIME_HAS_CTIME:
-            h.ctime, pos = ldr(xdata, pos)
-        if tflags & RAR5_XTIME_HAS_ATIME:
-            h.atime, pos = ldr(xdata, pos)
+    def _set_file_xtime(self, h, rec):
+        tflags, mtime, ctime, atime, mtime_ns, ctime_ns, atime_ns = rec[1:]
 
-        if tflags & RAR5_XTIME_UNIXTIME_NS:
-            if tflags & RAR5_XTIME_HAS_MTIME:
-                nsec, pos = load_le32(xdata, pos)
-                h.mtime = to_nsdatetime(h.mtime, nsec)
-            if tflags & RAR5_XTIME_HAS_CTIME:
-                nsec, pos = load_le32(xdata, pos)
-                h.ctime = to_nsdatetime(h.ctime, nsec)
-            if tflags & RAR5_XTIME_HAS_ATIME:
-                nsec, pos = load_le32(xdata, pos)
-                h.atime = to_nsdatetime(h.atime, nsec)
+        # keep as nanoseconds, datetime is created on access
+        if tflags & RAR5_XTIME_UNIXTIME:
+            conv = unixtime_ns
+        else:
+            conv = windowstime_ns
+
+        if mtime is not None:
+            h._mtime = conv(mtime, mtime_ns)
+        if ctime is not None:
+            h._ctime = conv(ctime, ctime_ns)
+        if atime is not None:
+            h._atime = conv(atime, atime_ns)
 
     # just remember encryption info
-    def _parse_file_encryption(self, h, xdata, pos):
+    def _parse_file_encryption(self, xtype, xdata, pos):
         algo, pos = load_vint(xdata, pos)
         flags, pos = load_vint(xdata, pos)
         kdf_count, pos = load_byte(xdata, pos)
@@ -1004,34 +1426,42 @@ class RAR5Parser(CommonParser):
         checkval = None
         if flags & RAR5_XENC_CHECKVAL:
             checkval, pos = load_bytes(xdata, 12, pos)
-        if flags & RAR5_XENC_TWEAKED:
+        return (xtype, algo, flags, kdf_count, salt, iv, checkval)
+
+    def _set_file_encryption(self, h, rec):
+        h.file_encryption = rec[1:]
+        if h.file_encryption[1] & RAR5_XENC_TWEAKED:
             h._md_expect = None
             h._md_class = NoHashContext
-
-        h.file_encryption = (algo, flags, kdf_count, salt, iv, checkval)
         h.flags |= RAR_FILE_PASSWORD
 
-    def _parse_file_hash(self, h, xdata, pos):
+    def _parse_file_hash(self, xtype, xdata, pos):
         hash_type, pos = load_vint(xdata, pos)
+        hash_value = None
         if hash_type == RAR5_XHASH_BLAKE2SP:
-            h.blake2sp_hash, pos = load_bytes(xdata, 32, pos)
+            hash_value, pos = load_bytes(xdata, 32, pos)
+        return (xtype, hash_type, hash_value)
+
+    def _set_file_hash(self, h, rec):
+        hash_type, hash_value = rec[1:]
+        if hash_type == RAR5_XHASH_BLAKE2SP:
+            h.blake2sp_hash = hash_value
             if (h.file_encryption[1] & RAR5_XENC_TWEAKED) == 0:
                 h._md_class = Blake2SP
                 h._md_expect = h.blake2sp_hash
 
-    def _parse_file_version(self, h, xdata, pos):
+    def _parse_file_version(self, xtype, xdata, pos):
         flags, pos = load_vint(xdata, pos)
         version, pos = load_vint(xdata, pos)
-        h.file_version = (flags, version)
+        return (xtype, flags, version)
 
-    def _parse_file_redir(self, h, xdata, pos):
+    def _parse_file_redir(self, xtype, xdata, pos):
         redir_type, pos = load_vint(xdata, pos)
         redir_flags, pos = load_vint(xdata, pos)
         redir_name, pos = load_vstr(xdata, pos)
-        redir_name = redir_name.decode("utf8", "replace")
-        h.file_redir = (redir_type, redir_flags, redir_name)
+        return (xtype, redir_type, redir_flags, redir_name)
 
-    def _parse_file_owner(self, h, xdata, pos):
+    def _parse_file_owner(self, xtype, xdata, pos):
         user_name = group_name = user_id = group_id = None
 
         flags, pos = load_vint(xdata, pos)
@@ -1044,7 +1474,7 @@ class RAR5Parser(CommonParser):
         if flags & RAR5_XOWNER_GID:
             group_id, pos = load_vint(xdata, pos)
 
-        h.file_owner = (user_name, group_name, user_id, group_id)
+        return (xtype, user_name, group_name, user_id, group_id)
 
     def process_entry(self, fd, item):
         if item.block_type == RAR5_BLOCK_FILE:
@@ -1052,15 +1482,16 @@ class RAR5Parser(CommonParser):
                 pass    # skip old versions
             elif (item.block_flags & RAR5_BLOCK_FLAG_SPLIT_BEFORE) == 0:
                 # use only first part
-                self._info_map[item.filename.rstrip("/")] = item
-                self._info_list.append(item)
-            elif len(self._info_list) > 0:
+                self._add_entry(item)
+            else:
                 # final crc is in last block
-                old = self._info_list[-1]
-                old.CRC = item.CRC
-                old._md_expect = item._md_expect
-                old.blake2sp_hash = item.blake2sp_hash
-                old.compress_size += item.compress_size
+                old = self._last_entry()
+                if old is not None:
+                    old.CRC = item.CRC
+                    old._md_expect = item._md_expect
+                    old.blake2sp_hash = item.blake2sp_hash
+                    old.compress_size += item.compress_size
+                    self._merged_entry(old)
         elif item.block_type == RAR5_BLOCK_SERVICE:
             if item.filename == "CMT":
                 self._load_comment(fd, item)
@@ -1100,12 +1531,39 @@ class RAR5Parser(CommonParser):
         endarc_hdr = S_LONG.pack(crc32(endarc_hdr)) + endarc_hdr
         return self._open_hack_core(inf, pwd, RAR5_ID + main_hdr, endarc_hdr)
 
+    def _use_native_unpack(self, inf):
+        if rar5_unpack is None or not config.USE_NATIVE_UNPACK or config.FORCE_TOOL:
+            return False
+        if inf.flags & (RAR_FILE_PASSWORD | RAR_FILE_SOLID):
+            return False
+        if inf.file_redir or (inf.file_compress_flags & RAR5_COMPR_VERSION) > 1:
+            return False
+        return inf.file_size <= config.NATIVE_UNPACK_LIMIT
+
+    def _use_native_decrypt(self, inf):
+        if not super()._use_native_decrypt(inf):
+            return False
+        return inf.file_encryption[0] == RAR5_XENC_CIPHER_AES256
+
+    def _open_decrypt(self, inf, pwd):
+        ___algo, flags, kdf_count, salt, iv, checkval = inf.file_encryption
+        if kdf_count > RAR_MAX_KDF_SHIFT:
+            raise BadRarFile("Too large kdf_count")
+        key, hash_key, pwd_check = derive_key(rar5_kdf, pwd, salt, 1 << kdf_count)
+        hdr_check = self._get_check_value(checkval) if checkval else None
+        if hdr_check is not None and pwd_check != hdr_check:
+            raise RarWrongPassword()
+        if (flags & RAR5_XENC_TWEAKED) == 0:
+            hash_key = None
+        return DecryptReader(self, inf, key, iv, hash_key)
+
 
 ##
 ## Utility functions
 ##
 
 # number formats
+S_QUAD = Struct("<Q")
 S_LONG = Struct("<L")
 S_SHORT = Struct("<H")
 S_BYTE = Struct("<B")
@@ -1147,6 +1605,14 @@ def load_le32(buf, pos):
     return S_LONG.unpack_from(buf, pos)[0], end
 
 
+def load_le64(buf, pos):
+    """Load little-endian 64-bit integer"""
+    end = pos + 8
+    if end > len(buf):
+        raise BadRarFile("cannot load le64")
+    return S_QUAD.unpack_from(buf, pos)[0], end
+
+
 def load_bytes(buf, num, pos):
     """Load sequence of bytes"""
     end = pos + num
@@ -1187,6 +1653,18 @@ def load_windowstime(buf, pos):
     return dt, pos
 
 
+def unixtime_ns(secs, nsecs=None):
+    """Convert unix timestamp to nanoseconds"""
+    return secs * 1000000000 + (nsecs or 0)
+
+
+def windowstime_ns(val, nsecs=None):
+    """Convert windows timestamp to nanoseconds since unix epoch"""
+    # unix epoch (1970) in 100ns units from windows epoch (1601)
+    unix_epoch = 116444736000000000
+    return (val - unix_epoch) * 100 + (nsecs or 0)
+
+
 #
 # volume numbering
 #
@@ -1253,13 +1731,15 @@ def _parse_ext_time(h, data, pos):
         flags = S_SHORT.unpack_from(data, pos)[0]
         pos += 2
 
-    mtime, pos = _parse_xtime(flags >> 3 * 4, data, pos, h.mtime)
-    h.ctime, pos = _parse_xtime(flags >> 2 * 4, data, pos)
-    h.atime, pos = _parse_xtime(flags >> 1 * 4, data, pos)
-    h.arctime, pos = _parse_xtime(flags >> 0 * 4, data, pos)
-    if mtime:
-        h.mtime = mtime
-        h.date_time = mtime.timetuple()[:6]
+    # raw values, see Rar3Info._decode_time()
+    mtime, pos = _parse_xtime(flags >> 3 * 4, data, pos, h._date_time)
+    h._ctime, pos = _parse_xtime(flags >> 2 * 4, data, pos)
+    h._atime, pos = _parse_xtime(flags >> 1 * 4, data, pos)
+    h._arctime, pos = _parse_xtime(flags >> 0 * 4, data, pos)
+    if mtime is not None:
+        h._mtime = mtime
+    else:
+        h._mtime = h._date_time << 32
     return pos
 
 
@@ -1268,8 +1748,8 @@ def _parse_xtime(flag, data, pos, basetime=None):
     """
     res = None
     if flag & 8:
-        if not basetime:
-            basetime, pos = load_dostime(data, pos)
+        if basetime is None:
+            basetime, pos = load_le32(data, pos)
 
         # load second fractions of 100ns units
         rem = 0
@@ -1279,10 +1759,9 @@ def _parse_xtime(flag, data, pos, basetime=None):
             rem = (b << 16) | (rem >> 8)
 
         # dostime has room for 30 seconds only, correct if needed
-        if flag & 4 and basetime.second < 59:
-            basetime = basetime.replace(second=basetime.second + 1)
-
-        res = to_nsdatetime(basetime, rem * 100)
+        res = (basetime << 32) | (rem * 100)
+        if flag & 4:
+            res |= 1 << 31
     return res, pos
 
 
@@ -1,6 +1,8 @@
 """RAR file format parser.
 """
 
+from datetime import datetime, timezone
+
 from .bits import (
     RAR5_BLOCK_ENCRYPTION, RAR5_BLOCK_FLAG_SPLIT_AFTER,
     RAR5_BLOCK_FLAG_SPLIT_BEFORE, RAR5_COMPR_SOLID, RAR5_FILE_FLAG_ISDIR,
@@ -10,13 +12,14 @@ from .bits import (
     RAR_FILE_DIRECTORY, RAR_FILE_PASSWORD, RAR_FILE_SPLIT_AFTER,
     RAR_FILE_SPLIT_BEFORE, RAR_MAIN_PASSWORD, RAR_MAIN_SOLID, RAR_OS_UNIX,
 )
+from .utils import parse_dos_time, to_datetime, to_nsdatetime, to_nsecs
 
 __all__ = ("RarInfo", "Rar3Info", "Rar5Info", "Rar5BaseFile",
            "Rar5FileInfo", "Rar5ServiceInfo", "Rar5MainInfo",
            "Rar5EncryptionInfo", "Rar5EndArcInfo")
 
 
-class RarInfo:
+class RarInfo:  # pylint: disable=too-many-instance-attributes
     r"""An entry in rar archive.
 
     Timestamps as :class:`~datetime.datetime` are without timezone in RAR3,
@@ -77,6 +80,13 @@ class RarInfo:
             Optional time field: archival time.  As :class:`~datetime.datetime` object.
             (RAR3-only)
 
+        mtime_ns, ctime_ns, atime_ns
+            Same as :attr:`mtime`, :attr:`ctime`, :attr:`atime`, but as
+            integer nanoseconds since epoch, or None.  In RAR5 archives
+            these are available without creating datetime objects.
+
+            .. versionadded:: 5.0
+
         CRC
             CRC-32 of uncompressed file, unsigned int.
 
@@ -114,24 +124,18 @@ class RarInfo:
                     Symlink points to directory.
     """
 
-    # zipfile-compatible fields
-    filename = None
-    file_size = None
-    compress_size = None
-    date_time = None
-    CRC = None
-    volume = None
-    orig_filename = None
-
-    # optional extended time fields, datetime() objects.
-    mtime = None
-    ctime = None
-    atime = None
+    __slots__ = (
+        "filename", "file_size", "compress_size", "_date_time", "CRC",
+        "volume", "volume_file", "orig_filename",
+        "_mtime", "_ctime", "_atime", "mode", "host_os", "compress_type",
+        "flags", "header_crc", "header_size", "header_offset", "data_offset",
+        "add_size", "_md_class", "_md_expect",
+    )
 
+    # fields that are constant in one format are class attributes
+    # there, and slots only in subclass for other format.
+    type = None
     extract_version = None
-    mode = None
-    host_os = None
-    compress_type = None
 
     # rar3-only fields
     comment = None
@@ -141,9 +145,111 @@ class RarInfo:
     blake2sp_hash = None
     file_redir = None
 
-    # internal fields
-    flags = 0
-    type = None
+    def __init__(self):
+        # zipfile-compatible fields
+        self.filename = None
+        self.file_size = None
+        self.compress_size = None
+        self._date_time = None
+        self.CRC = None
+        self.volume = None
+        self.volume_file = None
+        self.orig_filename = None
+
+        # optional extended time fields, datetime() objects,
+        # or raw int values that are converted on first access.
+        self._mtime = None
+        self._ctime = None
+        self._atime = None
+
+        self.mode = None
+        self.host_os = None
+        self.compress_type = None
+
+        # internal fields
+        self.flags = 0
+        self.header_crc = None
+        self.header_size = None
+        self.header_offset = None
+        self.data_offset = None
+        self.add_size = 0
+        self._md_class = None
+        self._md_expect = None
+
+    @property
+    def date_time(self):
+        val = self._date_time
+        if val.__class__ is not tuple:
+            mtime = self.mtime
+            if mtime is not None:
+                val = mtime.timetuple()[:6]
+            elif val is not None:
+                val = parse_dos_time(val)
+            self._date_time = val
+        return val
+
+    @date_time.setter
+    def date_time(self, val):
+        self._date_time = val
+
+    @property
+    def mtime(self):
+        val = self._mtime
+        if val.__class__ is int:
+            val = self._mtime = self._decode_time(val)
+        return val
+
+    @mtime.setter
+    def mtime(self, val):
+        self._mtime = val
+
+    @property
+    def ctime(self):
+        val = self._ctime
+        if val.__class__ is int:
+            val = self._ctime = self._decode_time(val)
+        return val
+
+    @ctime.setter
+    def ctime(self, val):
+        self._ctime = val
+
+    @property
+    def atime(self):
+        val = self._atime
+        if val.__class__ is int:
+            val = self._atime = self._decode_time(val)
+        return val
+
+    @atime.setter
+    def atime(self, val):
+        self._atime = val
+
+    @property
+    def mtime_ns(self):
+        return self._time_ns(self._mtime)
+
+    @property
+    def ctime_ns(self):
+        return self._time_ns(self._ctime)
+
+    @property
+    def atime_ns(self):
+        return self._time_ns(self._atime)
+
+    def _decode_time(self, raw):
+        """Convert raw timestamp to datetime.
+        """
+        raise NotImplementedError("_decode_time")
+
+    def _time_ns(self, val):
+        """Convert timestamp value to nanoseconds.
+        """
+        if val is None:
+            return None
+        if val.__class__ is int:
+            val = self._decode_time(val)
+        return to_nsecs(val)
 
     # zipfile compat
     def is_dir(self):
@@ -184,25 +290,40 @@ class RarInfo:
 
 class Rar3Info(RarInfo):
     """RAR3 specific fields."""
-    extract_version = 15
-    salt = None
-    add_size = 0
-    header_crc = None
-    header_size = None
-    header_offset = None
-    data_offset = None
-    _md_class = None
-    _md_expect = None
-    _name_size = None
-
-    # make sure some rar5 fields are always present
-    file_redir = None
-    blake2sp_hash = None
-
-    endarc_datacrc = None
-    endarc_volnr = None
-
-    old_sub_type = None
+    __slots__ = ("type", "extract_version", "comment", "_arctime",
+                 "salt", "_name_size", "endarc_datacrc", "endarc_volnr", "old_sub_type")
+
+    def __init__(self):
+        super().__init__()
+        self.type = None
+        self.extract_version = 15
+        self.comment = None
+        self._arctime = None
+        self.salt = None
+        self._name_size = None
+        self.endarc_datacrc = None
+        self.endarc_volnr = None
+        self.old_sub_type = None
+
+    @property
+    def arctime(self):
+        val = self._arctime
+        if val.__class__ is int:
+            val = self._arctime = self._decode_time(val)
+        return val
+
+    @arctime.setter
+    def arctime(self, val):
+        self._arctime = val
+
+    def _decode_time(self, raw):
+        """Raw value is DOS timestamp in upper 32 bits,
+        then flag to add second and nanoseconds.
+        """
+        dt = to_datetime(parse_dos_time(raw >> 32))
+        if raw & (1 << 31) and dt.second < 59:
+            dt = dt.replace(second=dt.second + 1)
+        return to_nsdatetime(dt, raw & 0x7FFFFFFF)
 
     def _must_disable_hack(self):
         if self.type == RAR_BLOCK_FILE:
@@ -240,22 +361,29 @@ class Rar3Info(RarInfo):
 class Rar5Info(RarInfo):
     """Shared fields for RAR5 records.
     """
-    extract_version = 50
-    header_crc = None
-    header_size = None
-    header_offset = None
-    data_offset = None
+    __slots__ = ("block_type", "block_flags", "block_extra_size")
 
-    # type=all
-    block_type = None
-    block_flags = None
-    add_size = 0
-    block_extra_size = 0
+    extract_version = 50
 
     # type=MAIN
     volume_number = None
-    _md_class = None
-    _md_expect = None
+
+    def __init__(self):
+        super().__init__()
+        self.block_type = None
+        self.block_flags = None
+        self.block_extra_size = 0
+
+    def _decode_time(self, raw):
+        """Raw value is nanoseconds since epoch, in UTC.
+        """
+        secs, nsecs = divmod(raw, 1000000000)
+        return to_nsdatetime(datetime.fromtimestamp(secs, timezone.utc), nsecs)
+
+    def _time_ns(self, val):
+        if val.__class__ is int:
+            return val
+        return super()._time_ns(val)
 
     def _must_disable_hack(self):
         return False
@@ -264,14 +392,21 @@ class Rar5Info(RarInfo):
 class Rar5BaseFile(Rar5Info):
     """Shared sturct for file & service record.
     """
+    __slots__ = ("file_flags", "file_encryption", "file_compress_flags",
+                 "file_host_os", "file_owner", "file_version", "blake2sp_hash", "file_redir")
+
     type = -1
-    file_flags = None
-    file_encryption = (0, 0, 0, b"", b"", b"")
-    file_compress_flags = None
-    file_redir = None
-    file_owner = None
-    file_version = None
-    blake2sp_hash = None
+
+    def __init__(self):
+        super().__init__()
+        self.blake2sp_hash = None
+        self.file_redir = None
+        self.file_flags = None
+        self.file_encryption = (0, 0, 0, b"", b"", b"")
+        self.file_compress_flags = None
+        self.file_host_os = None
+        self.file_owner = None
+        self.file_version = None
 
     def _must_disable_hack(self):
         if self.flags & RAR_FILE_PASSWORD:
@@ -288,6 +423,8 @@ class Rar5BaseFile(Rar5Info):
 class Rar5FileInfo(Rar5BaseFile):
     """RAR5 file record.
     """
+    __slots__ = ()
+
     type = RAR_BLOCK_FILE
 
     def is_symlink(self):
@@ -317,15 +454,22 @@ class Rar5FileInfo(Rar5BaseFile):
 class Rar5ServiceInfo(Rar5BaseFile):
     """RAR5 service record.
     """
+    __slots__ = ()
+
     type = RAR_BLOCK_SUB
 
 
 class Rar5MainInfo(Rar5Info):
     """RAR5 archive main record.
     """
+    __slots__ = ("main_flags", "main_volume_number")
+
     type = RAR_BLOCK_MAIN
-    main_flags = None
-    main_volume_number = None
+
+    def __init__(self):
+        super().__init__()
+        self.main_flags = None
+        self.main_volume_number = None
 
     def _must_disable_hack(self):
         if self.main_flags & RAR5_MAIN_FLAG_SOLID:
@@ -336,12 +480,18 @@ class Rar5MainInfo(Rar5Info):
 class Rar5EncryptionInfo(Rar5Info):
     """RAR5 archive header encryption record.
     """
+    __slots__ = ("encryption_algo", "encryption_flags", "encryption_kdf_count",
+                 "encryption_salt", "encryption_check_value")
+
     type = RAR5_BLOCK_ENCRYPTION
-    encryption_algo = None
-    encryption_flags = None
-    encryption_kdf_count = None
-    encryption_salt = None
-    encryption_check_value = None
+
+    def __init__(self):
+        super().__init__()
+        self.encryption_algo = None
+        self.encryption_flags = None
+        self.encryption_kdf_count = None
+        self.encryption_salt = None
+        self.encryption_check_value = None
 
     def needs_password(self):
         return True
@@ -350,5 +500,10 @@ class Rar5EncryptionInfo(Rar5Info):
 class Rar5EndArcInfo(Rar5Info):
     """RAR5 end of archive record.
     """
+    __slots__ = ("endarc_flags",)
+
     type = RAR_BLOCK_ENDARC
-    endarc_flags = None
+
+    def __init__(self):
+        super().__init__()
+        self.endarc_flags = None
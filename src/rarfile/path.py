@@ -0,0 +1,238 @@
+"""Pathlib-like access to archive members.
+"""
+
+import io
+import os
+import posixpath
+import stat
+
+from .archive import RarFile
+from .bits import DOS_MODE_READONLY, RAR_OS_MSDOS, RAR_OS_UNIX, RAR_OS_WIN32
+from .errors import NoRarEntry
+
+__all__ = ("Path",)
+
+# marker for node that is not looked up yet
+_UNRESOLVED = object()
+
+_NSECS = 1000000000
+
+
+class Path:
+    """Read-only :class:`pathlib.Path`-like access to archive,
+    similar to :class:`zipfile.Path`.
+
+    Parameters:
+
+        root
+            :class:`RarFile` instance or archive filename.
+        at
+            Path inside archive, "/" is separator.  Default is top directory.
+
+    Directory tree is built once per :class:`RarFile` and shared by all
+    Path objects derived from it.  Each Path remembers its tree node,
+    so :meth:`joinpath` and :meth:`iterdir` look up only new components.
+    Members are read via :meth:`RarFile.open`, so open volume files are reused.
+
+    .. versionadded:: 5.0
+    """
+
+    def __init__(self, root, at=""):
+        if not isinstance(root, RarFile):
+            root = RarFile(root)
+        self.root = root
+        self.at = "/".join(p for p in at.split("/") if p)
+        self._base = None
+        self._rel = self.at
+        self._node = _UNRESOLVED
+
+    def _make(self, at, base, rel, node=_UNRESOLVED):
+        res = self.__class__.__new__(self.__class__)
+        res.root = self.root
+        res.at = at
+        res._base = base
+        res._rel = rel
+        res._node = node
+        return res
+
+    def _lookup(self):
+        """Return tree node or None if path does not exist.
+        """
+        node = self._node
+        if node is _UNRESOLVED:
+            tree = self.root._get_tree()
+            if self._base is None:
+                node = tree.find(self._rel)
+            else:
+                start = self._base._lookup()
+                node = None if start is None else tree.find(self._rel, start)
+            self._node = node
+        return node
+
+    def _get_node(self):
+        node = self._lookup()
+        if node is None:
+            raise NoRarEntry("No such file: %s" % self.at)
+        return node
+
+    def __str__(self):
+        return posixpath.join(self.root.filename or "", self.at)
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self.root.filename, self.at)
+
+    def __eq__(self, other):
+        if not isinstance(other, Path):
+            return NotImplemented
+        return self.root is other.root and self.at == other.at
+
+    def __hash__(self):
+        return hash((id(self.root), self.at))
+
+    def __truediv__(self, other):
+        return self.joinpath(other)
+
+    @property
+    def name(self):
+        """Final path component.
+        """
+        return posixpath.basename(self.at)
+
+    @property
+    def suffix(self):
+        """File extension of final component.
+        """
+        name = self.name
+        pos = name.rfind(".")
+        if 0 < pos < len(name) - 1:
+            return name[pos:]
+        return ""
+
+    @property
+    def stem(self):
+        """Final path component without suffix.
+        """
+        name, suffix = self.name, self.suffix
+        return name[:len(name) - len(suffix)]
+
+    @property
+    def parent(self):
+        """Path of containing directory.
+        """
+        if not self.at:
+            return self
+        node = self._node
+        if node is not _UNRESOLVED and node is not None:
+            node = node.parent
+        else:
+            node = _UNRESOLVED
+        at = posixpath.dirname(self.at)
+        return self._make(at, None, at, node)
+
+    def joinpath(self, *other):
+        """Return new Path with components appended.
+        """
+        rel = "/".join(p for name in other for p in str(name).split("/") if p)
+        if not rel:
+            return self
+        at = self.at + "/" + rel if self.at else rel
+        return self._make(at, self, rel)
+
+    def exists(self):
+        """Returns True if path is in archive.
+        """
+        return self._lookup() is not None
+
+    def is_dir(self):
+        """Returns True if path is directory.
+
+        Includes directories that do not have own entry in archive.
+        """
+        node = self._lookup()
+        return node is not None and node.children is not None
+
+    def is_file(self):
+        """Returns True if path is not directory.
+        """
+        node = self._lookup()
+        return node is not None and node.children is None
+
+    def iterdir(self):
+        """Iterate over Path objects for directory contents.
+        """
+        node = self._get_node()
+        if node.children is None:
+            raise NoRarEntry("Not a directory: %s" % self.at)
+        prefix = self.at + "/" if self.at else ""
+        for name, child in node.children.items():
+            yield self._make(prefix + name, None, prefix + name, child)
+
+    def open(self, mode="r", *args, pwd=None, **kwargs):  # pylint: disable=keyword-arg-before-vararg
+        """Open member for reading.
+
+        Mode "r" returns :class:`io.TextIOWrapper`, extra arguments
+        are passed to it.  Mode "rb" returns :class:`RarExtFile`.
+        """
+        if mode not in ("r", "rb"):
+            raise NotImplementedError("Path.open() supports only mode=r and mode=rb")
+        node = self._get_node()
+        if node.children is not None:
+            raise io.UnsupportedOperation("Directory does not have any data: " + self.at)
+        f = self.root.open(node.info, "r", pwd)
+        if mode == "rb":
+            if args or kwargs:
+                raise ValueError("encoding args invalid for binary operation")
+            return f
+        return io.TextIOWrapper(io.BufferedReader(f), *args, **kwargs)
+
+    def read_bytes(self, pwd=None):
+        """Return uncompressed data.
+        """
+        with self.open("rb", pwd=pwd) as f:
+            return f.read()
+
+    def read_text(self, *args, pwd=None, **kwargs):
+        """Return data decoded as text.
+        """
+        with self.open("r", *args, pwd=pwd, **kwargs) as f:
+            return f.read()
+
+    def stat(self):
+        """Return :class:`os.stat_result` for member.
+
+        Mode is built from entry attributes like on extract,
+        directories that do not have own entry in archive get
+        default mode and zero timestamps.
+        """
+        node = self._get_node()
+        inf = node.info
+        if node.children is not None:
+            ftype, perm = stat.S_IFDIR, 0o755
+        elif inf.is_symlink():
+            ftype, perm = stat.S_IFLNK, 0o777
+        else:
+            ftype, perm = stat.S_IFREG, 0o644
+
+        size = 0
+        times = (0, 0, 0)
+        if inf is not None:
+            if inf.host_os == RAR_OS_UNIX:
+                perm = inf.mode & 0o7777
+            elif inf.host_os in (RAR_OS_WIN32, RAR_OS_MSDOS):
+                if inf.mode & DOS_MODE_READONLY:
+                    perm &= ~0o222
+            if node.children is None:
+                size = inf.file_size
+            mtime_ns = inf.mtime_ns or 0
+            atime_ns = inf.atime_ns
+            ctime_ns = inf.ctime_ns
+            times = (mtime_ns if atime_ns is None else atime_ns,
+                     mtime_ns,
+                     mtime_ns if ctime_ns is None else ctime_ns)
+
+        return os.stat_result(
+            (ftype | perm, 0, 0, 1, 0, 0, size)
+            + tuple(t // _NSECS for t in times)
+            + tuple(t / _NSECS for t in times)
+            + times
+        )
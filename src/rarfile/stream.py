@@ -1,20 +1,35 @@
 """File-like objests for reading data.
 """
 
+import errno
 import io
+import mmap
 import os
+from functools import partial
+from tempfile import TemporaryFile
 
 from . import config
 from .backend import check_returncode, custom_popen, empty_read, tool_setup
-from .bits import RAR_BLOCK_MAIN, RAR_BLOCK_MARK, RAR_FILE_SPLIT_AFTER
-from .crypto import NoHashContext
+from .bits import (
+    RAR5_COMPR_VERSION, RAR_BLOCK_MAIN, RAR_BLOCK_MARK, RAR_FILE_SPLIT_AFTER,
+)
+from .crypto import (
+    AES_CBC_Decrypt, Blake2SP, CRC32Context,
+    HashThread, NoHashContext, TweakedHash,
+)
 from .errors import BadRarFile
-from .utils import XFile
+from .utils import is_filelike
 
 __all__ = (
-    'RarExtFile', 'DirectReader', 'PipeReader',
+    'RarExtFile', 'DirectReader', 'MmapReader', 'DecryptReader', 'PipeReader', 'InProcessReader',
 )
 
+# load C version
+try:
+    from ._crypto import rar5_unpack
+except ImportError:
+    rar5_unpack = None
+
 
 class RarExtFile(io.RawIOBase):
     """Base class for file-like object that :meth:`RarFile.open` returns.
@@ -33,6 +48,7 @@ class RarExtFile(io.RawIOBase):
     _remain = 0
     _returncode = 0
     _md_context = None
+    _md_expect = None
     _seeking = False
 
     def _open_extfile(self, parser, inf):
@@ -46,10 +62,21 @@ class RarExtFile(io.RawIOBase):
             md_class = NoHashContext
         else:
             md_class = self._inf._md_class or NoHashContext
-        self._md_context = md_class()
+        self._set_md_context(md_class, config.HASH_QUEUE_SIZE)
+        self._md_expect = self._inf._md_expect
         self._fd = None
         self._remain = self._inf.file_size
 
+    def _set_md_context(self, md_class, queue_size=0):
+        """Replace hash context, stop old worker thread.
+        """
+        if isinstance(self._md_context, HashThread):
+            self._md_context.close()
+        if queue_size > 0 and md_class is not NoHashContext:
+            self._md_context = HashThread(md_class(), queue_size)
+        else:
+            self._md_context = md_class()
+
     def read(self, n=-1):
         """Read all or specified amount of data from archive entry."""
 
@@ -87,7 +114,7 @@ class RarExtFile(io.RawIOBase):
     def _check(self):
         """Check final CRC."""
         final = self._md_context.digest()
-        exp = self._inf._md_expect
+        exp = self._md_expect
         if exp is None:
             return
         if final is None:
@@ -112,6 +139,8 @@ class RarExtFile(io.RawIOBase):
         if self._fd:
             self._fd.close()
             self._fd = None
+        if isinstance(self._md_context, HashThread):
+            self._md_context.close()
 
     def __del__(self):
         """Hook delete to make sure tempfile is removed."""
@@ -139,7 +168,7 @@ class RarExtFile(io.RawIOBase):
 
         # disable crc check when seeking
         if not self._seeking:
-            self._md_context = NoHashContext()
+            self._set_md_context(NoHashContext)
             self._seeking = True
 
         fsize = self._inf.file_size
@@ -164,11 +193,14 @@ class RarExtFile(io.RawIOBase):
         if new_ofs >= cur_ofs:
             self._skip(new_ofs - cur_ofs)
         else:
-            # reopen and seek
-            self._open_extfile(self._parser, self._inf)
-            self._skip(new_ofs)
+            self._seek_back(new_ofs)
         return self.tell()
 
+    def _seek_back(self, ofs):
+        """Reopen and seek forward from start."""
+        self._open_extfile(self._parser, self._inf)
+        self._skip(ofs)
+
     def _skip(self, cnt):
         """Read and discard data"""
         empty_read(self, cnt, config.BSIZE)
@@ -197,14 +229,96 @@ class RarExtFile(io.RawIOBase):
         return self.read()
 
 
+class SpillFile:
+    """Keeps part of decompressed stream for cheap backward seeks.
+
+    Policy "head" keeps first `limit` bytes of stream,
+    "tail" keeps last `limit` bytes read from pipe.
+    """
+
+    def __init__(self, limit, policy):
+        self.start = self.end = 0
+        self._limit = limit
+        self._keep_head = policy == "head"
+        if hasattr(os, "memfd_create"):
+            self._fd = os.fdopen(os.memfd_create("rarfile-spill"), "w+b")
+        else:
+            self._fd = TemporaryFile(dir=config.HACK_TMP_DIR)
+
+    def covers(self, ofs):
+        """Is data at offset available?"""
+        return self.start <= ofs < self.end
+
+    def append(self, ofs, data):
+        """Store data that was read from stream offset."""
+        if ofs < self.end:
+            data = data[self.end - ofs:]
+            ofs = self.end
+        if not data:
+            return
+        if ofs > self.end:
+            # gap in data
+            if self._keep_head:
+                return
+            self.start = self.end = ofs
+        if self._keep_head:
+            data = data[:self._limit - self.end]
+        elif len(data) > self._limit:
+            ofs += len(data) - self._limit
+            data = data[-self._limit:]
+            self.start = self.end = ofs
+        self._write(ofs, data)
+        self.end = ofs + len(data)
+        self.start = max(self.start, self.end - self._limit)
+
+    def read(self, ofs, cnt):
+        """Read data from offset, returns less if spill ends."""
+        cnt = min(cnt, self.end - ofs)
+        buf = []
+        while cnt > 0:
+            pos = ofs % self._limit
+            self._fd.seek(pos)
+            data = self._fd.read(min(cnt, self._limit - pos))
+            buf.append(data)
+            ofs += len(data)
+            cnt -= len(data)
+        return b"".join(buf)
+
+    def _write(self, ofs, data):
+        while data:
+            pos = ofs % self._limit
+            n = min(len(data), self._limit - pos)
+            self._fd.seek(pos)
+            self._fd.write(data[:n])
+            data = data[n:]
+            ofs += n
+
+    def close(self):
+        """Drop spilled data."""
+        self._fd.close()
+
+
 class PipeReader(RarExtFile):
-    """Read data from pipe, handle tempfile cleanup."""
+    """Read data from pipe, handle tempfile cleanup.
+
+    Tempfile is either filename or open memfd that is passed to tool.
+
+    If :data:`config.SPILL_SIZE_LIMIT` is set, data read from pipe
+    is kept in :class:`SpillFile` and seeking is done lazily on next read.
+    """
 
     def __init__(self, parser, inf, cmd, tempfile=None):
         super().__init__()
         self._cmd = cmd
         self._proc = None
         self._tempfile = tempfile
+        self._pass_fds = ()
+        if isinstance(tempfile, io.IOBase):
+            self._pass_fds = (tempfile.fileno(),)
+        self._spill = None
+        self._pipe_pos = 0
+        if config.SPILL_SIZE_LIMIT > 0:
+            self._spill = SpillFile(config.SPILL_SIZE_LIMIT, config.SPILL_POLICY)
         self._open_extfile(parser, inf)
 
     def _close_proc(self):
@@ -220,15 +334,55 @@ class PipeReader(RarExtFile):
     def _open_extfile(self, parser, inf):
         super()._open_extfile(parser, inf)
 
-        # stop old process
-        self._close_proc()
+        self._restart()
 
-        # launch new process
+    def _restart(self):
+        """Launch new process, old one is stopped."""
+        self._close_proc()
         self._returncode = 0
-        self._proc = custom_popen(self._cmd)
+        self._proc = custom_popen(self._cmd, self._pass_fds)
         self._fd = self._proc.stdout
+        self._pipe_pos = 0
+
+    def _seek_back(self, ofs):
+        """Seek lazily if spill is used."""
+        if self._spill is None:
+            super()._seek_back(ofs)
+        else:
+            self._remain = self._inf.file_size - ofs
+
+    def _skip(self, cnt):
+        """Seek lazily if spill is used."""
+        if self._spill is None:
+            super()._skip(cnt)
+        else:
+            self._remain -= cnt
 
     def _read(self, cnt):
+        """Read from spill or pipe."""
+        if self._spill is None:
+            return self._read_pipe(cnt)
+
+        pos = self.tell()
+        if self._spill.covers(pos):
+            return self._spill.read(pos, cnt)
+
+        # spill does not have it, restart if pipe is past it
+        if pos < self._pipe_pos:
+            self._restart()
+        while self._pipe_pos < pos:
+            if not self._read_spill(min(config.BSIZE, pos - self._pipe_pos)):
+                return b""
+        return self._read_spill(cnt)
+
+    def _read_spill(self, cnt):
+        """Read from pipe, store in spill."""
+        data = self._read_pipe(cnt)
+        self._spill.append(self._pipe_pos, data)
+        self._pipe_pos += len(data)
+        return data
+
+    def _read_pipe(self, cnt):
         """Read from pipe."""
 
         # normal read is usually enough
@@ -253,15 +407,26 @@ class PipeReader(RarExtFile):
         self._close_proc()
         super().close()
 
-        if self._tempfile:
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+        if isinstance(self._tempfile, io.IOBase):
+            self._tempfile.close()
+        elif self._tempfile:
             try:
                 os.unlink(self._tempfile)
             except OSError:
                 pass
-            self._tempfile = None
+        self._tempfile = None
 
     def readinto(self, buf):
         """Zero-copy read directly into buffer."""
+        if self._spill is not None:
+            data = self.read(len(buf))
+            buf[:len(data)] = data
+            return len(data)
+
         cnt = len(buf)
         if cnt > self._remain:
             cnt = self._remain
@@ -292,7 +457,7 @@ class DirectReader(RarExtFile):
         super()._open_extfile(parser, inf)
 
         self._volfile = self._inf.volume_file
-        self._fd = XFile(self._volfile, 0)
+        self._fd = self._parser._open_volume(self._volfile)
         self._fd.seek(self._inf.header_offset, 0)
         self._cur = self._parser._parse_header(self._fd)
         self._cur_avail = self._cur.add_size
@@ -350,6 +515,47 @@ class DirectReader(RarExtFile):
             return buf[0]
         return b"".join(buf)
 
+    def _copy_to_fd(self, dstfd):
+        """Copy rest of data to file descriptor with kernel-side copy.
+
+        Data is hashed from mapped source afterwards,
+        returns False if kernel copy is not usable.
+        """
+        if not hasattr(os, "copy_file_range") or is_filelike(self._inf.volume_file):
+            return False
+
+        check = not isinstance(self._md_context, NoHashContext)
+        while True:
+            # next vol needed?
+            if self._cur_avail == 0:
+                if not self._open_next():
+                    break
+
+            srcfd = self._fd.fileno()
+            ofs = self._cur.data_offset + self._cur.add_size - self._cur_avail
+            got = _copy_range(srcfd, dstfd, ofs, self._cur_avail)
+            if not got:
+                break
+            if check:
+                self._hash_range(srcfd, ofs, got)
+            self._cur_avail -= got
+            self._remain -= got
+        self._check()
+        return True
+
+    def _hash_range(self, fd, ofs, cnt):
+        """Hash file data without reading it into Python objects."""
+        start = ofs - ofs % mmap.ALLOCATIONGRANULARITY
+        with mmap.mmap(fd, ofs - start + cnt, access=mmap.ACCESS_READ, offset=start) as mm:
+            view = memoryview(mm)
+            try:
+                pos = ofs - start
+                while pos < len(view):
+                    self._md_context.update(view[pos: pos + config.BSIZE * 16])
+                    pos += config.BSIZE * 16
+            finally:
+                view.release()
+
     def _open_next(self):
         """Proceed to next volume."""
 
@@ -363,7 +569,7 @@ class DirectReader(RarExtFile):
 
         # open next part
         self._volfile = self._parser._next_volname(self._volfile)
-        fd = open(self._volfile, "rb", 0)
+        fd = self._parser._open_volume(self._volfile)
         self._fd = fd
         sig = fd.read(len(self._parser._expect_sig))
         if sig != self._parser._expect_sig:
@@ -408,3 +614,314 @@ class DirectReader(RarExtFile):
             self._remain -= res
             got += res
         return got
+
+
+class DecryptReader(DirectReader):
+    """Decrypt uncompressed data directly from archive.
+
+    Raw data is decrypted with AES-CBC in :data:`config.BSIZE` blocks.
+    Seeking forward restarts the cipher from preceding ciphertext
+    block, so it does not need to decrypt skipped data.
+    """
+    _key = None
+    _iv = None
+    _hash_key = None
+    _ciph = None
+    _dec = b""
+    _dec_pos = 0
+    _raw_pos = 0
+
+    def __init__(self, parser, inf, key, iv, hash_key=None):
+        self._key = key
+        self._iv = iv
+        self._hash_key = hash_key
+        super().__init__(parser, inf)
+
+    def _open_extfile(self, parser, inf):
+        super()._open_extfile(parser, inf)
+
+        self._ciph = AES_CBC_Decrypt(self._key, self._iv)
+        self._dec = b""
+        self._dec_pos = 0
+        self._raw_pos = 0
+
+        # tweaked checksums can be checked only with hash key
+        if self._hash_key and not self._seeking:
+            if self._inf.blake2sp_hash is not None:
+                md_class, exp = Blake2SP, self._inf.blake2sp_hash
+            else:
+                md_class, exp = CRC32Context, self._inf.CRC
+            if exp is not None:
+                self._set_md_context(partial(TweakedHash, md_class, self._hash_key), config.HASH_QUEUE_SIZE)
+                self._md_expect = exp
+
+    def _read(self, cnt):
+        """Return decrypted data, padding stays in buffer."""
+        avail = len(self._dec) - self._dec_pos
+        if avail >= cnt:
+            data = self._dec[self._dec_pos: self._dec_pos + cnt]
+            self._dec_pos += cnt
+            return data
+
+        buf = [self._dec[self._dec_pos:]] if avail else []
+        need = cnt - avail
+        raw = super()._read(max(need + (-need & 15), config.BSIZE))
+        usable = len(raw) & ~15
+        if usable < len(raw):
+            raw = raw[:usable]
+        self._raw_pos += usable
+        dec = self._ciph.decrypt(raw)
+        buf.append(dec[:need])
+        self._dec = dec
+        self._dec_pos = min(need, len(dec))
+        if len(buf) == 1:
+            return buf[0]
+        return b"".join(buf)
+
+    def _skip_raw(self, cnt):
+        """Move raw position, :meth:`_read` seeks to it."""
+        while cnt > 0:
+            if self._cur_avail == 0:
+                if not self._open_next():
+                    break
+            n = min(cnt, self._cur_avail)
+            self._cur_avail -= n
+            self._raw_pos += n
+            cnt -= n
+
+    def _skip(self, cnt):
+        """Seek forward without decrypting skipped blocks."""
+        target = self._raw_pos - len(self._dec) + self._dec_pos + cnt
+        self._remain -= cnt
+        if target <= self._raw_pos:
+            self._dec_pos += cnt
+            return
+        blk = target & ~15
+        if blk > self._raw_pos:
+            # previous ciphertext block is IV for next one
+            self._skip_raw(blk - 16 - self._raw_pos)
+            iv = super()._read(16)
+            if len(iv) != 16:
+                return
+            self._raw_pos = blk
+            self._ciph = AES_CBC_Decrypt(self._key, iv)
+        self._dec = b""
+        self._dec_pos = 0
+        if target > self._raw_pos:
+            self._read(target - self._raw_pos)
+
+    def _copy_to_fd(self, dstfd):
+        """Data needs decrypting, kernel copy is not usable."""
+        return False
+
+    def readinto(self, buf):
+        """Decrypt into buffer."""
+        vbuf = memoryview(buf)
+        cnt = min(len(vbuf), self._remain)
+        if cnt <= 0:
+            return 0
+        data = self._read(cnt)
+        got = len(data)
+        vbuf[:got] = data
+        self._md_context.update(data)
+        self._remain -= got
+        return got
+
+
+def _copy_range(srcfd, dstfd, ofs, cnt):
+    """Kernel-side copy, fall back to sendfile() between filesystems."""
+    try:
+        return os.copy_file_range(srcfd, dstfd, cnt, ofs)
+    except OSError as ex:
+        if ex.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise
+    return os.sendfile(dstfd, srcfd, ofs, cnt)
+
+
+class MmapReader(DirectReader):
+    """Read uncompressed data from memory-mapped archive volumes.
+
+    :meth:`read` returns :class:`memoryview` slice of the mapping
+    when data is inside single volume, :meth:`readinto` copies
+    directly from it.
+    """
+    _mmap = None
+    _seg = None
+
+    def _open_extfile(self, parser, inf):
+        super()._open_extfile(parser, inf)
+        self._map_volume()
+
+    def _open_next(self):
+        """Proceed to next volume."""
+        if not super()._open_next():
+            return False
+        self._map_volume()
+        return True
+
+    def _map_volume(self):
+        """Map current volume, take data segment view."""
+        self._unmap()
+        self._mmap = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self._cur.data_offset
+        self._seg = memoryview(self._mmap)[start: start + self._cur.add_size]
+        if len(self._seg) != self._cur.add_size:
+            raise BadRarFile("Truncated volume: " + self._volfile)
+
+    def _unmap(self):
+        if self._seg is not None:
+            self._seg.release()
+            self._seg = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # slices still in use, unmapped when released
+                pass
+            self._mmap = None
+
+    def read(self, n=-1):
+        """Read data, without copy if it is inside current volume."""
+        if n is None or n < 0 or n > self._remain:
+            n = self._remain
+        if n == 0 or n > self._cur_avail:
+            return super().read(n)
+
+        pos = len(self._seg) - self._cur_avail
+        data = self._seg[pos: pos + n]
+        self._md_context.update(data)
+        self._cur_avail -= n
+        self._remain -= n
+        if self._remain == 0:
+            self._check()
+        return data
+
+    def _skip(self, cnt):
+        """Move position without touching data."""
+        while cnt > 0:
+            if self._cur_avail == 0:
+                if not self._open_next():
+                    break
+            n = min(cnt, self._cur_avail)
+            self._cur_avail -= n
+            self._remain -= n
+            cnt -= n
+
+    def _read(self, cnt):
+        """Return slices of mapped volumes."""
+        buf = []
+        while cnt > 0:
+            if self._cur_avail == 0:
+                if not self._open_next():
+                    break
+            pos = len(self._seg) - self._cur_avail
+            n = min(cnt, self._cur_avail)
+            buf.append(self._seg[pos: pos + n])
+            self._cur_avail -= n
+            cnt -= n
+
+        if len(buf) == 1:
+            return buf[0]
+        return b"".join(buf)
+
+    def close(self):
+        """Close open resources."""
+        super().close()
+        self._unmap()
+
+    def readinto(self, buf):
+        """Zero-copy read directly into buffer."""
+        got = 0
+        vbuf = memoryview(buf)
+        while got < len(buf):
+            if self._cur_avail == 0:
+                if not self._open_next():
+                    break
+            cnt = min(len(buf) - got, self._cur_avail)
+            pos = len(self._seg) - self._cur_avail
+            vbuf[got: got + cnt] = self._seg[pos: pos + cnt]
+            self._md_context.update(vbuf[got: got + cnt])
+            self._cur_avail -= cnt
+            self._remain -= cnt
+            got += cnt
+        return got
+
+
+class PackedReader(DirectReader):
+    """Read compressed data of entry.
+
+    Hash is checked on unpacked data, so it is not calculated here.
+    """
+
+    def _set_md_context(self, md_class, queue_size=0):
+        self._md_context = NoHashContext()
+
+
+class InProcessReader(RarExtFile):
+    """Decompress RAR5 data in-process with native decoder.
+
+    Whole file is unpacked on open, so seeking is cheap in both
+    directions.  Files larger than ``config.NATIVE_UNPACK_MEM_LIMIT``
+    are unpacked into temp file instead of memory.
+    """
+    _data = None
+
+    def __init__(self, parser, inf):
+        super().__init__()
+        self._open_extfile(parser, inf)
+
+    def _open_extfile(self, parser, inf):
+        # unpacked data is kept over reopen
+        self._fd = None
+        super()._open_extfile(parser, inf)
+
+        if self._data is None:
+            self._data = self._unpack()
+        self._data.seek(0)
+        self._fd = self._data
+
+    def _unpack(self):
+        """Load compressed data and decompress it.
+
+        Returns file object with unpacked data.
+        """
+        with PackedReader(self._parser, self._inf) as src:
+            packed = src._read(self._inf.compress_size)
+        extra_dist = (self._inf.file_compress_flags & RAR5_COMPR_VERSION) == 1
+        try:
+            if self._inf.file_size <= config.NATIVE_UNPACK_MEM_LIMIT or config.WIN32:
+                return io.BytesIO(rar5_unpack(packed, self._inf.file_size, extra_dist))
+            tmpf = TemporaryFile(dir=config.HACK_TMP_DIR)
+            try:
+                rar5_unpack(packed, self._inf.file_size, extra_dist, tmpf.fileno())
+            except BaseException:
+                tmpf.close()
+                raise
+            return tmpf
+        except ValueError as ex:
+            raise BadRarFile("Corrupt compressed data: " + self._inf.filename) from ex
+
+    def _read(self, cnt):
+        """Read from unpacked data."""
+        return self._fd.read(cnt)
+
+    def _skip(self, cnt):
+        """Seek in unpacked data."""
+        self._fd.seek(cnt, 1)
+        self._remain -= cnt
+
+    def close(self):
+        """Close open resources."""
+        super().close()
+        self._data = None
+
+    def readinto(self, buf):
+        """Zero-copy read directly into buffer."""
+        cnt = len(buf)
+        if cnt > self._remain:
+            cnt = self._remain
+        vbuf = memoryview(buf)
+        res = self._fd.readinto(vbuf[:cnt])
+        self._md_context.update(vbuf[:res])
+        self._remain -= res
+        return res
@@ -0,0 +1,172 @@
+"""Directory tree over archive entries.
+"""
+
+import re
+from fnmatch import fnmatchcase
+
+from .errors import NoRarEntry
+
+__all__ = ()
+
+_magic_check = re.compile("[*?[]")
+
+
+class TreeNode:
+    """Single path component.
+
+    Directories have ``children`` dict, files have None there.
+    ``info`` is None for directories that do not have own entry
+    in archive, only files under them.
+    """
+    __slots__ = ("name", "parent", "info", "children")
+
+    def __init__(self, name, parent, info=None, children=None):
+        self.name = name
+        self.parent = parent
+        self.info = info
+        self.children = children
+
+    def is_dir(self):
+        """Returns True if node is directory."""
+        return self.children is not None
+
+    @property
+    def path(self):
+        """Full path in archive, without trailing "/".
+        """
+        parts = []
+        node = self
+        while node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        return "/".join(reversed(parts))
+
+    @property
+    def member(self):
+        """Name as in :meth:`RarFile.namelist`, directories have "/" suffix.
+        """
+        if self.children is not None and self.parent is not None:
+            return self.path + "/"
+        return self.path
+
+
+class TreeIndex:
+    """Hierarchical index of archive entries.
+    """
+
+    def __init__(self, infos=()):
+        self.root = TreeNode("", None, children={})
+        for inf in infos:
+            self.add(inf)
+
+    def add(self, inf):
+        """Insert entry, creating parent directories as needed.
+        """
+        parts = [p for p in inf.filename.split("/") if p]
+        if not parts:
+            return
+        node = self.root
+        for name in parts[:-1]:
+            node = self._subdir(node, name)
+        name = parts[-1]
+        child = node.children.get(name)
+        if child is None:
+            child = node.children[name] = TreeNode(name, node)
+        if inf.is_dir() and child.children is None:
+            child.children = {}
+        child.info = inf
+
+    def _subdir(self, node, name):
+        child = node.children.get(name)
+        if child is None:
+            child = node.children[name] = TreeNode(name, node, children={})
+        elif child.children is None:
+            # file entry used as directory, keep both
+            child.children = {}
+        return child
+
+    def find(self, path, start=None):
+        """Return node for path relative to start node, or None.
+        """
+        node = self.root if start is None else start
+        for name in path.split("/"):
+            if not name:
+                continue
+            if node.children is None:
+                return None
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    def lookup(self, path):
+        """Return node for path or raise NoRarEntry.
+        """
+        node = self.find(path)
+        if node is None:
+            raise NoRarEntry("No such file: %s" % path)
+        return node
+
+    def lookup_dir(self, path):
+        """Return directory node for path.
+        """
+        node = self.lookup(path)
+        if node.children is None:
+            raise NoRarEntry("Not a directory: %s" % path)
+        return node
+
+    def walk(self, top=""):
+        """Yield (dirpath, dirnames, filenames) tuples, top-down.
+        """
+        stack = [self.lookup_dir(top)]
+        while stack:
+            node = stack.pop()
+            dirs = []
+            files = []
+            for name, child in node.children.items():
+                if child.children is not None:
+                    dirs.append(name)
+                else:
+                    files.append(name)
+            yield node.path, dirs, files
+            stack.extend(node.children[name] for name in reversed(dirs))
+
+    def glob(self, pattern):
+        """Yield nodes matching pattern.
+
+        Pattern components are matched with :func:`fnmatch.fnmatchcase`,
+        ``**`` matches any number of directories.
+        """
+        parts = []
+        for part in pattern.split("/"):
+            if not part or (part == "**" and parts and parts[-1] == "**"):
+                continue
+            parts.append(part)
+        # several ``**`` can reach same node by different ways
+        seen = set()
+        for node in self._glob(self.root, parts):
+            if node.parent is not None and id(node) not in seen:
+                seen.add(id(node))
+                yield node
+
+    def _glob(self, node, parts):
+        if not parts:
+            yield node
+            return
+        children = node.children
+        if children is None:
+            return
+        part, rest = parts[0], parts[1:]
+        if part == "**":
+            yield from self._glob(node, rest)
+            for child in children.values():
+                if child.children is not None:
+                    yield from self._glob(child, parts)
+        elif _magic_check.search(part):
+            for name, child in children.items():
+                if fnmatchcase(name, part):
+                    yield from self._glob(child, rest)
+        else:
+            child = children.get(part)
+            if child is not None:
+                yield from self._glob(child, rest)
@@ -4,14 +4,17 @@
 import os
 import re
 import shutil
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 from tempfile import mkstemp
 
 from . import config
 
-__all__ = ("is_filelike", "XFile", "UnicodeFilename", "nsdatetime", "to_nsdatetime", "to_nsecs", "to_datetime",
-           "parse_dos_time", "sanitize_filename", "membuf_tempfile")
+__all__ = ("is_filelike", "XFile", "HeaderReader", "VolumeFiles", "PreadFile", "LockedFile",
+           "UnicodeFilename", "nsdatetime", "to_nsdatetime", "to_nsecs", "to_datetime",
+           "parse_dos_time", "sanitize_filename", "membuf_tempfile", "memfd_tempfile", "memfd_path")
 
 
 def is_filelike(obj):
@@ -67,6 +70,10 @@ class XFile:
         """Read into buffer."""
         return self._fd.readinto(buf)
 
+    def fileno(self):
+        """Return file descriptor."""
+        return self._fd.fileno()
+
     def close(self):
         """Close file object."""
         if self._need_close:
@@ -79,6 +86,260 @@ class XFile:
         self.close()
 
 
+class HeaderReader(XFile):
+    """Read-ahead reader for header scanning.
+
+    Reads are served from buffered window, seeks are lazy and
+    keep the window if target is inside it, so headers of small
+    adjacent entries come from single read.  After seeking past
+    the window only small probe is read, as big data areas
+    tend to follow each other.
+    """
+    __slots__ = ("_buf", "_buf_ofs", "_pos", "_probe")
+
+    probe_size = 4 * 1024
+
+    def __init__(self, xfile):
+        super().__init__(xfile, 0)
+        self._buf = b""
+        self._buf_ofs = self._pos = 0
+        self._probe = False
+
+    def read(self, n=None):
+        """Read from window, refill if needed."""
+        if n is None or n < 0:
+            self._fd.seek(self._pos)
+            data = self._fd.read()
+            self._buf = b""
+            self._pos += len(data)
+            return data
+
+        start = self._pos - self._buf_ofs
+        if start < 0 or start + n > len(self._buf):
+            self._fill(n)
+            start = 0
+        data = self._buf[start: start + n]
+        self._pos += len(data)
+        return data
+
+    def _fill(self, n):
+        """Load new window from current position, keep overlapping part."""
+        start = self._pos - self._buf_ofs
+        buf = []
+        got = 0
+        if 0 <= start < len(self._buf):
+            buf.append(self._buf[start:])
+            got = len(buf[0])
+
+        want = max(n, self.probe_size if self._probe else config.HEADER_READAHEAD)
+        self._fd.seek(self._pos + got)
+        while got < n:
+            data = self._fd.read(want - got)
+            if not data:
+                break
+            buf.append(data)
+            got += len(data)
+
+        self._buf = b"".join(buf)
+        self._buf_ofs = self._pos
+        self._probe = False
+
+    def tell(self):
+        """Return logical file pos."""
+        return self._pos
+
+    def seek(self, ofs, whence=0):
+        """Move file pos, actual seek happens on next refill."""
+        if whence == 1:
+            ofs += self._pos
+        elif whence == 2:
+            ofs += self._fd.seek(0, 2)
+        if ofs > self._buf_ofs + len(self._buf):
+            self._probe = True
+        self._pos = ofs
+        return ofs
+
+    def readinto(self, buf):
+        """Read into buffer."""
+        data = self.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+
+class VolumeFiles:
+    """Volume names and pool of read-only descriptors for them.
+
+    Descriptors are reference-counted and shared between readers,
+    unused ones are kept open up to :data:`config.MAX_OPEN_VOLUMES`
+    and closed in LRU order.
+
+    Also provides lock for reading from shared file object.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.lock = threading.Lock()
+        self._files = {}
+        self._idle = OrderedDict()
+        self._closed = False
+
+    def acquire(self, path):
+        """Return shared descriptor for path."""
+        path = os.fspath(path)
+        with self.lock:
+            ent = self._files.get(path)
+            if ent is None:
+                self._trim(config.MAX_OPEN_VOLUMES - 1)
+                ent = [os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0)), 0]
+                self._files[path] = ent
+            elif ent[1] == 0:
+                del self._idle[path]
+            ent[1] += 1
+            return ent[0]
+
+    def release(self, path):
+        """Drop reference, unused descriptor goes to idle list."""
+        path = os.fspath(path)
+        with self.lock:
+            ent = self._files.get(path)
+            if ent is None:
+                return
+            ent[1] -= 1
+            if ent[1] > 0:
+                return
+            self._idle[path] = ent[0]
+            self._trim(0 if self._closed else config.MAX_OPEN_VOLUMES)
+
+    def close(self):
+        """Close idle descriptors, busy ones are closed on release."""
+        with self.lock:
+            self._closed = True
+            self._trim(0)
+
+    def __del__(self):
+        """Close descriptors of dropped archive."""
+        files, self._files = self._files, {}
+        for fd, _ in files.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _trim(self, limit):
+        while self._idle and len(self._files) > limit:
+            path, fd = self._idle.popitem(last=False)
+            del self._files[path]
+            os.close(fd)
+
+
+class PreadFile:
+    """File object with private position on shared descriptor.
+
+    Uses os.pread(), so several objects can read from same
+    descriptor in parallel.
+    """
+    __slots__ = ("_files", "_path", "_fd", "_pos")
+
+    def __init__(self, files, path):
+        self._files = files
+        self._path = path
+        self._fd = files.acquire(path)
+        self._pos = 0
+
+    def read(self, n=-1):
+        """Read from file."""
+        if n is None or n < 0:
+            n = max(0, os.fstat(self._fd).st_size - self._pos)
+        data = os.pread(self._fd, n, self._pos)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buf):
+        """Read into buffer."""
+        if hasattr(os, "preadv"):
+            res = os.preadv(self._fd, [buf], self._pos)
+        else:
+            data = os.pread(self._fd, len(buf), self._pos)
+            res = len(data)
+            buf[:res] = data
+        self._pos += res
+        return res
+
+    def tell(self):
+        """Return file pos."""
+        return self._pos
+
+    def seek(self, ofs, whence=0):
+        """Move file pos."""
+        if whence == 1:
+            ofs += self._pos
+        elif whence == 2:
+            ofs += os.fstat(self._fd).st_size
+        self._pos = ofs
+        return ofs
+
+    def fileno(self):
+        """Return file descriptor."""
+        return self._fd
+
+    def close(self):
+        """Release descriptor."""
+        if self._fd is not None:
+            self._fd = None
+            self._files.release(self._path)
+
+
+class LockedFile:
+    """File object with private position on shared file object.
+
+    Each read seeks to own position under lock.
+    """
+    __slots__ = ("_fd", "_lock", "_pos")
+
+    def __init__(self, fd, lock):
+        self._fd = fd
+        self._lock = lock
+        self._pos = 0
+
+    def read(self, n=-1):
+        """Read from file."""
+        with self._lock:
+            self._fd.seek(self._pos)
+            data = self._fd.read(n)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buf):
+        """Read into buffer."""
+        with self._lock:
+            self._fd.seek(self._pos)
+            res = self._fd.readinto(buf)
+        self._pos += res
+        return res
+
+    def tell(self):
+        """Return file pos."""
+        return self._pos
+
+    def seek(self, ofs, whence=0):
+        """Move file pos."""
+        if whence == 1:
+            ofs += self._pos
+        elif whence == 2:
+            with self._lock:
+                ofs += self._fd.seek(0, 2)
+        self._pos = ofs
+        return ofs
+
+    def fileno(self):
+        """Return file descriptor."""
+        return self._fd.fileno()
+
+    def close(self):
+        """Does not close shared file."""
+        self._fd = None
+
+
 class UnicodeFilename:
     """Handle RAR3 unicode filename decompression.
     """
@@ -195,6 +456,13 @@ class nsdatetime(datetime):
             tzinfo=self.tzinfo if tzinfo is None else tzinfo,
             fold=self.fold if fold is None else fold)
 
+    def __reduce_ex__(self, protocol):
+        """Pickle support, default one loses nanoseconds.
+        """
+        base = datetime(self.year, self.month, self.day, self.hour, self.minute, self.second,
+                        tzinfo=self.tzinfo, fold=self.fold)
+        return (to_nsdatetime, (base, self.nanosecond))
+
     def __hash__(self):
         return hash((super().__hash__(), self.nanosecond)) if self.nanosecond else super().__hash__()
 
@@ -313,3 +581,25 @@ def membuf_tempfile(memfile):
         os.unlink(tmpname)
         raise
     return tmpname
+
+
+def memfd_tempfile():
+    """Anonymous in-memory file that external tool can open by name.
+
+    Returns unbuffered file object or None if not supported.
+    """
+    if not config.USE_MEMFD or not hasattr(os, "memfd_create"):
+        return None
+    if not os.path.isdir("/proc/self/fd"):
+        return None
+    try:
+        fd = os.memfd_create("rarfile.rar")
+    except OSError:
+        return None
+    return os.fdopen(fd, "w+b", buffering=0)
+
+
+def memfd_path(memf):
+    """Filename for memfd, valid in child process that inherits it.
+    """
+    return "/proc/self/fd/%d" % memf.fileno()
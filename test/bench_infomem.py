@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+
+"""Memory used by parsed archive entries.
+
+Generates archives with many small stored files, some directories
+and RAR5 hard links, and reports traced memory per entry after full parse,
+for RarInfo list and for RarCatalog.
+
+Usage: PYTHONPATH=src python3 test/bench_infomem.py [COUNT]
+"""
+
+import gc
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+import rarfile
+
+
+def rar3_block(htype, flags, body, add=b""):
+    hdr = struct.pack("<BHH", htype, flags, 7 + len(add) + len(body)) + add + body
+    return struct.pack("<H", zlib.crc32(hdr) & 0xFFFF) + hdr
+
+
+def make_rar3(count):
+    parts = [rarfile.RAR_ID, rar3_block(rarfile.RAR_BLOCK_MAIN, 0, bytes(6))]
+    for i in range(count):
+        flags = rarfile.RAR_LONG_BLOCK
+        if i % 10:
+            data = b"x%d\n" % i
+            name = b"dir%d\\file%07d.txt" % (i % 100, i)
+        else:
+            data = b""
+            name = b"dir%d\\sub%07d" % (i % 100, i)
+            flags |= rarfile.RAR_FILE_DIRECTORY
+        fhdr = struct.pack("<LBLLBBHL", len(data), rarfile.RAR_OS_WIN32, zlib.crc32(data),
+                           0x5A6B0000, 29, rarfile.RAR_M0, len(name), 0x20)
+        parts.append(rar3_block(rarfile.RAR_BLOCK_FILE, flags,
+                                fhdr + name, struct.pack("<L", len(data))))
+        parts.append(data)
+    parts.append(rar3_block(rarfile.RAR_BLOCK_ENDARC, 0, b""))
+    return b"".join(parts)
+
+
+def vint(v):
+    res = bytearray()
+    while v > 0x7F:
+        res.append((v & 0x7F) | 0x80)
+        v >>= 7
+    res.append(v)
+    return bytes(res)
+
+
+def rar5_block(body):
+    hdr = vint(len(body)) + body
+    return struct.pack("<L", zlib.crc32(hdr)) + hdr
+
+
+def make_rar5(count):
+    parts = [rarfile.RAR5_ID, rar5_block(vint(rarfile.RAR5_BLOCK_MAIN) + vint(0) + vint(0))]
+    for i in range(count):
+        if i % 10:
+            data = b"x%d\n" % i
+            name = b"dir%d/file%07d.txt" % (i % 100, i)
+            fflags = rarfile.RAR5_FILE_FLAG_HAS_MTIME | rarfile.RAR5_FILE_FLAG_HAS_CRC32
+            fields = vint(fflags) + vint(len(data)) + vint(0o100644) + struct.pack("<LL", 1600000000 + i, zlib.crc32(data))
+        else:
+            data = b""
+            name = b"dir%d/sub%07d" % (i % 100, i)
+            fflags = rarfile.RAR5_FILE_FLAG_HAS_MTIME | rarfile.RAR5_FILE_FLAG_ISDIR
+            fields = vint(fflags) + vint(0) + vint(0o40755) + struct.pack("<L", 1600000000 + i)
+        extra = b""
+        if i % 10 == 5:
+            # hard link to previous file
+            target = b"dir%d/file%07d.txt" % ((i - 1) % 100, i - 1)
+            rec = vint(rarfile.RAR5_XFILE_REDIR) + vint(rarfile.RAR5_XREDIR_HARD_LINK) + vint(0) + vint(len(target)) + target
+            extra = vint(len(rec)) + rec
+        bflags = rarfile.RAR5_BLOCK_FLAG_DATA_AREA | (rarfile.RAR5_BLOCK_FLAG_EXTRA_DATA if extra else 0)
+        body = (vint(rarfile.RAR5_BLOCK_FILE) + vint(bflags) + (vint(len(extra)) if extra else b"") + vint(len(data))
+                + fields + vint(0) + vint(rarfile.RAR5_OS_UNIX) + vint(len(name)) + name + extra)
+        parts.append(rar5_block(body))
+        parts.append(data)
+    parts.append(rar5_block(vint(rarfile.RAR5_BLOCK_ENDARC) + vint(0) + vint(0)))
+    return b"".join(parts)
+
+
+def load_infolist(fn):
+    return rarfile.RarFile(fn).infolist()
+
+
+def load_catalog(fn):
+    return rarfile.RarFile(fn, lazy=True).catalog()
+
+
+def measure(fn, count, loader):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    entries = loader(fn)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    assert len(entries) == count
+    return used / count, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, maker in (("RAR3", make_rar3), ("RAR5", make_rar5)):
+            fn = os.path.join(tmpdir, name.lower() + ".rar")
+            with open(fn, "wb") as f:
+                f.write(maker(count))
+            for desc, loader in (("infolist", load_infolist), ("catalog", load_catalog)):
+                per_entry, elapsed = measure(fn, count, loader)
+                print("%s %s: %d entries, %.0f bytes/entry, parse %.2fs" % (
+                    name, desc, count, per_entry, elapsed))
+
+
+if __name__ == "__main__":
+    main()
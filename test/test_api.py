@@ -3,6 +3,11 @@
 
 import io
 import os
+import stat
+import struct
+from binascii import crc32
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 import pytest
@@ -217,6 +222,59 @@ def test_parallel_fd_direct():
     run_parallel(memfile, "stest2.txt")
 
 
+def run_threaded(rfile, entry):
+    rf = rarfile.RarFile(rfile)
+    exp = rf.read(entry)
+    size = len(exp)
+
+    def read_range(i):
+        ofs = (i * 7919) % size
+        with rf.open(entry) as f:
+            f.seek(ofs)
+            return ofs, f.read(5000)
+
+    with ThreadPoolExecutor(8) as pool:
+        for ofs, data in pool.map(read_range, range(64)):
+            assert data == exp[ofs: ofs + 5000]
+    return rf
+
+
+def test_threaded_read_direct():
+    rf = run_threaded("test/files/rar5-vols.part1.rar", "vols/bigfile.txt")
+    rf.close()
+    assert not rf._file_parser._volumes._files
+
+
+def test_threaded_read_fd():
+    with open("test/files/seektest.rar", "rb") as f:
+        run_threaded(f, "stest2.txt")
+
+
+def test_volume_pool(monkeypatch):
+    opened = []
+    orig_open = os.open
+
+    def track_open(path, *args):
+        opened.append(path)
+        return orig_open(path, *args)
+    monkeypatch.setattr(os, "open", track_open)
+
+    with rarfile.RarFile("test/files/rar5-vols.part1.rar") as rf:
+        exp = rf.read("vols/bigfile.txt")
+        with rf.open("vols/bigfile.txt") as f:
+            for _ in range(5):
+                f.seek(0)
+                assert f.read() == exp
+        assert len(opened) == 3
+        pool = rf._file_parser._volumes
+        assert len(pool._files) == 3
+
+        monkeypatch.setattr(rarfile.config, "MAX_OPEN_VOLUMES", 1)
+        assert rf.read("vols/bigfile.txt") == exp
+        assert len(pool._files) == 1
+    assert not pool._files
+
+
 def test_printdir(capsys):
     rf = rarfile.RarFile("test/files/seektest.rar")
     rf.printdir()
@@ -236,6 +294,71 @@ def test_iter():
     assert n1 == n2
 
 
+def test_lazy_first_volume():
+    with pytest.raises(rarfile.NeedFirstVolume):
+        rarfile.RarFile("test/files/rar5-vols.part2.rar", lazy=True)
+
+
+@pytest.mark.parametrize("fn", [
+    "test/files/seektest.rar",
+    "test/files/rar3-comment-plain.rar",
+    "test/files/rar3-vols.part1.rar",
+    "test/files/rar5-solid-qo.rar",
+    "test/files/rar5-vols.part1.rar",
+])
+def test_lazy_iter(fn):
+    with rarfile.RarFile(fn) as rf:
+        infos = [(inf.filename, inf.file_size, inf.compress_size, inf.CRC) for inf in rf]
+        comment = rf.comment
+    with rarfile.RarFile(fn, lazy=True) as rf:
+        assert [(inf.filename, inf.file_size, inf.compress_size, inf.CRC) for inf in rf.iter_infos()] == infos
+        assert rf.comment == comment
+    with rarfile.RarFile(fn, lazy=True) as rf:
+        assert rf.comment == comment
+        assert [inf.filename for inf in rf] == [x[0] for x in infos]
+
+
+def test_lazy_getinfo():
+    infos = []
+    with rarfile.RarFile("test/files/rar5-solid-qo.rar", lazy=True, info_callback=infos.append) as rf:
+        assert len(infos) == 1
+        it = iter(rf)
+        assert next(it).filename == "somedir/stest1.txt"
+        assert len(infos) == 3
+
+        inf = rf.getinfo("stest1.txt")
+        assert inf.filename == "stest1.txt"
+        assert len(infos) == 7
+        assert rf.getinfo("stest1.txt") is inf
+
+        with pytest.raises(rarfile.NoRarEntry):
+            rf.getinfo("missing.txt")
+        assert len(rf.infolist()) == 4
+        assert len(list(it)) == 3
+
+
+def make_dups_archive():
+    """Return rar3-subdirs.rar where first entry has same name as fourth one."""
+    with open("test/files/rar3-subdirs.rar", "rb") as f:
+        buf = bytearray(f.read())
+    hoff = 20
+    hsize = struct.unpack_from("<H", buf, hoff + 5)[0]
+    pos = buf.index(b"dir2", hoff)
+    buf[pos: pos + 14] = buf[pos: pos + 14].replace(b"2", b"1")
+    struct.pack_into("<H", buf, hoff, crc32(buf[hoff + 2: hoff + hsize]) & 0xFFFF)
+    return bytes(buf)
+
+
+def test_lazy_getinfo_dups():
+    buf = make_dups_archive()
+    with rarfile.RarFile(io.BytesIO(buf)) as rf:
+        exp = rf.getinfo("sub/dir1/file1.txt")
+        assert rf.namelist().count("sub/dir1/file1.txt") == 2
+    with rarfile.RarFile(io.BytesIO(buf), lazy=True) as rf:
+        inf = rf.getinfo("sub/dir1/file1.txt")
+    assert (inf.header_offset, inf.filename) == (exp.header_offset, exp.filename)
+
+
 def test_testrar_mem():
     with open("test/files/seektest.rar", "rb") as f:
         arc = f.read()
@@ -340,6 +463,132 @@ def test_infocb():
     rf.close()
 
 
+@pytest.mark.parametrize("fn", [
+    "test/files/rar3-subdirs.rar",
+    "test/files/rar3-vols.part1.rar",
+    "test/files/rar5-vols.part1.rar",
+    "test/files/rar5-hlink.rar",
+    "test/files/rar3-comment-plain.rar",
+])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_catalog(fn, lazy):
+    with rarfile.RarFile(fn) as rf:
+        infos = rf.infolist()
+    with rarfile.RarFile(fn, lazy=lazy) as rf:
+        cat = rf.catalog()
+    assert len(cat) == len(infos)
+    assert cat.namelist() == [inf.filename for inf in infos]
+    for row, inf in enumerate(infos):
+        assert cat.index(inf.filename) == row
+        assert cat.file_size[row] == inf.file_size
+        assert cat.compress_size[row] == inf.compress_size
+        assert cat.is_dir(row) == inf.is_dir()
+        cinf = cat.getinfo(row)
+        assert (cinf.filename, cinf.compress_size, cinf.CRC, cinf.mtime, cinf.volume, cinf.comment) == \
+            (inf.filename, inf.compress_size, inf.CRC, inf.mtime, inf.volume, inf.comment)
+    with pytest.raises(rarfile.NoRarEntry):
+        cat.index("sub/dir")
+
+
+def test_catalog_select():
+    with rarfile.RarFile("test/files/rar3-subdirs.rar", lazy=True) as rf:
+        cat = rf.catalog()
+        assert not rf._file_parser._info_list
+    assert [cat.filename(r) for r in cat.select(prefix="sub/dir2/")] == ["sub/dir2/file2.txt", "sub/dir2/"]
+    assert list(cat.select(min_size=1, max_size=6)) == [0, 2, 3]
+    rows = cat.select(mtime_from=datetime(2020, 7, 20, 21, 2), mtime_to=datetime(2020, 7, 20, 21, 7))
+    assert [cat.filename(r) for r in rows] == ["sub/with space/long fn.txt", "sub/with space/", "sub/"]
+    assert list(cat.select(rows, prefix="sub/with", max_size=0)) == [5]
+    assert cat.getinfo("sub/with space").is_dir()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_catalog_dups(lazy):
+    buf = make_dups_archive()
+    with rarfile.RarFile(io.BytesIO(buf)) as rf:
+        exp = rf.getinfo("sub/dir1/file1.txt")
+    with rarfile.RarFile(io.BytesIO(buf), lazy=lazy) as rf:
+        cat = rf.catalog()
+    assert cat.index("sub/dir1/file1.txt") == 3
+    assert cat.getinfo("sub/dir1/file1.txt").header_offset == exp.header_offset
+    assert cat.index("sub/dir1") == 8
+    with pytest.raises(rarfile.NoRarEntry):
+        cat.index("")
+
+
+def test_tree_queries():
+    with rarfile.RarFile("test/files/rar3-subdirs.rar") as rf:
+        assert rf.listdir() == ["sub"]
+        assert rf.listdir("sub/") == ["dir2", "with space", "üȵĩöḋè", "dir1", "empty"]
+        assert list(rf.iterdir("sub/dir1")) == ["sub/dir1/file1.txt"]
+        assert rf.glob("sub/*/*.txt") == [
+            "sub/dir2/file2.txt", "sub/with space/long fn.txt",
+            "sub/üȵĩöḋè/file.txt", "sub/dir1/file1.txt",
+        ]
+        assert rf.glob("**/file[12].txt") == ["sub/dir2/file2.txt", "sub/dir1/file1.txt"]
+        assert rf.glob("**/*/**/*.txt") == rf.glob("sub/*/*.txt")
+        assert rf.glob("sub/e*") == ["sub/empty/"]
+        assert rf.glob("sub/nothere/*") == []
+        walk = list(rf.walk("sub"))
+        assert walk[0] == ("sub", ["dir2", "with space", "üȵĩöḋè", "dir1", "empty"], [])
+        assert walk[1] == ("sub/dir2", [], ["file2.txt"])
+        assert len(walk) == 6
+        with pytest.raises(rarfile.NoRarEntry):
+            rf.listdir("sub/dir3")
+        with pytest.raises(rarfile.NoRarEntry):
+            rf.listdir("sub/dir1/file1.txt")
+
+
+def test_tree_implicit_dirs():
+    with rarfile.RarFile("test/files/rar5-vols.part1.rar") as rf:
+        assert rf.listdir() == ["vols"]
+        assert list(rf.iterdir()) == ["vols/"]
+        assert rf.listdir("vols") == ["bigfile.txt", "smallfile.txt"]
+        assert list(rf.walk()) == [("", ["vols"], []), ("vols", [], ["bigfile.txt", "smallfile.txt"])]
+
+
+def test_path():
+    with rarfile.RarFile("test/files/rar3-subdirs.rar") as rf:
+        root = rarfile.Path(rf)
+        assert [p.name for p in root.iterdir()] == ["sub"]
+        sub = root / "sub"
+        assert sub.is_dir()
+        assert root.joinpath("sub", "dir1") == sub / "dir1"
+        fn = sub / "dir1" / "file1.txt"
+        assert fn.exists()
+        assert fn.is_file() and not fn.is_dir()
+        assert (fn.name, fn.stem, fn.suffix) == ("file1.txt", "file1", ".txt")
+        assert fn.parent == sub / "dir1"
+        assert fn.read_bytes() == b"file1\n"
+        assert fn.read_text() == "file1\n"
+        with fn.open("rb") as f:
+            assert f.read() == b"file1\n"
+        st = fn.stat()
+        assert stat.S_ISREG(st.st_mode)
+        assert st.st_size == 6
+        assert st.st_mtime_ns == rf.getinfo("sub/dir1/file1.txt").mtime_ns
+        assert stat.S_ISDIR(sub.stat().st_mode)
+        assert not (sub / "dir3" / "x").exists()
+        with pytest.raises(rarfile.NoRarEntry):
+            (sub / "dir3").stat()
+        with pytest.raises(rarfile.NoRarEntry):
+            list(fn.iterdir())
+        with pytest.raises(io.UnsupportedOperation):
+            sub.read_bytes()
+
+
+def test_path_implicit_dirs():
+    root = rarfile.Path("test/files/rar5-vols.part1.rar")
+    vols = root / "vols"
+    assert vols.is_dir()
+    assert vols.stat().st_mtime == 0
+    assert [str(p) for p in vols.iterdir()] == [
+        "test/files/rar5-vols.part1.rar/vols/bigfile.txt",
+        "test/files/rar5-vols.part1.rar/vols/smallfile.txt",
+    ]
+    assert (vols / "smallfile.txt").stat().st_size == 2050
+
+
 # pylint: disable=singleton-comparison
 def test_rarextfile():
     with rarfile.RarFile("test/files/seektest.rar") as rf:
@@ -395,6 +644,37 @@ def test_volume_info():
         assert len(info_list) == 16
 
 
+def scan_volumes(fn):
+    hdrs = []
+    with rarfile.RarFile(fn, info_callback=hdrs.append) as rf:
+        infos = [(inf.filename, inf.volume, inf.compress_size, inf.CRC) for inf in rf.infolist()]
+        return infos, rf.volumelist(), rf.strerror(), [(h.volume, h.header_offset) for h in hdrs]
+
+
+@pytest.mark.parametrize("fn", [
+    "test/files/rar3-old.rar",
+    "test/files/rar3-vols.part1.rar",
+    "test/files/rar5-vols.part1.rar",
+])
+def test_volume_scan_workers(fn, monkeypatch):
+    exp = scan_volumes(fn)
+    monkeypatch.setattr(rarfile.config, "VOLUME_SCAN_WORKERS", 4)
+    assert scan_volumes(fn) == exp
+    with rarfile.RarFile(fn, lazy=True) as rf:
+        assert [inf.filename for inf in rf] == [x[0] for x in exp[0]]
+
+
+def test_volume_scan_missing(tmp_path, monkeypatch):
+    for n in (1, 2):
+        with open("test/files/rar5-vols.part%d.rar" % n, "rb") as f:
+            (tmp_path / ("vols.part%d.rar" % n)).write_bytes(f.read())
+    fn = str(tmp_path / "vols.part1.rar")
+    exp = scan_volumes(fn)
+    assert "Cannot open next volume" in exp[2]
+    monkeypatch.setattr(rarfile.config, "VOLUME_SCAN_WORKERS", 2)
+    assert scan_volumes(fn) == exp
+
+
 def test_is_solid():
     with rarfile.RarFile("test/files/rar3-comment-plain.rar") as rf:
         assert not rf.is_solid()
@@ -406,7 +686,72 @@ def test_is_solid():
         assert rf.is_solid()
 
 
+def test_view():
+    with rarfile.RarFile("test/files/rar5-crc.rar") as rf:
+        view = rf.view("stest2.txt")
+        assert view.readonly
+        assert view == rf.read("stest2.txt")
+        with pytest.raises(io.UnsupportedOperation):
+            rf.view("stest1.txt")
+    with rarfile.RarFile("test/files/rar5-vols.part1.rar") as rf:
+        with pytest.raises(io.UnsupportedOperation):
+            rf.view("vols/bigfile.txt")
+    with open("test/files/rar5-crc.rar", "rb") as f:
+        with rarfile.RarFile(f) as rf:
+            with pytest.raises(io.UnsupportedOperation):
+                rf.view("stest2.txt")
+
+
+def test_mmap_vols(monkeypatch):
+    with rarfile.RarFile("test/files/rar5-vols.part1.rar") as rf:
+        exp = rf.read("vols/bigfile.txt")
+        monkeypatch.setattr(rarfile.config, "USE_MMAP", 1)
+        with rf.open("vols/bigfile.txt") as f:
+            assert isinstance(f, rarfile.MmapReader)
+            assert f.read() == exp
+        with rf.open("vols/bigfile.txt") as f:
+            buf = bytearray(len(exp) + 10)
+            assert f.readinto(buf) == len(exp)
+            assert buf[:len(exp)] == exp
+
+
+def test_mmap_open(monkeypatch):
+    with rarfile.RarFile("test/files/rar5-crc.rar") as rf:
+        exp = rf.read("stest2.txt")
+        with rf.open("stest2.txt", mmap=True) as f:
+            assert isinstance(f, rarfile.MmapReader)
+            data = f.read(100)
+            assert isinstance(data, memoryview)
+            assert data == exp[:100]
+            assert f.read() == exp[100:]
+        monkeypatch.setattr(rarfile.config, "USE_MMAP", 1)
+        with rf.open("stest2.txt", mmap=False) as f:
+            assert not isinstance(f, rarfile.MmapReader)
+
+
 def test_public_exports():
     missing = object()
     for k in rarfile.__all__:
         assert getattr(rarfile, k, missing) is not missing, f"rarfile.{k} is missing"
+
+
+@pytest.mark.skipif(not hasattr(os, "memfd_create"), reason="No memfd_create")
+@pytest.mark.parametrize("fn, entry, filelike", [
+    ("test/files/seektest.rar", "stest1.txt", False),
+    ("test/files/seektest.rar", "stest1.txt", True),
+    ("test/files/rar3-solid.rar", "stest2.txt", True),
+])
+def test_open_memfd(fn, entry, filelike, tmp_path, monkeypatch):
+    monkeypatch.setattr(rarfile.config, "HACK_TMP_DIR", str(tmp_path))
+    src = io.BytesIO(Path(fn).read_bytes()) if filelike else fn
+    with rarfile.RarFile(src) as rf:
+        monkeypatch.setattr(rarfile.config, "USE_MEMFD", 0)
+        with rf.open(entry) as f:
+            assert os.listdir(tmp_path)
+            exp = f.read()
+
+        monkeypatch.setattr(rarfile.config, "USE_MEMFD", 1)
+        with rf.open(entry) as f:
+            assert not os.listdir(tmp_path)
+            assert f.read() == exp
+    assert len(exp) == 2048
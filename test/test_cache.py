@@ -0,0 +1,94 @@
+"""Index cache tests.
+"""
+
+import os
+import shutil
+
+import pytest
+
+import rarfile
+from rarfile import config
+
+
+@pytest.fixture(name="cache_dir")
+def fixture_cache_dir(tmp_path, monkeypatch):
+    cdir = tmp_path / "cache"
+    monkeypatch.setattr(config, "INDEX_CACHE_DIR", str(cdir))
+    return cdir
+
+
+def get_listing(rf):
+    return [(inf.filename, inf.file_size, inf.CRC, inf.volume) for inf in rf.infolist()]
+
+
+def test_cache_hit(cache_dir, monkeypatch):
+    with rarfile.RarFile("test/files/rar5-vols.part1.rar") as rf:
+        exp_list = get_listing(rf)
+        exp_vols = rf.volumelist()
+    assert len(os.listdir(cache_dir)) == 1
+
+    def fail_parse(self):
+        raise AssertionError("parse() called")
+    monkeypatch.setattr(rarfile.RAR5Parser, "parse", fail_parse)
+
+    with rarfile.RarFile("test/files/rar5-vols.part1.rar") as rf:
+        assert get_listing(rf) == exp_list
+        assert rf.volumelist() == exp_vols
+        assert rf.getinfo("vols/smallfile.txt").file_size == 2050
+
+
+def test_cache_comment(cache_dir):
+    with rarfile.RarFile("test/files/rar5-crc.rar") as rf:
+        exp = rf.comment
+    with rarfile.RarFile("test/files/rar5-crc.rar") as rf:
+        assert rf.comment == exp
+        assert rf.read("stest2.txt")
+
+
+def test_cache_invalidate(cache_dir, tmp_path, monkeypatch):
+    fn = str(tmp_path / "test.rar")
+    shutil.copy("test/files/rar3-owner.rar", fn)
+    with rarfile.RarFile(fn) as rf:
+        exp_list = get_listing(rf)
+
+    calls = []
+    orig_parse = rarfile.RAR3Parser.parse
+
+    def track_parse(self):
+        calls.append(1)
+        orig_parse(self)
+    monkeypatch.setattr(rarfile.RAR3Parser, "parse", track_parse)
+
+    with rarfile.RarFile(fn) as rf:
+        assert get_listing(rf) == exp_list
+    assert not calls
+
+    shutil.copy("test/files/rar5-owner.rar", fn)
+    with rarfile.RarFile(fn) as rf:
+        assert rf.namelist() == ["owner1.txt", "owner2.txt"]
+        assert isinstance(rf.infolist()[0], rarfile.Rar5FileInfo)
+
+
+def test_cache_skip_hdr_encryption(cache_dir):
+    if not rarfile._have_crypto:
+        pytest.skip("No crypto")
+    with rarfile.RarFile("test/files/rar5-hpsw.rar") as rf:
+        rf.setpassword("password")
+        assert rf.namelist()
+    with rarfile.RarFile("test/files/rar5-hpsw.rar") as rf:
+        assert not rf.namelist()
+    assert not cache_dir.exists() or not os.listdir(cache_dir)
+
+
+def test_cache_relative_path(cache_dir, monkeypatch):
+    cwd = os.getcwd()
+    with rarfile.RarFile("test/files/rar3-vols.part1.rar") as rf:
+        exp_data = rf.read("vols/bigfile.txt")
+
+    monkeypatch.chdir(cache_dir)
+    fn = os.path.join(cwd, "test/files/rar3-vols.part1.rar")
+    with rarfile.RarFile(fn) as rf:
+        assert rf.volumelist() == [
+            os.path.join(cwd, "test/files/rar3-vols.part%d.rar" % i) for i in (1, 2, 3)
+        ]
+        assert rf.read("vols/bigfile.txt") == exp_data
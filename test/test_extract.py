@@ -231,6 +231,44 @@ def test_vols(fn, tmp_path):
         assert os.path.isfile(tmp_path / "vols" / "smallfile.txt")
 
 
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="No copy_file_range")
+@pytest.mark.parametrize("fn", [
+    "test/files/rar3-old.rar",
+    "test/files/rar3-vols.part1.rar",
+    "test/files/rar5-vols.part1.rar",
+])
+def test_vols_kernel_copy(fn, tmp_path, monkeypatch):
+    calls = []
+    orig_copy = os.copy_file_range
+
+    def track_copy(*args):
+        calls.append(args)
+        return orig_copy(*args)
+    monkeypatch.setattr(os, "copy_file_range", track_copy)
+
+    with rarfile.RarFile(fn) as rf:
+        rf.extractall(str(tmp_path))
+        for name in ("vols/bigfile.txt", "vols/smallfile.txt"):
+            assert (tmp_path / name).read_bytes() == rf.read(name)
+    # bigfile is split over volumes
+    assert len(calls) > 2
+
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="No copy_file_range")
+def test_kernel_copy_crc(tmp_path):
+    fn = tmp_path / "test.rar"
+    with open("test/files/rar5-crc.rar", "rb") as f:
+        data = bytearray(f.read())
+    with rarfile.RarFile("test/files/rar5-crc.rar") as rf:
+        pos = rf.getinfo("stest2.txt").data_offset + 10
+    data[pos] ^= 1
+    fn.write_bytes(data)
+
+    with rarfile.RarFile(str(fn)) as rf:
+        with pytest.raises(rarfile.BadRarFile):
+            rf.extract("stest2.txt", str(tmp_path / "out"))
+
+
 @pytest.mark.skipif(sys.platform == "win32", reason="symlink semantics differ on Windows")
 def test_symlink_chained_traversal_blocked(tmp_path):
     """Regression test for symlink-chained zip-slip (CWE-22 + CWE-59).
@@ -262,3 +300,40 @@ def test_symlink_chained_traversal_blocked(tmp_path):
 
     # The second member would land at tmp_path/pwned.txt without the guard.
     assert not (tmp_path / "pwned.txt").exists()
+
+
+@pytest.mark.parametrize("fn", [
+    "test/files/rar3-subdirs.rar",
+    "test/files/rar5-subdirs.rar",
+    "test/files/rar3-vols.part1.rar",
+    "test/files/rar5-vols.part1.rar",
+])
+def test_extractall_workers(fn, tmp_path):
+    with rarfile.RarFile(fn) as rf:
+        rf.extractall(tmp_path, workers=4)
+        for inf in rf.infolist():
+            dst = tmp_path / inf.filename
+            if inf.is_dir():
+                assert os.path.isdir(dst)
+                checktime(dst, inf.mtime)
+            else:
+                with open(dst, "rb") as f:
+                    assert f.read() == rf.read(inf)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="symlink semantics differ on Windows")
+def test_extractall_workers_symlink(tmp_path):
+    extract = tmp_path / "extract"
+    extract.mkdir()
+    with rarfile.RarFile("test/files/rar5-evil-symlink-traversal.rar") as rf:
+        with pytest.raises(rarfile.BadSymLinkError):
+            rf.extractall(extract, workers=4)
+    assert not (tmp_path / "pwned.txt").exists()
+
+
+def test_extractall_batch_repeat(tmp_path):
+    with rarfile.RarFile("test/files/rar3-solid.rar") as rf:
+        rf.extractall(tmp_path, members=["stest1.txt", "stest1.txt", "stest2.txt"])
+        assert sorted(os.listdir(tmp_path)) == ["stest1.txt", "stest2.txt"]
+        with open(tmp_path / "stest1.txt", "rb") as f:
+            assert f.read() == rf.read("stest1.txt")
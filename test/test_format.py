@@ -1,6 +1,7 @@
 """Format details.
 """
 
+import pickle
 from datetime import datetime
 
 import pytest
@@ -275,3 +276,62 @@ def test_newvols_err():
 def test_versions(fn):
     with rarfile.RarFile(fn) as rf:
         assert rf.namelist() == ["versioned.txt"]
+
+
+@pytest.mark.skipif(rarfile.format.rar5_parse_header is None, reason="No C header parser")
+@pytest.mark.parametrize("fn", [
+    "test/files/rar5-blake.rar",
+    "test/files/rar5-hlink.rar",
+    "test/files/rar5-owner.rar",
+    "test/files/rar5-psw-blake.rar",
+    "test/files/rar5-times.rar",
+    "test/files/rar5-versions.rar",
+])
+def test_rar5_native_header(fn, monkeypatch):
+    with rarfile.RarFile(fn) as rf:
+        native = rf.infolist()
+    monkeypatch.setattr(rarfile.format, "rar5_parse_header", None)
+    with rarfile.RarFile(fn) as rf:
+        fallback = rf.infolist()
+    assert [info_fields(h) for h in native] == [info_fields(h) for h in fallback]
+
+
+def info_fields(h):
+    return {k: getattr(h, k) for cls in type(h).__mro__ for k in getattr(cls, "__slots__", ())}
+
+
+@pytest.mark.parametrize("fn", ["test/files/rar3-comment-plain.rar", "test/files/rar5-owner.rar"])
+def test_info_slots(fn):
+    with rarfile.RarFile(fn) as rf:
+        infos = rf.infolist()
+    for h in infos:
+        assert not hasattr(h, "__dict__")
+        h2 = pickle.loads(pickle.dumps(h, pickle.HIGHEST_PROTOCOL))
+        assert type(h2) is type(h)
+        assert info_fields(h2) == info_fields(h)
+        with pytest.raises(AttributeError):
+            h.no_such_field = 1
+
+
+@pytest.mark.parametrize("fn", [
+    "test/files/rar15-comment.rar",
+    "test/files/rar3-subdirs.rar",
+    "test/files/ctime4.rar",
+    "test/files/rar5-times.rar",
+    "test/files/rar5-times2.rar",
+])
+def test_lazy_times(fn):
+    with rarfile.RarFile(fn) as rf:
+        infos = rf.infolist()
+    with rarfile.RarFile(fn) as rf:
+        fresh = rf.infolist()
+    for inf, inf2 in zip(infos, fresh):
+        assert not isinstance(inf._mtime, datetime)
+        for k in ("mtime", "ctime", "atime"):
+            val = getattr(inf, k)
+            assert getattr(inf2, k + "_ns") == (val and rarfile.utils.to_nsecs(val))
+        if inf.mtime:
+            assert inf.date_time == inf.mtime.timetuple()[:6]
+        assert inf2.date_time == inf.date_time
+        assert inf2.mtime == inf.mtime
+
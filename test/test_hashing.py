@@ -2,6 +2,7 @@
 """
 
 from binascii import hexlify, unhexlify
+from types import SimpleNamespace
 
 import pytest
 
@@ -66,6 +67,46 @@ def test_blake2sp():
     assert xblake2sp_slow(long2) == "24a78d92592d0761a3681f32935225ca55ffb8eb16b55ab9481c89c59a985ff3"
 
 
+@pytest.mark.parametrize("size", [0, 1, 64, 511, 512, 513, 960, 961, 1024, 5000, 100000])
+def test_blake2sp_lanes(size):
+    from rarfile.crypto import Blake2SPLanes, blake2sp
+
+    data = bytes(range(256)) * (size // 256 + 1)
+    data = data[:size]
+
+    py = Blake2SPLanes()
+    py.update(data)
+    exp = py.digest()
+
+    md = blake2sp()
+    md.update(data)
+    assert md.digest() == exp
+    assert md.digest() == exp
+
+    md = Blake2SP()
+    for pos in range(0, size, 333):
+        md.update(memoryview(data)[pos: pos + 333])
+    assert md.digest() == exp
+
+    md = Blake2SP()
+    md.update(bytearray(data))
+    assert md.digest() == exp
+
+
+def test_blake2sp_buffers():
+    from rarfile.crypto import Blake2SPLanes, blake2sp
+
+    data = bytes(range(256)) * 3000
+    for buf in (bytearray(data), memoryview(data), memoryview(data)[1000:]):
+        py = Blake2SPLanes()
+        py.update(bytes(buf))
+        md = blake2sp()
+        md.update(buf)
+        assert md.digest() == py.digest()
+    with pytest.raises(TypeError):
+        blake2sp().update("text")
+
+
 def test_rar3_s2k():
     from rarfile.crypto import rar3_s2k
 
@@ -133,3 +174,91 @@ def test_rar3_s2k_native_matches_pure():
         assert h_native == h_pure, f"failed at length {len(seed)}"
         assert iv_native == iv_pure
         assert a == b
+
+
+@pytest.mark.parametrize("pwd", ["password", "p" * 40, "\u00f5" * 200])
+def test_rar5_kdf(pwd):
+    from hashlib import pbkdf2_hmac
+
+    from rarfile.crypto import rar5_kdf, rar5_pbkdf2, rar5_pbkdf2_py, rar5_s2k
+
+    salt = unhexlify("00112233445566778899aabbccddeeff")
+    count = 1 << 10
+    key, hash_key, pwd_check = rar5_kdf(pwd, salt, count)
+    assert key == rar5_s2k(pwd, salt, count)
+    assert hash_key == rar5_s2k(pwd, salt, count + 16)
+    exp = bytearray(8)
+    for i, v in enumerate(rar5_s2k(pwd, salt, count + 32)):
+        exp[i % 8] ^= v
+    assert pwd_check == exp
+    assert rar5_kdf(pwd, salt, count, rar5_pbkdf2_py) == (key, hash_key, pwd_check)
+
+    # C and Python versions against hashlib, including short chains
+    for n in (1, 2, 17):
+        exp = tuple(pbkdf2_hmac("sha256", pwd.encode("utf8"), salt, n + extra) for extra in (0, 16, 32))
+        assert rar5_pbkdf2(pwd.encode("utf8"), salt, n) == exp
+        assert rar5_pbkdf2_py(pwd.encode("utf8"), salt, n) == exp
+
+
+def test_kdf_cache(monkeypatch):
+    import rarfile
+    from rarfile.crypto import derive_key, purge_kdf_cache
+
+    calls = []
+
+    def s2k(pwd, salt, count):
+        calls.append((pwd, salt, count))
+        return salt * count
+
+    purge_kdf_cache()
+    monkeypatch.setattr(rarfile.config, "KDF_CACHE_SIZE", 2)
+    assert derive_key(s2k, "pwd", b"s1", 2) == b"s1s1"
+    assert derive_key(s2k, b"pwd", b"s1", 2) == b"s1s1"
+    assert len(calls) == 1
+    derive_key(s2k, "pwd", b"s1", 3)
+    derive_key(s2k, "pwd2", b"s1", 2)
+    assert len(calls) == 3
+
+    # least recently used is dropped
+    derive_key(s2k, "pwd", b"s1", 2)
+    assert len(calls) == 4
+    derive_key(s2k, "pwd2", b"s1", 2)
+    assert len(calls) == 4
+
+    purge_kdf_cache()
+    derive_key(s2k, "pwd", b"s1", 2)
+    assert len(calls) == 5
+
+    monkeypatch.setattr(rarfile.config, "KDF_CACHE_TTL", 10)
+    monkeypatch.setattr(rarfile.crypto, "time", SimpleNamespace(monotonic=lambda: 1000))
+    derive_key(s2k, "pwd", b"s2", 2)
+    derive_key(s2k, "pwd", b"s2", 2)
+    assert len(calls) == 6
+    monkeypatch.setattr(rarfile.crypto, "time", SimpleNamespace(monotonic=lambda: 1011))
+    derive_key(s2k, "pwd", b"s2", 2)
+    assert len(calls) == 7
+
+    monkeypatch.setattr(rarfile.config, "KDF_CACHE_SIZE", 0)
+    derive_key(s2k, "pwd", b"s2", 2)
+    assert len(calls) == 8
+    purge_kdf_cache()
+
+
+def test_hash_thread():
+    from rarfile.crypto import HashThread
+
+    md = HashThread(CRC32Context(), 2)
+    md.update(b"Hel")
+    md.update(bytearray(b"lo"))
+    assert md.hexdigest() == "f7d18982"
+
+    class FailContext(CRC32Context):
+        def update(self, data):
+            raise ValueError("fail")
+
+    md = HashThread(FailContext(), 2)
+    md.update(b"Hello")
+    with pytest.raises(ValueError):
+        md.hexdigest()
+    with pytest.raises(ValueError):
+        md.digest()
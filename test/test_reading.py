@@ -132,3 +132,104 @@ def test_reading_rar5_crc_sfx():
     assert rarfile.is_rarfile("test/files/rar5-crc.sfx") is False
     assert rarfile.is_rarfile_sfx("test/files/rar5-crc.sfx") is True
     run_reading("test/files/rar5-crc.sfx")
+
+
+@pytest.mark.parametrize("mode", [1, 2])
+def test_sfx_scan_mode(mode, monkeypatch):
+    monkeypatch.setattr(rarfile.config, "SFX_SCAN_MODE", mode)
+    # small chunks, so signature crosses chunk boundary
+    monkeypatch.setattr(rarfile.config, "BSIZE", 5)
+    for fn, ver in (("test/files/rar3-seektest.sfx", rarfile.RAR_V3),
+                    ("test/files/rar5-crc.sfx", rarfile.RAR_V5)):
+        assert rarfile.archive._find_sfx_header(fn)[0] == ver
+        with open(fn, "rb") as f:
+            data = f.read()
+            f.seek(10)
+            assert rarfile.archive._find_sfx_header(f) == (ver, data.find(b"Rar!\x1a\x07"))
+            assert f.tell() == 10
+    assert rarfile.archive._find_sfx_header("test/files/rar5-crc.rar") == (rarfile.RAR_V5, 0)
+
+    monkeypatch.setattr(rarfile.config, "SFX_MAX_SIZE", 1000)
+    assert not rarfile.is_rarfile_sfx("test/files/rar3-seektest.sfx")
+
+    monkeypatch.setattr(rarfile.config, "SFX_SCAN_MODE", 0)
+    assert not rarfile.is_rarfile_sfx("test/files/rar5-crc.sfx")
+
+
+@pytest.mark.skipif(rarfile.stream.rar5_unpack is None, reason="No native unpack")
+def test_reading_rar5_native(monkeypatch):
+    with rarfile.RarFile("test/files/rar5-blake.rar") as rf:
+        with rf.open("stest1.txt") as f:
+            assert isinstance(f, rarfile.InProcessReader)
+            data = f.read()
+            f.seek(100)
+            assert f.read(10) == data[100:110]
+        if not rarfile.config.WIN32:
+            monkeypatch.setattr(rarfile.config, "NATIVE_UNPACK_MEM_LIMIT", 0)
+            with rf.open("stest1.txt") as f:
+                assert not isinstance(f._fd, io.BytesIO)
+                assert f.read() == data
+                f.seek(100)
+                assert f.read(10) == data[100:110]
+        monkeypatch.setattr(rarfile.config, "USE_NATIVE_UNPACK", 0)
+        with rf.open("stest1.txt") as f:
+            assert not isinstance(f, rarfile.InProcessReader)
+
+
+@pytest.mark.skipif(rarfile.stream.rar5_unpack is None, reason="No native unpack")
+def test_reading_rar5_native_corrupt():
+    rf = rarfile.RarFile("test/files/rar5-crc.rar")
+    info = rf.getinfo("stest1.txt")
+    info.compress_size -= 20
+    with pytest.raises(rarfile.BadRarFile):
+        rf.read(info)
+
+
+@pytest.mark.parametrize("fn", ["test/files/rar5-crc.rar", "test/files/rar5-blake.rar"])
+def test_reading_hash_queue(fn, monkeypatch):
+    monkeypatch.setattr(rarfile.config, "HASH_QUEUE_SIZE", 2)
+    run_reading(fn)
+    with rarfile.RarFile(fn) as rf:
+        with rf.open("stest1.txt") as f:
+            assert isinstance(f._md_context, rarfile.crypto.HashThread)
+            f.read(10)
+            f.seek(0)
+            assert not isinstance(f._md_context, rarfile.crypto.HashThread)
+
+
+def test_reading_hash_queue_corrupt(monkeypatch):
+    monkeypatch.setattr(rarfile.config, "HASH_QUEUE_SIZE", 2)
+    with open("test/files/rar5-crc.rar", "rb") as f:
+        buf = bytearray(f.read())
+    info = rarfile.RarFile(io.BytesIO(buf)).getinfo("stest2.txt")
+    buf[info.data_offset + 100] ^= 1
+    rf = rarfile.RarFile(io.BytesIO(buf))
+    with pytest.raises(rarfile.BadRarFile):
+        rf.read("stest2.txt")
+    with rf.open("stest2.txt") as f:
+        with pytest.raises(rarfile.BadRarFile):
+            while f.read(100):
+                pass
+
+
+@pytest.mark.skipif(not rarfile._have_crypto, reason="No crypto")
+@pytest.mark.parametrize("fn", ["test/files/rar5-psw.rar", "test/files/rar5-psw-blake.rar"])
+def test_reading_rar5_decrypt(fn):
+    exp = rarfile.RarFile("test/files/rar5-crc.rar").read("stest2.txt")
+    rf = rarfile.RarFile(fn)
+    rf.setpassword("password")
+    with rf.open("stest2.txt") as f:
+        assert isinstance(f, rarfile.DecryptReader)
+        assert f.read() == exp
+        for pos in (1000, 16, 0, 17, 2040, 555):
+            f.seek(pos)
+            assert f.read(33) == exp[pos:pos + 33]
+    with pytest.raises(rarfile.RarWrongPassword):
+        rf.read("stest2.txt", "wrong")
+
+    with open(fn, "rb") as f:
+        buf = bytearray(f.read())
+    buf[rf.getinfo("stest2.txt").data_offset + 100] ^= 1
+    rf = rarfile.RarFile(io.BytesIO(buf))
+    with pytest.raises(rarfile.BadRarFile):
+        rf.read("stest2.txt", "password")
@@ -133,3 +133,54 @@ def test_seek_middle1():
 
 def test_seek_middle2():
     run_seek_middle("test/files/seektest.rar", "stest2.txt")
+
+
+def test_seek_mmap(monkeypatch):
+    monkeypatch.setattr(rarfile.config, "USE_MMAP", 1)
+    rf = rarfile.RarFile(ARC)
+    with rf.open("stest2.txt") as f:
+        assert isinstance(f, rarfile.MmapReader)
+    run_seek(rf, "stest2.txt")
+    run_seek_middle(ARC, "stest2.txt")
+
+
+@pytest.mark.parametrize("policy,limit", [("tail", 7), ("tail", 1 << 20), ("head", 7), ("head", 1 << 20)])
+def test_seek_spill(monkeypatch, policy, limit):
+    monkeypatch.setattr(rarfile.config, "SPILL_SIZE_LIMIT", limit)
+    monkeypatch.setattr(rarfile.config, "SPILL_POLICY", policy)
+    rf = rarfile.RarFile(ARC)
+    run_seek(rf, "stest1.txt")
+    run_seek_middle(ARC, "stest1.txt")
+
+
+def test_seek_spill_norestart(monkeypatch):
+    monkeypatch.setattr(rarfile.config, "SPILL_SIZE_LIMIT", 1 << 20)
+    rf = rarfile.RarFile(ARC)
+    with rf.open("stest1.txt") as f:
+        data = f.read()
+        proc = f._proc
+        f.seek(10)
+        assert f.read(20) == data[10:30]
+        f.seek(0)
+        assert f.read() == data
+        assert f._proc is proc
+
+
+@pytest.mark.parametrize("policy", ["tail", "head"])
+def test_spill_file(policy):
+    spill = rarfile.stream.SpillFile(10, policy)
+    spill.append(0, b"0123456789abc")
+    if policy == "tail":
+        assert (spill.start, spill.end) == (3, 13)
+        assert spill.read(3, 20) == b"3456789abc"
+        spill.append(13, b"de")
+        assert spill.read(5, 20) == b"56789abcde"
+        spill.append(20, b"xyz")
+        assert (spill.start, spill.end) == (20, 23)
+    else:
+        assert (spill.start, spill.end) == (0, 10)
+        assert spill.read(0, 20) == b"0123456789"
+        spill.append(20, b"xyz")
+        assert (spill.start, spill.end) == (0, 10)
+    assert not spill.covers(spill.end)
+    spill.close()
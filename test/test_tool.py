@@ -142,6 +142,37 @@ def test_7z_tool():
         uninstall_alt_tool()
 
 
+@pytest.mark.skipif(
+    not have_tool(config.BSDTAR_TOOL) and not have_tool(config.TAR_TOOL),
+    reason="bsdtar not installed",
+)
+def test_bsdtar_batch_extract(tmp_path):
+    install_bsdtar_tool()
+    config.FORCE_TOOL = False
+    config.BATCH_EXTRACT = 2
+    try:
+        with rarfile.RarFile("test/files/seektest.rar") as rf:
+            rf.extractall(tmp_path)
+            assert sorted(os.listdir(tmp_path)) == ["stest1.txt", "stest2.txt"]
+            with open(tmp_path / "stest1.txt", "rb") as f:
+                assert f.read() == rf.read("stest2.txt")
+    finally:
+        config.BATCH_EXTRACT = 1
+        uninstall_alt_tool()
+
+
+def test_extract_cmdline():
+    setup = backend.ToolSetup(backend.UNRAR_CONFIG)
+    cmd = setup.extract_cmdline(None, "arc.rar", "dst", ["a.txt", "b.txt"])
+    assert cmd == [config.UNRAR_TOOL, "x", "-inul", "-y", "-p-", "--", "arc.rar",
+                   "a.txt", "b.txt", os.path.join("dst", "")]
+
+    setup = backend.ToolSetup(backend.SEVENZIP_CONFIG)
+    setup.executable = "7z"
+    cmd = setup.extract_cmdline("psw", "arc.rar", "dst", ["a.txt"])
+    assert cmd == ["7z", "x", "-y", "-bb0", "-ppsw", "-odst", "--", "arc.rar", "a.txt"]
+
+
 # test popen errors
 
 def test_popen_fail():
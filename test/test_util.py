@@ -23,6 +23,18 @@ def test_to_datetime():
     assert to_datetime((2021, 2, 30, 60, 60, 60)) == datetime(2021, 2, 28, 23, 59, 59)
 
 
+def test_load_time():
+    from rarfile.format import load_dostime, load_unixtime, load_windowstime
+    stamp = (40 << 25) | (1 << 21) | (2 << 16) | (3 << 11) | (4 << 5) | 3
+    assert load_dostime(stamp.to_bytes(4, "little"), 0) == (datetime(2020, 1, 2, 3, 4, 6), 4)
+    assert load_unixtime(b"\x01\x00\x00\x00", 0) == (datetime(1970, 1, 1, 0, 0, 1, tzinfo=timezone.utc), 4)
+    wtime = (116444736000000000 + 5).to_bytes(8, "little")
+    dt, pos = load_windowstime(wtime, 0)
+    assert pos == 8
+    assert dt.nanosecond == 500
+    assert dt.replace(microsecond=0) == datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
 def test_to_nsdatetime():
     from rarfile.utils import nsdatetime, to_nsdatetime
     base = datetime(2020, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
@@ -43,6 +55,17 @@ def test_to_nsdatetime():
     assert res.isoformat(" ", "microseconds") == "2020-01-01 00:00:00.000001+00:00"
 
 
+def test_nsdatetime_pickle():
+    import pickle
+
+    from rarfile.utils import nsdatetime
+    n1 = nsdatetime(2000, 1, 1, 9, 15, 30, nanosecond=100200300, tzinfo=timezone.utc)
+    n2 = pickle.loads(pickle.dumps(n1))
+    assert isinstance(n2, nsdatetime)
+    assert n2 == n1
+    assert n2.nanosecond == 100200300
+
+
 def test_nsdatetime_cmp():
     from rarfile.utils import nsdatetime
 
@@ -102,3 +125,56 @@ def test_nsdatetime_astimezone():
     assert n2.nanosecond == n1.nanosecond
     assert (n1.year, n1.month, n1.day) == (n2.year, n2.month, n2.day)
     assert (n1.hour, n1.minute, n1.second) == (n2.hour - 1, n2.minute, n2.second)
+
+
+def test_header_reader(monkeypatch):
+    import io
+
+    import rarfile
+    from rarfile.utils import HeaderReader
+
+    class CountingFile(io.BytesIO):
+        reads = 0
+
+        def read(self, n=-1):
+            self.reads += 1
+            return super().read(n)
+
+    monkeypatch.setattr(rarfile.config, "HEADER_READAHEAD", 100)
+    data = bytes(range(256)) * 100
+    src = CountingFile(data)
+    fd = HeaderReader(src)
+    assert fd.read(5) == data[:5]
+    fd.seek(50)
+    assert fd.read(60) == data[50:110]
+    assert src.reads == 2
+    assert fd.tell() == 110
+
+    # seek past window, probe is read
+    fd.seek(10000)
+    assert fd.read(3) == data[10000:10003]
+    assert src.reads == 3
+    fd.seek(-10, 2)
+    assert fd.read(20) == data[-10:]
+    assert fd.read(20) == b""
+    fd.seek(1, 0)
+    assert fd.read() == data[1:]
+
+
+def test_header_reader_reads():
+    import io
+
+    import rarfile
+
+    class CountingFile(io.BytesIO):
+        reads = 0
+
+        def read(self, n=-1):
+            self.reads += 1
+            return super().read(n)
+
+    with open("test/files/rar5-times.rar", "rb") as f:
+        src = CountingFile(f.read())
+    with rarfile.RarFile(src) as rf:
+        assert rf.namelist()
+    assert src.reads <= 2